@@ -4,10 +4,10 @@ package.name = onlinexchat
 package.domain = org.yashasmon
 
 source.dir = .
-source.include_exts = py,png,jpg,kv,json,gif
+source.include_exts = py,png,jpg,kv,kvc,atlas,json,gif
 
 version = 1.0.0
-requirements = python3,kivy,requests,pillow
+requirements = python3,kivy,requests,pillow,numpy
 
 orientation = portrait
 
@@ -16,7 +16,7 @@ log_level = 2
 
 android.api = 33
 android.minapi = 21
-android.permissions = INTERNET,ACCESS_NETWORK_STATE
+android.permissions = INTERNET,ACCESS_NETWORK_STATE,RECORD_AUDIO
 
 presplash.filename = %(source.dir)s/assets/logo.png
 icon.filename = %(source.dir)s/assets/logo.png
\ No newline at end of file
@@ -13,14 +13,33 @@ from kivy.core.window import Window
 from kivy.properties import StringProperty, BooleanProperty, NumericProperty, ListProperty
 from kivy.animation import Animation
 from kivy.effects.dampedscroll import DampedScrollEffect
-from kivy.utils import get_color_from_hex
+from kivy.utils import get_color_from_hex, escape_markup
 import threading
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import uuid
 
 from utils.openai_handler import OpenAIClient
 from utils.supabase_client import SupabaseClient
+from utils.ui_scheduler import UIUpdateScheduler
+from utils.session_cache import SessionCache
+from utils.local_store import LocalMessageStore, HIGHLIGHT_START, HIGHLIGHT_END
+from utils.memory import RetrievalMemory
+from utils.retention import RetentionPolicy
+from utils.outbox import Outbox
+from utils.realtime_sync import SessionSync
+from utils.message import Message
+from utils.turn_pipeline import TurnPipeline
+from utils.health import HealthMonitor, OFFLINE, STATE_LABELS
+from utils.memory_budget import MemoryBudget, KivyCacheAdapter, TRIM_BACKGROUND, TRIM_CRITICAL
+from utils.log import get_logger, setup_logging
+from utils.profiling import profiler, traced
+from utils.token_budget import TokenLedger
+from utils.voice import ChunkedTranscriber, SpeechCache, SpeechPipeline, KivySoundPlayer, open_microphone
+from utils.assets import asset_source, load_kv
+
+logger = get_logger("app")
 
 class NeuButton(Button):
     """Bouton avec effet néomorphique"""
@@ -55,6 +74,50 @@ class ChatBubble(BoxLayout):
     is_user = BooleanProperty(False)
     timestamp = StringProperty("")
 
+class StreamedReply:
+    """
+    Bulle de réponse remplie au fil des fragments reçus (tours vocaux).
+    feed() est appelé depuis le worker; la bulle est créée au premier
+    fragment et mise à jour au plus une fois par frame, sur le thread UI.
+    À créer sur le thread UI
+    """
+    def __init__(self, scheduler, visible):
+        """visible : la session du tour est-elle toujours affichée?"""
+        self.scheduler = scheduler
+        self.visible = visible
+        self.text = ""
+        self.widget = None
+        self.opened = False
+        self._lock = threading.Lock()
+        self._refresh = Clock.create_trigger(self._apply, 0)
+    
+    def feed(self, delta):
+        with self._lock:
+            self.text += delta
+        self._refresh()
+    
+    def finish(self, text):
+        """Texte final de la réponse (thread UI)"""
+        with self._lock:
+            self.text = text
+        self._apply()
+    
+    def _attach(self, widget):
+        self.widget = widget
+        self._apply()
+    
+    def _apply(self, dt=None):
+        if not self.opened:
+            if not self.visible():
+                return
+            self.opened = True
+            self.scheduler.queue_message("", False, datetime.now().strftime('%H:%M'), on_created=self._attach)
+            return
+        if self.widget is not None:
+            with self._lock:
+                text = self.text
+            self.widget.message = text
+
 class AILoadingSpinner(ModalView):
     """Spinner de chargement personnalisé"""
     def __init__(self, **kwargs):
@@ -68,7 +131,7 @@ class AILoadingSpinner(ModalView):
         
         # Animation de loading
         self.loading_icon = Image(
-            source='assets/loading.gif' if os.path.exists('assets/loading.gif') else '',
+            source=asset_source('loading'),
             size_hint=(None, None), 
             size=(60, 60)
         )
@@ -102,10 +165,12 @@ class AILoadingSpinner(ModalView):
 
 class SessionManager(ModalView):
     """Gestionnaire de sessions"""
-    def __init__(self, supabase_client, callback, **kwargs):
+    def __init__(self, supabase_client, callback, session_cache=None, jump_callback=None, **kwargs):
         super().__init__(**kwargs)
         self.supabase_client = supabase_client
         self.callback = callback
+        self.session_cache = session_cache
+        self.jump_callback = jump_callback
         self.size_hint = (0.85, 0.7)
         self.setup_ui()
     
@@ -127,6 +192,18 @@ class SessionManager(ModalView):
         close_btn.bind(on_press=lambda x: self.dismiss())
         header.add_widget(close_btn)
         
+        # Recherche dans tout l'historique
+        self.search_input = TextInput(
+            hint_text='🔍 Rechercher dans toutes les conversations...',
+            multiline=False,
+            size_hint_y=None,
+            height=45,
+            background_color=(0.15, 0.15, 0.25, 1),
+            foreground_color=(1, 1, 1, 1),
+            hint_text_color=(0.5, 0.7, 1, 0.6)
+        )
+        self.search_input.bind(on_text_validate=self.search_messages)
+        
         # Liste des sessions
         sessions_label = Label(
             text='Sessions disponibles:',
@@ -154,6 +231,7 @@ class SessionManager(ModalView):
         actions_layout.add_widget(refresh_btn)
         
         content.add_widget(header)
+        content.add_widget(self.search_input)
         content.add_widget(sessions_label)
         content.add_widget(self.sessions_scroll)
         content.add_widget(actions_layout)
@@ -188,6 +266,74 @@ class SessionManager(ModalView):
                 on_press=lambda x, s=session: self.select_session(s['session_id'])
             )
             self.sessions_layout.add_widget(session_btn)
+        
+        # Préchargement des sessions récentes pendant que l'utilisateur choisit
+        if self.session_cache is not None:
+            self.session_cache.prefetch(s['session_id'] for s in sessions)
+    
+    def search_messages(self, instance=None):
+        """Affiche les messages correspondant à la recherche"""
+        query = self.search_input.text.strip()
+        if not query:
+            self.load_sessions()
+            return
+        
+        # Résultats locaux tout de suite, ceux du serveur arrivent ensuite
+        hits = self.supabase_client.search_messages_local(query)
+        self.show_hits(hits, pending=True)
+        
+        def fetch_remote():
+            merged = self.supabase_client.merge_remote_hits(query, hits)
+            Clock.schedule_once(lambda dt: self.show_remote_hits(query, hits, merged), 0)
+        thread = threading.Thread(target=fetch_remote)
+        thread.daemon = True
+        thread.start()
+    
+    def show_remote_hits(self, query, hits, merged):
+        """Ajoute les résultats du serveur si la recherche n'a pas changé entre-temps"""
+        if self.search_input.text.strip() != query:
+            return
+        if merged == hits and hits:
+            return
+        self.show_hits(merged, pending=False)
+    
+    def show_hits(self, hits, pending=False):
+        """Remplit la liste avec les résultats de recherche"""
+        self.sessions_layout.clear_widgets()
+        
+        if not hits:
+            self.sessions_layout.add_widget(Label(
+                text='Recherche sur le serveur...' if pending else 'Aucun message trouvé',
+                color=(0.5, 0.5, 0.7, 1),
+                italic=True
+            ))
+            return
+        
+        for hit in hits:
+            icon = '👤' if hit['role'] == 'user' else '🤖'
+            hit_btn = Button(
+                text=f"{icon} {self.snippet_markup(hit['snippet'])}\n[size=11sp]{escape_markup(hit['session_id'])}[/size]",
+                markup=True,
+                size_hint_y=None,
+                height=70,
+                background_color=(0.15, 0.15, 0.25, 1),
+                color=(0.8, 0.9, 1, 1)
+            )
+            hit_btn.bind(on_press=lambda x, h=hit: self.select_hit(h))
+            self.sessions_layout.add_widget(hit_btn)
+    
+    @staticmethod
+    def snippet_markup(snippet):
+        """Extrait échappé (le contenu peut contenir [ ]) puis termes trouvés en gras"""
+        return escape_markup(snippet).replace(HIGHLIGHT_START, '[b]').replace(HIGHLIGHT_END, '[/b]')
+    
+    def select_hit(self, hit):
+        """Ouvre la session d'un résultat et va au message"""
+        if self.jump_callback is not None:
+            self.jump_callback(hit)
+        else:
+            self.callback(hit['session_id'])
+        self.dismiss()
     
     def select_session(self, session_id):
         """Sélectionne une session"""
@@ -211,6 +357,10 @@ class OnlineXChatAI(BoxLayout):
         self.padding = [15, 10, 15, 10]
         self.spacing = 15
         
+        # Budget mémoire partagé par les caches (bulles, sessions, textures)
+        self.memory_budget = MemoryBudget.from_env()
+        self.memory_budget.register("textures", KivyCacheAdapter(), priority=0)
+        
         self.setup_ui()
         self.setup_clients()
         
@@ -239,7 +389,7 @@ class OnlineXChatAI(BoxLayout):
         # Logo
         logo_container = BoxLayout(size_hint_x=None, width=80)
         logo = Image(
-            source='assets/logo.png' if os.path.exists('assets/logo.png') else '',
+            source=asset_source('logo'),
             size_hint=(None, None), 
             size=(70, 70)
         )
@@ -254,6 +404,8 @@ class OnlineXChatAI(BoxLayout):
             bold=True,
             color=(0.2, 0.8, 1, 1)
         )
+        # Geste caché: triple tap sur le titre pour le mode développeur (profilage)
+        main_title.bind(on_touch_down=self.on_title_touch)
         
         subtitle = Label(
             text='Assistant IA Multimodal Avancé',
@@ -267,9 +419,17 @@ class OnlineXChatAI(BoxLayout):
             color=(0.5, 0.8, 1, 0.7)
         )
         
+        # État de la connexion (HealthMonitor)
+        self.status_label = Label(
+            text='⚪ Vérification...',
+            font_size='10sp',
+            color=(0.5, 0.8, 1, 0.7)
+        )
+        
         title_container.add_widget(main_title)
         title_container.add_widget(subtitle)
         title_container.add_widget(session_info)
+        title_container.add_widget(self.status_label)
         
         # Boutons header
         header_buttons = BoxLayout(size_hint_x=None, width=120, spacing=10)
@@ -309,6 +469,15 @@ class OnlineXChatAI(BoxLayout):
         self.chat_layout.bind(minimum_height=self.chat_layout.setter('height'))
         self.chat_scroll.add_widget(self.chat_layout)
         
+        # Insertions et défilements groupés par frame
+        self.ui_scheduler = UIUpdateScheduler(
+            self.chat_layout,
+            self.create_bubble,
+            self.scroll_to_bottom,
+            on_scroll_to=self.chat_scroll.scroll_to,
+            budget=self.memory_budget
+        )
+        
         chat_container.add_widget(self.chat_scroll)
         self.add_widget(chat_container)
     
@@ -364,8 +533,18 @@ class OnlineXChatAI(BoxLayout):
         )
         image_btn.bind(on_press=self.show_image_modal)
         
+        # Bouton micro (tour vocal: la réponse est lue à voix haute)
+        self.mic_btn = NeuButton(
+            text='🎤',
+            size_hint_x=None,
+            width=60,
+            background_color=(0.9, 0.5, 0.3, 0.3)
+        )
+        self.mic_btn.bind(on_press=self.toggle_recording)
+        
         input_container.add_widget(session_btn)
         input_container.add_widget(self.message_input)
+        input_container.add_widget(self.mic_btn)
         input_container.add_widget(image_btn)
         input_container.add_widget(send_btn)
         
@@ -374,56 +553,139 @@ class OnlineXChatAI(BoxLayout):
     def setup_clients(self):
         """Initialise les clients Supabase et OpenAI"""
         try:
-            self.supabase_client = SupabaseClient()
-            if self.supabase_client.test_connection():
-                print("✅ Supabase connecté avec succès")
-            else:
-                self.show_error("❌ Erreur de connexion à la base de données")
-                return
+            app = App.get_running_app()
+            data_dir = app.user_data_dir if app else '.'
+            self.local_store = LocalMessageStore(os.path.join(data_dir, 'onlinex_local.db'))
+            self.memory_budget.on_trim(lambda level: self.local_store.shrink_memory())
+            self.memory = RetrievalMemory(os.path.join(data_dir, 'onlinex_memory.npz'))
+            # Messages compactés par la rétention serveur: plus injectés comme souvenirs
+            cutoff = RetentionPolicy.from_env().cutoff()
+            self.memory.remove_older_than(int(cutoff.timestamp() * 1000) if cutoff else None)
+            self.outbox = Outbox(os.path.join(data_dir, 'onlinex_outbox.jsonl'))
+            self.supabase_client = SupabaseClient(
+                local_store=self.local_store,
+                memory=self.memory,
+                outbox=self.outbox
+            )
+            self.session_cache = SessionCache(
+                loader=lambda session_id: self.supabase_client.get_chat_history(
+                    limit=15, session_id=session_id, raise_errors=True, latest=True
+                ),
+                budget=self.memory_budget
+            )
+            self.openai_client = OpenAIClient(memory=self.memory)
+            # Tokens du jour conservés entre deux lancements (budgets ONLINEX_DAILY_*)
+            self.openai_client.ledger = TokenLedger.from_env(os.path.join(data_dir, 'onlinex_usage.json'))
+            logger.info("✅ OpenAI configuré avec succès")
+            
+            # Pool borné de workers pour les tours de conversation
+            self.turn_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='onlinex-turn')
+            self.turn_pipeline = TurnPipeline(self.openai_client, self.supabase_client)
+            
+            # Voix: blocs micro transcrits pendant l'enregistrement, réponses lues phrase par phrase
+            self.microphone = None
+            self.transcriber = ChunkedTranscriber(self.openai_client.transcribe_audio)
+            self.speech = SpeechPipeline(
+                self.openai_client.synthesize_speech,
+                SpeechCache(os.path.join(data_dir, 'onlinex_tts')),
+                KivySoundPlayer(),
+                voice=self.openai_client.speech_voice
+            )
             
-            self.openai_client = OpenAIClient()
-            print("✅ OpenAI configuré avec succès")
+            # Santé des services: pings légers en arrière-plan, sans bloquer le démarrage
+            self.health = HealthMonitor(
+                {"supabase": self.supabase_client.ping, "openai": self.openai_client.ping},
+                on_change=self.on_health_change
+            )
+            self.supabase_client.health = self.health
+            self.openai_client.health = self.health
+            if self.supabase_client.replayer is not None:
+                self.supabase_client.replayer.is_online = self.health.is_online
+                self.supabase_client.replayer.is_up = lambda: self.health.is_up("supabase")
+            self.health.start()
+            
+            # Synchronisation temps réel avec les autres appareils
+            self.session_sync = SessionSync(
+                self.supabase_client.url,
+                self.supabase_client.key,
+                on_insert=self.on_remote_insert,
+                on_delete=self.on_remote_delete,
+                backfill=self.supabase_client.get_messages_since,
+                ignore=lambda message: message.client_id in self.supabase_client.own_client_ids
+            )
+            self._reload_trigger = Clock.create_trigger(self.reload_session, 0.3)
+            
+            # Mode développeur: appels réseau instrumentés (sans effet tant que le profilage est arrêté)
+            profiler.instrument(
+                self.openai_client,
+                ["chat_completion", "generate_image", "get_memory_context"],
+                cat="openai"
+            )
+            profiler.instrument(
+                self.supabase_client,
+                ["save_message", "upsert_messages", "get_chat_history", "get_messages_since", "search_messages"],
+                cat="supabase"
+            )
+            if os.getenv('ONLINEX_PROFILE', '0') == '1':
+                profiler.start()
             
         except Exception as e:
             self.show_error(f"❌ Erreur d'initialisation: {str(e)}")
     
+    def on_health_change(self, previous, state):
+        """Répercute l'état de connexion (appelé depuis le thread de vérification)"""
+        if state != OFFLINE and self.supabase_client.replayer is not None:
+            # Retour du réseau: l'outbox est vidée sans attendre son backoff
+            self.supabase_client.replayer.notify()
+        Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', STATE_LABELS[state]), 0)
+    
+    def on_title_touch(self, widget, touch):
+        """Triple tap sur le titre: active le profilage, ou l'arrête et écrit la trace"""
+        if not (widget.collide_point(*touch.pos) and touch.is_triple_tap):
+            return False
+        app = App.get_running_app()
+        path = profiler.toggle(os.path.join(
+            app.user_data_dir if app else '.',
+            datetime.now().strftime('onlinex_trace_%Y%m%d_%H%M%S.json')
+        ))
+        self.status_label.text = f'📁 Trace: {os.path.basename(path)}' if path else '🔬 Profilage actif'
+        return True
+    
+    @traced("load_history", cat="ui")
     def load_history(self, dt):
         """Charge l'historique de la session actuelle"""
         try:
-            history = self.supabase_client.get_chat_history(limit=15)
-            if history:
-                for msg in history:
-                    timestamp = msg.get('timestamp', '')
-                    if timestamp:
-                        try:
-                            dt_obj = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                            formatted_time = dt_obj.strftime('%H:%M')
-                        except:
-                            formatted_time = "maintenant"
-                    else:
-                        formatted_time = "maintenant"
-                    
-                    self.add_message(msg['content'], msg['role'] == 'user', formatted_time)
-            else:
-                welcome_msg = "👋 Bienvenue sur Online X Chat AI ! Je suis ton assistant IA multimodal. Posez-moi n'importe quelle question !"
-                self.add_message(welcome_msg, False, "maintenant")
-                
+            session_id = self.supabase_client.session_id
+            self.session_cache.pin(session_id)
+            self.show_history(session_id, self.session_cache.load(session_id))
         except Exception as e:
-            print(f"⚠️ Historique non chargé: {e}")
-            welcome_msg = "👋 Bienvenue ! Commencez une nouvelle conversation avec votre IA."
+            self.show_history_error(e)
+    
+    def show_history(self, session_id, history):
+        """Affiche l'historique chargé et suit la session en temps réel"""
+        if history:
+            self.ui_scheduler.queue_messages(history)
+        else:
+            welcome_msg = "👋 Bienvenue sur Online X Chat AI ! Je suis ton assistant IA multimodal. Posez-moi n'importe quelle question !"
             self.add_message(welcome_msg, False, "maintenant")
+        
+        if self.session_sync.session_id != session_id:
+            self.session_sync.subscribe(session_id, known=self.session_cache.get_messages(session_id))
     
+    def show_history_error(self, error):
+        logger.warning("⚠️ Historique non chargé", error=error)
+        welcome_msg = "👋 Bienvenue ! Commencez une nouvelle conversation avec votre IA."
+        self.add_message(welcome_msg, False, "maintenant")
+    
+    @traced("create_bubble", cat="ui")
+    def create_bubble(self, message, is_user, timestamp=""):
+        """Construit une bulle de chat"""
+        return ChatBubble(message=message, is_user=is_user, timestamp=timestamp)
+    
+    @traced("add_message", cat="ui")
     def add_message(self, message, is_user, timestamp=""):
-        """Ajoute un message à la conversation"""
-        bubble = ChatBubble(message=message, is_user=is_user, timestamp=timestamp)
-        self.chat_layout.add_widget(bubble)
-        
-        # Animation d'apparition
-        bubble.opacity = 0
-        anim = Animation(opacity=1, duration=0.5)
-        anim.start(bubble)
-        
-        Clock.schedule_once(lambda dt: self.scroll_to_bottom(), 0.1)
+        """Ajoute un message à la conversation (appliqué à la prochaine frame)"""
+        self.ui_scheduler.queue_message(message, is_user, timestamp)
     
     def scroll_to_bottom(self):
         """Fait défiler vers le bas de la conversation"""
@@ -438,15 +700,59 @@ class OnlineXChatAI(BoxLayout):
         self.message_input.text = ''
         current_time = datetime.now().strftime('%H:%M')
         self.add_message(message, True, current_time)
+        self.start_turn(message, False)
+    
+    def toggle_recording(self, instance):
+        """Démarre ou termine un tour vocal"""
+        if self.microphone is None or not self.microphone.recording:
+            try:
+                self.speech.stop()
+                self.microphone = open_microphone(self.transcriber.feed)
+                self.microphone.start()
+                self.mic_btn.text = '⏹️'
+            except Exception as e:
+                self.show_error(f"🎤 Micro indisponible: {str(e)}")
+            return
         
-        # Afficher le spinner de chargement
-        self.spinner = AILoadingSpinner()
-        self.spinner.open()
-        
-        # Traitement dans un thread séparé
-        thread = threading.Thread(target=self.process_ai_response, args=(message, False))
-        thread.daemon = True
-        thread.start()
+        # Bouton bloqué jusqu'à la fin de la transcription: un nouvel enregistrement
+        # mélangerait ses blocs à ceux de ce tour dans le transcripteur partagé
+        self.mic_btn.text = '⏳'
+        self.mic_btn.disabled = True
+        tail = self.microphone.stop()
+        self.turn_executor.submit(self.finish_voice_turn, tail)
+    
+    def finish_voice_turn(self, tail):
+        """Seul le dernier bloc reste à transcrire (exécuté sur un worker)"""
+        try:
+            text = self.transcriber.finish(tail)
+        except Exception as e:
+            logger.warning("⚠️ Transcription échouée", error=e)
+            text = ""
+        
+        def show(dt):
+            self.mic_btn.text = '🎤'
+            self.mic_btn.disabled = False
+            if not text:
+                self.show_error("🎤 Aucune parole reconnue")
+                return
+            self.add_message(text, True, datetime.now().strftime('%H:%M'))
+            self.start_turn(text, False, speak=True)
+        Clock.schedule_once(show, 0)
+    
+    def start_turn(self, message, is_image, speak=False):
+        """Lance un tour de conversation sur le pool de workers"""
+        # La session est figée au moment de l'envoi: un changement de session
+        # pendant la réponse ne doit pas y rattacher les messages de ce tour
+        session_id = self.supabase_client.session_id
+        self.cache_message(message, 'user', session_id)
+        
+        # Un spinner par tour: deux tours concurrents ne se le partagent pas
+        spinner = AILoadingSpinner()
+        spinner.open()
+        
+        # Tour vocal: réponse en flux, lue et affichée phrase par phrase
+        reply = StreamedReply(self.ui_scheduler, lambda: session_id == self.supabase_client.session_id) if speak else None
+        self.turn_executor.submit(self.process_ai_response, message, is_image, session_id, spinner, reply)
     
     def show_image_modal(self, instance):
         """Affiche la modale de génération d'image"""
@@ -476,7 +782,9 @@ class OnlineXChatAI(BoxLayout):
             prompt = prompt_input.text.strip()
             if prompt:
                 modal.dismiss()
-                self.process_ai_response(f"Génère une image: {prompt}", True)
+                message = f"Génère une image: {prompt}"
+                self.add_message(message, True, datetime.now().strftime('%H:%M'))
+                self.start_turn(message, True)
         
         generate_btn.bind(on_press=lambda x: generate_image())
         cancel_btn.bind(on_press=lambda x: modal.dismiss())
@@ -491,59 +799,167 @@ class OnlineXChatAI(BoxLayout):
         modal.add_widget(content)
         modal.open()
     
-    def process_ai_response(self, user_message, is_image=False):
-        """Traite la réponse de l'IA"""
-        try:
-            # Sauvegarder le message utilisateur
-            self.supabase_client.save_message(user_message, 'user')
-            
-            if is_image:
-                # Génération d'image
-                image_url = self.openai_client.generate_image(user_message)
-                if image_url:
-                    ai_response = f"🎨 Image générée avec succès!\n📎 Lien: {image_url}"
-                else:
-                    ai_response = "❌ Désolé, je n'ai pas pu générer l'image. Réessayez avec une autre description."
-            else:
-                # Chat normal
-                response = self.openai_client.chat_completion(user_message)
-                ai_response = response
-            
-            # Sauvegarder la réponse de l'IA
-            self.supabase_client.save_message(ai_response, 'assistant')
-            
-            # Mettre à jour l'interface
-            current_time = datetime.now().strftime('%H:%M')
-            Clock.schedule_once(lambda dt: self.show_ai_response(ai_response, current_time), 0)
-            
-        except Exception as e:
-            error_msg = f"⚠️ Erreur: {str(e)}"
+    @traced("process_ai_response", cat="turn")
+    def process_ai_response(self, user_message, is_image=False, session_id=None, spinner=None, reply=None):
+        """
+        Traite la réponse de l'IA (exécuté sur un worker)
+        reply : StreamedReply d'un tour vocal (réponse en flux, lue à voix haute)
+        """
+        def dismiss_spinner():
+            if spinner is not None:
+                Clock.schedule_once(lambda dt: spinner.dismiss(), 0)
+        
+        def on_stream(deltas):
+            def shown():
+                first = True
+                for delta in deltas:
+                    if first:
+                        # Premier fragment: la bulle prend le relais du spinner
+                        dismiss_spinner()
+                        first = False
+                    reply.feed(delta)
+                    yield delta
+            # Chaque phrase complète part en synthèse pendant que la suite arrive
+            self.speech.speak(shown())
+        
+        def on_response(ai_response):
+            # Affichée dès réception, avant la sauvegarde de la réponse
             current_time = datetime.now().strftime('%H:%M')
-            Clock.schedule_once(lambda dt: self.show_ai_response(error_msg, current_time), 0)
+            if reply is not None:
+                Clock.schedule_once(lambda dt: self.finish_streamed_response(reply, ai_response, session_id), 0)
+            else:
+                Clock.schedule_once(lambda dt: self.show_ai_response(ai_response, current_time, session_id), 0)
+            dismiss_spinner()
         
-        finally:
-            Clock.schedule_once(lambda dt: self.spinner.dismiss(), 0)
+        try:
+            # Sauvegarde, souvenirs et appel au modèle en parallèle
+            self.turn_pipeline.run(
+                user_message, session_id, on_response,
+                is_image=is_image,
+                on_stream=on_stream if reply is not None else None
+            )
+        except Exception as e:
+            on_response(f"⚠️ Erreur: {str(e)}")
     
-    def show_ai_response(self, response, timestamp):
+    def finish_streamed_response(self, reply, response, session_id):
+        """Fin d'une réponse en flux: texte final dans la bulle et dans le cache"""
+        self.cache_message(response, 'assistant', session_id)
+        reply.finish(response)
+    
+    def show_ai_response(self, response, timestamp, session_id=None):
         """Affiche la réponse de l'IA"""
-        self.add_message(response, False, timestamp)
+        session_id = session_id or self.supabase_client.session_id
+        self.cache_message(response, 'assistant', session_id)
+        # La réponse d'une session quittée entre-temps reste dans son cache
+        if session_id == self.supabase_client.session_id:
+            self.add_message(response, False, timestamp)
+    
+    def cache_message(self, content, role, session_id=None):
+        """Répercute un nouveau message dans le cache de sa session"""
+        session_id = session_id or self.supabase_client.session_id
+        self.session_cache.append(session_id, Message.now(role, content, session_id))
     
     def show_session_manager(self, instance):
         """Affiche le gestionnaire de sessions"""
-        modal = SessionManager(self.supabase_client, self.change_session)
+        modal = SessionManager(
+            self.supabase_client,
+            self.change_session,
+            session_cache=self.session_cache,
+            jump_callback=self.jump_to_message
+        )
         modal.open()
     
     def change_session(self, session_id):
         """Change la session active"""
         self.supabase_client.session_id = session_id
         self.current_session = session_id
-        self.chat_layout.clear_widgets()
+        self.ui_scheduler.clear()
         self.load_history(0)
         
         # Animation de transition
         self.opacity = 0
         Animation(opacity=1, duration=0.5).start(self)
     
+    def on_remote_insert(self, message):
+        """Message écrit par un autre appareil (thread Realtime)"""
+        Clock.schedule_once(lambda dt: self.apply_remote_insert(message), 0)
+    
+    def apply_remote_insert(self, message):
+        session_id = message.session_id
+        if session_id != self.supabase_client.session_id:
+            return
+        self.add_message(message.content, message.is_user, message.time_label())
+        self.session_cache.append(session_id, message)
+        self.local_store.index_message(message)
+    
+    def on_remote_delete(self, record):
+        """Suppression depuis un autre appareil: rechargement groupé de la session"""
+        # Écho de nos propres suppressions (confirm_clear): l'affichage est déjà à jour
+        if self.supabase_client.is_own_delete(record.get('session_id')):
+            return
+        self._reload_trigger()
+    
+    def reload_session(self, dt=None):
+        """Recharge la session active hors du thread UI, puis remplace l'affichage"""
+        session_id = self.supabase_client.session_id
+        self.session_cache.invalidate(session_id)
+        
+        def load():
+            try:
+                history = self.session_cache.load(session_id)
+            except Exception as e:
+                Clock.schedule_once(lambda dt, error=e: self.show_history_error(error), 0)
+                return
+            
+            def show(dt):
+                if session_id != self.supabase_client.session_id:
+                    return
+                self.ui_scheduler.clear()
+                self.show_history(session_id, history)
+            Clock.schedule_once(show, 0)
+        
+        thread = threading.Thread(target=load)
+        thread.daemon = True
+        thread.start()
+    
+    def jump_to_message(self, hit):
+        """Ouvre la session d'un résultat de recherche et fait défiler jusqu'au message"""
+        self.change_session(hit['session_id'])
+        
+        messages = self.session_cache.get_messages(hit['session_id']) or []
+        index = self.find_hit(messages, hit)
+        if index is not None:
+            self.ui_scheduler.request_scroll_to_index(index)
+            return
+        
+        # Message hors de l'historique chargé: on affiche les messages qui l'entourent
+        def load_context():
+            context = self.supabase_client.get_messages_around(hit['session_id'], hit['timestamp'])
+            Clock.schedule_once(lambda dt: self.show_hit_context(hit, context), 0)
+        thread = threading.Thread(target=load_context)
+        thread.daemon = True
+        thread.start()
+    
+    @staticmethod
+    def find_hit(messages, hit):
+        for index, msg in enumerate(messages):
+            if msg.isoformat() == hit['timestamp'] and msg.content == hit['content']:
+                return index
+        return None
+    
+    def show_hit_context(self, hit, context):
+        """Remplace l'affichage par l'extrait de conversation autour du résultat"""
+        if hit['session_id'] != self.supabase_client.session_id:
+            return
+        index = self.find_hit(context, hit)
+        if index is None:
+            self.show_error("🔍 Message introuvable dans cette session")
+            return
+        self.ui_scheduler.clear()
+        self.add_message("📜 Extrait autour du message trouvé", False, "recherche")
+        self.ui_scheduler.queue_messages((m.content, m.is_user, m.time_label()) for m in context)
+        self.ui_scheduler.request_scroll_to_index(index + 1)
+    
     def clear_chat(self, instance):
         """Efface la conversation actuelle"""
         confirm_modal = ModalView(size_hint=(0.7, 0.3))
@@ -561,8 +977,18 @@ class OnlineXChatAI(BoxLayout):
         cancel_btn = NeuButton(text='Non')
         
         def confirm_clear():
-            self.supabase_client.clear_session_history()
-            self.chat_layout.clear_widgets()
+            session_id = self.supabase_client.session_id
+            # Messages pas encore envoyés abandonnés tout de suite (l'outbox ne les rejouera pas)
+            self.outbox.drop_sessions([session_id])
+            # Suppression réseau hors du thread UI
+            thread = threading.Thread(
+                target=self.supabase_client.delete_sessions,
+                args=([session_id],)
+            )
+            thread.daemon = True
+            thread.start()
+            self.session_cache.put(session_id, [])
+            self.ui_scheduler.clear()
             self.add_message("💬 Conversation effacée. Commencez une nouvelle discussion!", False, "maintenant")
             confirm_modal.dismiss()
         
@@ -600,19 +1026,67 @@ class OnlineXChatAI(BoxLayout):
 
 class OnlineXApp(App):
     """Application principale"""
+    def load_kv(self, filename=None):
+        """Règles KV précompilées (cache dans le dossier de données, reconstruit si le .kv change)"""
+        kv_path = filename or os.path.join(self.directory, 'onlinex.kv')
+        packaged = os.path.splitext(kv_path)[0] + '.kvc'
+        cache_path = packaged if os.access(os.path.dirname(packaged), os.W_OK) else os.path.join(self.user_data_dir, 'onlinex.kvc')
+        load_kv(kv_path, cache_path)
+        return True
+    
     def build(self):
+        # Logs asynchrones (niveaux: ONLINEX_LOG_LEVEL / ONLINEX_LOG_LEVELS)
+        setup_logging()
         Window.clearcolor = (0.05, 0.05, 0.12, 1)
         self.title = 'Online X Chat AI'
         self.icon = 'assets/logo.png' if os.path.exists('assets/logo.png') else ''
-        return OnlineXChatAI()
+        root = OnlineXChatAI()
+        # Avertissement mémoire du système (Android onLowMemory via SDL2)
+        Window.bind(on_memorywarning=lambda *args: root.memory_budget.trim(TRIM_CRITICAL))
+        return root
+    
+    def on_pause(self):
+        """Passage en arrière-plan: on réduit l'empreinte pour éviter d'être tué"""
+        self.root.memory_budget.trim(TRIM_BACKGROUND)
+        return True
     
     def on_start(self):
         """Callback au démarrage de l'app"""
-        print("🚀 Online X Chat AI démarré!")
+        logger.info("🚀 Online X Chat AI démarré!")
     
     def on_stop(self):
         """Callback à l'arrêt de l'app"""
-        print("🛑 Online X Chat AI arrêté")
+        memory = getattr(self.root, 'memory', None)
+        if memory is not None:
+            memory.close()
+        session_sync = getattr(self.root, 'session_sync', None)
+        if session_sync is not None:
+            session_sync.stop()
+        supabase_client = getattr(self.root, 'supabase_client', None)
+        if supabase_client is not None and supabase_client.replayer is not None:
+            supabase_client.replayer.stop()
+        turn_executor = getattr(self.root, 'turn_executor', None)
+        if turn_executor is not None:
+            turn_executor.shutdown(wait=False)
+        health = getattr(self.root, 'health', None)
+        if health is not None:
+            health.stop()
+        openai_client = getattr(self.root, 'openai_client', None)
+        if openai_client is not None:
+            openai_client.ledger.flush()
+        microphone = getattr(self.root, 'microphone', None)
+        if microphone is not None:
+            microphone.stop()
+        for voice in ('transcriber', 'speech'):
+            component = getattr(self.root, voice, None)
+            if component is not None:
+                component.shutdown()
+        turn_pipeline = getattr(self.root, 'turn_pipeline', None)
+        if turn_pipeline is not None:
+            turn_pipeline.shutdown(wait=True)
+        # Mode développeur: la trace en cours est écrite avant de quitter
+        profiler.stop(os.path.join(self.user_data_dir, datetime.now().strftime('onlinex_trace_%Y%m%d_%H%M%S.json')))
+        logger.info("🛑 Online X Chat AI arrêté")
 
 if __name__ == '__main__':
     OnlineXApp().run()
\ No newline at end of file
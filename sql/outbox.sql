@@ -0,0 +1,7 @@
+-- Online X Chat AI - identifiant client pour les écritures idempotentes
+-- Requis par SupabaseClient.upsert_messages (upsert on_conflict=client_id)
+
+alter table chat_history add column if not exists client_id uuid;
+
+create unique index if not exists chat_history_client_id_key
+    on chat_history (client_id);
@@ -0,0 +1,6 @@
+-- Online X Chat AI - flux temps réel de chat_history (utils/realtime_sync.py)
+
+alter publication supabase_realtime add table chat_history;
+
+-- Les suppressions transportent la ligne complète (filtre par session_id)
+alter table chat_history replica identity full;
@@ -0,0 +1,70 @@
+-- Online X Chat AI - rétention et compaction de chat_history
+-- À exécuter dans l'éditeur SQL Supabase (ou sur un Postgres local de test)
+
+-- Nécessite la colonne client_id et son index unique (sql/outbox.sql)
+
+-- Index utilisé par l'historique, la rétention et la suppression par session
+create index if not exists chat_history_session_timestamp_idx
+    on chat_history (session_id, timestamp);
+
+-- Remplace, pour chaque session, les messages plus anciens que max_age ou
+-- au-delà des max_messages plus récents par un unique message de résumé.
+-- Équivalent serveur de utils/retention.py (résumé extractif simple).
+create or replace function onlinex_apply_retention(
+    max_age interval default interval '90 days',
+    max_messages integer default 500
+) returns integer
+language plpgsql
+as $$
+declare
+    target record;
+    compacted integer := 0;
+begin
+    for target in
+        with ranked as (
+            select id, session_id, role, content, timestamp,
+                   row_number() over (partition by session_id order by timestamp desc) as rank
+            from chat_history
+            where coalesce(metadata->>'type', '') <> 'summary'
+        )
+        select session_id,
+               array_agg(id order by timestamp) as ids,
+               min(timestamp) as first_ts,
+               max(timestamp) as last_ts,
+               count(*) as total,
+               string_agg('• ' || left(replace(content, E'\n', ' '), 120), E'\n' order by timestamp)
+                   filter (where role = 'user') as questions
+        from ranked
+        where (max_messages is not null and rank > max_messages)
+           or (max_age is not null and timestamp < now() - max_age)
+        group by session_id
+    loop
+        -- client_id déterministe (sql/outbox.sql): une plage déjà résumée ne l'est pas deux fois
+        insert into chat_history (session_id, role, content, timestamp, metadata, client_id)
+        values (
+            target.session_id,
+            'system',
+            format('📝 Résumé de %s messages (%s → %s)', target.total,
+                   to_char(target.first_ts, 'DD/MM/YYYY'), to_char(target.last_ts, 'DD/MM/YYYY'))
+                || coalesce(E'\n' || left(target.questions, 1000), ''),
+            target.last_ts,
+            jsonb_build_object(
+                'type', 'summary',
+                'compacted_count', target.total,
+                'from', target.first_ts,
+                'to', target.last_ts
+            ),
+            md5(format('summary|%s|%s|%s', target.session_id, target.first_ts, target.last_ts))::uuid
+        )
+        on conflict (client_id) do nothing;
+
+        delete from chat_history where id = any(target.ids);
+        compacted := compacted + target.total;
+    end loop;
+
+    return compacted;
+end;
+$$;
+
+-- Planification quotidienne (extension pg_cron activée sur Supabase)
+-- select cron.schedule('onlinex-retention', '0 3 * * *', $$select onlinex_apply_retention()$$);
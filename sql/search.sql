@@ -0,0 +1,5 @@
+-- Online X Chat AI - recherche plein texte côté serveur
+-- Utilisé par SupabaseClient.search_messages_remote (filtre wfts(french))
+
+create index if not exists chat_history_content_fts_idx
+    on chat_history using gin (to_tsvector('french', content));
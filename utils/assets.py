@@ -0,0 +1,229 @@
+import io
+import os
+import sys
+import copyreg
+import hashlib
+import marshal
+import pickle
+import types
+from typing import Dict, Optional, Tuple
+
+from utils.log import get_logger
+
+logger = get_logger("assets")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(ROOT_DIR, "assets")
+ATLAS_NAME = "onlinex"
+KV_CACHE_VERSION = 1
+
+# Habillage des boutons et bulles: images 9-patch rendues par utils.build_assets
+# nom -> (taille px, rayons [haut-gauche, haut-droit, bas-droit, bas-gauche], fond rgba, bordure rgba, épaisseur)
+CHROME: Dict[str, Tuple] = {
+    "button_normal": (48, (15, 15, 15, 15), (0.2, 0.6, 1, 0.2), (0.2, 0.8, 1, 0.8), 1.5),
+    "button_down": (48, (15, 15, 15, 15), (0.3, 0.7, 1, 0.4), (0.2, 0.8, 1, 0.8), 1.5),
+    "bubble_user": (64, (25, 25, 5, 25), (0.2, 0.5, 0.9, 0.9), (0.2, 0.8, 1, 0.6), 1.2),
+    "bubble_ai": (64, (25, 25, 25, 5), (0.3, 0.2, 0.5, 0.9), (0.6, 0.3, 1, 0.6), 1.2),
+}
+
+# Photos réduites à leur taille d'affichage (x2 pour les écrans haute densité)
+PHOTOS: Dict[str, Tuple[str, int]] = {
+    "logo": ("logo.png", 140),
+    "loading": ("loading.gif", 120),
+}
+
+_atlas_available = os.path.exists(os.path.join(ASSETS_DIR, f"{ATLAS_NAME}.atlas"))
+
+
+def atlas_url(name: str) -> str:
+    """Image de l'atlas (une seule texture pour toutes les images de l'interface)"""
+    return f"atlas://{ASSETS_DIR}/{ATLAS_NAME}/{name}"
+
+
+def asset_source(name: str) -> str:
+    """
+    Source d'une image de l'interface: l'atlas s'il a été construit, sinon
+    le fichier d'origine (ou '' s'il n'existe pas). Vérifié une fois au chargement
+    """
+    if _atlas_available:
+        return atlas_url(name)
+    filename = PHOTOS.get(name, (f"{name}.png", 0))[0]
+    path = os.path.join(ASSETS_DIR, filename)
+    return path if os.path.exists(path) else ''
+
+
+# ---- Règles KV précompilées -------------------------------------------------------
+
+def _reduce_code(code: types.CodeType):
+    return marshal.loads, (marshal.dumps(code),)
+
+
+def _cache_key(source: bytes) -> str:
+    """Le cache n'est valable que pour ce source, cette version de Kivy et de Python (marshal)"""
+    import kivy
+    version = f"{KV_CACHE_VERSION}|{kivy.__version__}|{sys.version_info[0]}.{sys.version_info[1]}"
+    return hashlib.sha1(version.encode("utf-8") + source).hexdigest()
+
+
+def compile_kv(kv_path: str, cache_path: str):
+    """
+    Analyse un fichier KV (expressions Python compilées comprises) et écrit
+    le résultat dans cache_path
+    """
+    from kivy.lang.parser import Parser
+
+    with open(kv_path, "rb") as f:
+        source = f.read()
+    parser = Parser(content=source.decode("utf-8"), filename=kv_path)
+
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[types.CodeType] = _reduce_code
+    pickler.dump((_cache_key(source), parser))
+
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, cache_path)
+    return parser
+
+
+def _load_parser(kv_path: str, cache_path: str):
+    with open(kv_path, "rb") as f:
+        source = f.read()
+    try:
+        with open(cache_path, "rb") as f:
+            key, parser = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("⚠️ Cache KV illisible", path=cache_path, error=e)
+        return None
+    return parser if key == _cache_key(source) else None
+
+
+def load_kv(kv_path: str, cache_path: Optional[str] = None) -> bool:
+    """
+    Charge les règles d'un fichier KV depuis sa version précompilée si elle
+    est à jour (sinon analyse le fichier et réécrit le cache).
+    Seuls les fichiers de règles sont concernés: un fichier avec un widget
+    racine, des templates ou des classes dynamiques passe par Builder.load_file
+    Retourne True si le cache a été utilisé
+    """
+    from kivy.lang import Builder
+
+    kv_path = os.path.abspath(kv_path)
+    cache_path = cache_path or os.path.splitext(kv_path)[0] + ".kvc"
+
+    parser = _load_parser(kv_path, cache_path)
+    from_cache = parser is not None
+    if parser is None:
+        parser = compile_kv(kv_path, cache_path)
+
+    if parser.root is not None or parser.templates or parser.dynamic_classes:
+        Builder.load_file(kv_path)
+        return False
+
+    if from_cache:
+        # Directives (#:import, #:set) réexécutées dans le contexte global de Kivy
+        parser.execute_directives()
+    # Équivalent de Builder.load_string pour un fichier de règles, sans analyse
+    Builder.rules.extend(parser.rules)
+    Builder._clear_matchcache()
+    Builder.files.append(kv_path)
+    return from_cache
+
+
+if __name__ == "__main__":
+    def startup_test(bubbles: int = 40, repeat: int = 50):
+        """
+        Mesure (backend GL factice, sans fenêtre) le chargement des règles KV
+        et des images, et les instructions de dessin par bouton et par bulle,
+        avant et après le build des assets (python -m utils.build_assets)
+        """
+        import time
+        import tempfile
+        os.environ.setdefault("KIVY_GL_BACKEND", "mock")
+        os.environ.setdefault("KIVY_NO_ARGS", "1")
+        os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+        from kivy.base import EventLoop
+        from kivy.lang import Builder
+        from kivy.lang.parser import Parser
+        from kivy.core.image import Image as CoreImage
+        from kivy.graphics.instructions import VertexInstruction
+        from kivy.cache import Cache
+
+        assert _atlas_available, "atlas absent: lancer python -m utils.build_assets"
+        # Contexte GL (fenêtre factice) requis pour créer des textures
+        EventLoop.ensure_window()
+        kv_path = os.path.join(ROOT_DIR, "onlinex.kv")
+
+        with open(kv_path, encoding="utf-8") as f:
+            source = f.read()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            Parser(content=source)
+        parse_ms = (time.perf_counter() - start) / repeat * 1000
+
+        cache_path = os.path.join(tempfile.mkdtemp(), "onlinex.kvc")
+        compile_kv(kv_path, cache_path)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            _load_parser(kv_path, cache_path)
+        cached_ms = (time.perf_counter() - start) / repeat * 1000
+        print(f"📜 Règles KV: analyse {parse_ms:.2f} ms, précompilées {cached_ms:.2f} ms")
+        assert cached_ms < parse_ms
+
+        def load_images(sources):
+            Cache.remove("kv.image")
+            Cache.remove("kv.texture")
+            start = time.perf_counter()
+            for source in sources:
+                CoreImage(source)
+            return (time.perf_counter() - start) * 1000
+
+        originals = [os.path.join(ASSETS_DIR, filename) for filename, _ in PHOTOS.values()]
+        original_ms = load_images(originals)
+        atlas_ms = load_images([atlas_url(name) for name in PHOTOS])
+        original_kb = sum(os.path.getsize(path) for path in originals) / 1024
+        print(f"🖼️ Images de démarrage: {original_ms:.0f} ms ({len(originals)} textures, {original_kb:.0f} Ko) "
+              f"-> atlas {atlas_ms:.0f} ms (1 texture)")
+
+        load_kv(kv_path, cache_path)
+        sys.path.insert(0, ROOT_DIR)
+        from main import NeuButton, ChatBubble
+
+        def draw_calls(canvas) -> int:
+            """Instructions de sommets = appels de dessin par frame (canvas.before/after inclus)"""
+            return sum(
+                1 if isinstance(child, VertexInstruction) else draw_calls(child)
+                for child in getattr(canvas, "children", [])
+            )
+
+        # Habillage d'origine, tel que défini dans le KV avant l'atlas
+        Builder.load_string(
+            "<LegacyChrome@Widget>:\n"
+            "    canvas.before:\n"
+            "        Color:\n            rgba: 0.2, 0.6, 1, 0.2\n"
+            "        RoundedRectangle:\n            pos: self.pos\n            size: self.size\n            radius: [15,]\n"
+            "        Color:\n            rgba: 0.2, 0.8, 1, 0.8\n"
+            "        Line:\n            rounded_rectangle: [self.x, self.y, self.width, self.height, 15]\n"
+            "            width: 1.5\n",
+            filename="legacy_chrome.kv"
+        )
+        from kivy.factory import Factory
+        from kivy.uix.button import Button
+        legacy_chrome = draw_calls(Factory.LegacyChrome().canvas)
+        legacy_button = draw_calls(Button(text="🚀").canvas) + legacy_chrome
+        button = draw_calls(NeuButton(text="🚀").canvas)
+        bubble_chrome = draw_calls(ChatBubble(message="bonjour", is_user=True).canvas.before)
+
+        print(f"🎨 Appels de dessin: bouton {legacy_button} -> {button}, "
+              f"fond de bulle {legacy_chrome} -> {bubble_chrome} "
+              f"({bubbles} bulles à l'écran: {bubbles * legacy_chrome} -> {bubbles * bubble_chrome}), "
+              f"une seule texture partagée")
+        assert button < legacy_button and bubble_chrome < legacy_chrome
+        print("✅ Démarrage allégé")
+
+    startup_test()
@@ -0,0 +1,114 @@
+import json
+import time
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from utils.voice import pcm_to_wav, wav_duration
+
+
+class AudioStubServer:
+    """
+    Serveur local de remplacement des endpoints audio OpenAI, pour tester
+    les tours vocaux sans réseau:
+    - POST /v1/audio/transcriptions : "[durée]" du WAV reçu, après un délai
+      proportionnel à cette durée (comme un vrai modèle)
+    - POST /v1/audio/speech         : WAV silencieux de durée proportionnelle au
+      texte, après un délai proportionnel à sa longueur
+    - GET  /v1/models/<modèle>      : pour HealthMonitor / ping
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 transcribe_base: float = 0.05,
+                 transcribe_per_second: float = 0.08,
+                 speech_base: float = 0.05,
+                 speech_per_char: float = 0.002):
+        self.transcribe_base = transcribe_base
+        self.transcribe_per_second = transcribe_per_second
+        self.speech_base = speech_base
+        self.speech_per_char = speech_per_char
+        self.requests: Dict[str, int] = {"transcriptions": 0, "speech": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/v1/models/"):
+                    self._send(200, json.dumps({"id": self.path.rsplit("/", 1)[-1], "object": "model"}).encode())
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/v1/audio/transcriptions":
+                    stub.requests["transcriptions"] += 1
+                    self._transcribe(body)
+                elif self.path == "/v1/audio/speech":
+                    stub.requests["speech"] += 1
+                    self._speech(json.loads(body))
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+            def _transcribe(self, body: bytes):
+                header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("latin-1")
+                form = BytesParser(policy=HTTP).parsebytes(header + body)
+                audio = next(
+                    part.get_payload(decode=True) for part in form.iter_parts()
+                    if part.get_param("name", header="content-disposition") == "file"
+                )
+                duration = wav_duration(audio)
+                time.sleep(stub.transcribe_base + stub.transcribe_per_second * duration)
+                self._send(200, json.dumps({"text": f"[{duration:.1f}s]"}).encode())
+
+            def _speech(self, payload: Dict):
+                text = payload.get("input", "")
+                time.sleep(stub.speech_base + stub.speech_per_char * len(text))
+                # ~15 caractères par seconde de parole, 8 kHz suffisent pour du silence
+                frames = int(8000 * len(text) / 15)
+                self._send(200, pcm_to_wav(b"\x00\x00" * frames, sample_rate=8000), "audio/wav")
+
+        return Handler
+
+    def start(self) -> "AudioStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="onlinex-audio-stub")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    # Serveur de remplacement seul: OPENAI_API_BASES=http://127.0.0.1:8765/v1 python main.py
+    server = AudioStubServer(port=8765).start()
+    print(f"🎧 Serveur audio local sur {server.base_url} (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
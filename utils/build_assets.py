@@ -0,0 +1,99 @@
+import os
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from utils.assets import ASSETS_DIR, ATLAS_NAME, CHROME, PHOTOS, ROOT_DIR, compile_kv
+
+SUPERSAMPLING = 4
+
+
+def _rounded_mask(size: int, radii, inset: float = 0.0) -> np.ndarray:
+    """
+    Couverture (0..1) d'un rectangle aux coins arrondis de rayons
+    [haut-gauche, haut-droit, bas-droit, bas-gauche], suréchantillonnée
+    """
+    n = size * SUPERSAMPLING
+    y, x = np.mgrid[0:n, 0:n].astype(np.float32) / SUPERSAMPLING + 0.5 / SUPERSAMPLING
+    low, high = inset, size - inset
+    inside = (x >= low) & (x <= high) & (y >= low) & (y <= high)
+    corners = [(low, low), (high, low), (high, high), (low, high)]   # coordonnées image: y vers le bas
+    for (cx, cy), radius in zip(corners, radii):
+        r = max(radius - inset, 0.0)
+        if r <= 0:
+            continue
+        ox = cx + r if cx == low else cx - r
+        oy = cy + r if cy == low else cy - r
+        in_corner = (np.abs(x - cx) < r) & (np.abs(y - cy) < r)
+        inside &= ~in_corner | ((x - ox) ** 2 + (y - oy) ** 2 <= r * r)
+    return inside.reshape(size, SUPERSAMPLING, size, SUPERSAMPLING).mean(axis=(1, 3))
+
+
+def render_chrome(size: int, radii, fill, border, width: float):
+    """Image 9-patch: fond puis bordure, comme RoundedRectangle + Line dans le KV d'origine"""
+    from PIL import Image
+
+    outer = _rounded_mask(size, radii)
+    inner = _rounded_mask(size, radii, inset=width)
+    layers = [(np.array(fill, np.float32), outer), (np.array(border, np.float32), outer - inner)]
+
+    rgb = np.zeros((size, size, 3), np.float32)
+    alpha = np.zeros((size, size), np.float32)
+    for color, coverage in layers:
+        a = color[3] * coverage
+        # Composition "over" en couleurs non prémultipliées
+        out_alpha = a + alpha * (1 - a)
+        safe = np.where(out_alpha > 0, out_alpha, 1)
+        rgb = (color[:3] * a[..., None] + rgb * (alpha * (1 - a))[..., None]) / safe[..., None]
+        alpha = out_alpha
+    pixels = np.dstack([rgb, alpha]) * 255
+    return Image.fromarray(np.clip(pixels + 0.5, 0, 255).astype(np.uint8), "RGBA")
+
+
+def build_atlas(output_dir: str = ASSETS_DIR, atlas_size: int = 512) -> str:
+    """Réduit les photos, rend l'habillage et assemble le tout en un atlas"""
+    from PIL import Image
+    from kivy.atlas import Atlas
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        sources = []
+        for name, (filename, max_side) in PHOTOS.items():
+            with Image.open(os.path.join(ASSETS_DIR, filename)) as image:
+                image = image.convert("RGBA")
+                image.thumbnail((max_side, max_side), Image.LANCZOS)
+                path = os.path.join(work_dir, f"{name}.png")
+                image.save(path, optimize=True)
+                sources.append(path)
+        for name, spec in CHROME.items():
+            path = os.path.join(work_dir, f"{name}.png")
+            render_chrome(*spec).save(path, optimize=True)
+            sources.append(path)
+
+        outname = os.path.join(output_dir, ATLAS_NAME)
+        Atlas.create(outname, sources, atlas_size)
+        return outname + ".atlas"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build des assets: atlas de textures et règles KV précompilées")
+    parser.add_argument("--atlas-size", type=int, default=512)
+    parser.add_argument("--skip-kv", action="store_true", help="ne pas précompiler onlinex.kv")
+    args = parser.parse_args()
+
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    atlas_path = build_atlas(atlas_size=args.atlas_size)
+    atlas_bytes = sum(
+        os.path.getsize(os.path.join(ASSETS_DIR, name))
+        for name in os.listdir(ASSETS_DIR) if name.startswith(ATLAS_NAME)
+    )
+    print(f"🗺️ Atlas: {atlas_path} ({len(PHOTOS) + len(CHROME)} images, {atlas_bytes / 1024:.0f} Ko)")
+
+    if not args.skip_kv:
+        kv_path = os.path.join(ROOT_DIR, "onlinex.kv")
+        compile_kv(kv_path, os.path.splitext(kv_path)[0] + ".kvc")
+        print(f"📜 Règles KV précompilées: {os.path.splitext(kv_path)[0]}.kvc")
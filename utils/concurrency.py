@@ -0,0 +1,144 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+
+class AtomicCounter:
+    """
+    Compteur partagé entre threads: un entier protégé par un verrou
+    (lecture-modification-écriture indivisible, lectures sans effet de bord).
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self._value += 1
+
+    @property
+    def value(self) -> int:
+        with self._lock:
+            return self._value
+
+
+class UsageCounters:
+    """
+    Statistiques d'usage partagées entre threads: compteurs atomiques
+    et dernières valeurs (horodatage, modèle) protégées par un verrou.
+    """
+
+    def __init__(self, counters: Iterable[str], fields: Iterable[str] = ()):
+        self._counters: Dict[str, AtomicCounter] = {name: AtomicCounter() for name in counters}
+        self._fields: Dict[str, Optional[object]] = {name: None for name in fields}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str):
+        self._counters[name].increment()
+
+    def set(self, name: str, value):
+        with self._lock:
+            self._fields[name] = value
+
+    def mark_request(self):
+        """Compte une requête et horodate la dernière"""
+        self.increment("total_requests")
+        self.set("last_request", datetime.now().isoformat())
+
+    def __getitem__(self, name: str):
+        if name in self._counters:
+            return self._counters[name].value
+        with self._lock:
+            return self._fields[name]
+
+    def snapshot(self) -> Dict:
+        """Copie cohérente de toutes les statistiques"""
+        with self._lock:
+            fields = dict(self._fields)
+        return {**{name: counter.value for name, counter in self._counters.items()}, **fields}
+
+
+if __name__ == "__main__":
+    def stress_test(turns: int = 400, workers: int = 32):
+        """
+        Lance des centaines de tours concurrents contre des faux clients
+        OpenAI et Supabase locaux et vérifie compteurs et historiques.
+        """
+        import os
+        import time
+        import random
+        from types import SimpleNamespace
+        from concurrent.futures import ThreadPoolExecutor
+
+        import openai
+        from utils.openai_handler import OpenAIClient
+        from utils.supabase_client import SupabaseClient
+
+        print(f"🧪 Stress test: {turns} tours sur {workers} threads...")
+
+        def fake_chat_completion(**kwargs):
+            time.sleep(random.uniform(0, 0.005))
+            question = kwargs["messages"][-1]["content"]
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=f"réponse:{question}"))],
+                usage=SimpleNamespace(total_tokens=10, prompt_tokens=6, completion_tokens=4)
+            )
+
+        openai.ChatCompletion.create = fake_chat_completion
+        os.environ.setdefault("ONLINEX_AUTO_ROUTING", "0")
+        ai = OpenAIClient(api_key="sk-test")
+
+        # Faux client Supabase: table en mémoire, upsert idempotent sur client_id
+        rows: Dict[str, Dict] = {}
+        rows_lock = threading.Lock()
+
+        class FakeTable:
+            def upsert(self, records, on_conflict=""):
+                with rows_lock:
+                    for record in records:
+                        rows[record[on_conflict]] = record
+                return SimpleNamespace(execute=lambda: SimpleNamespace(error=None, data=records))
+
+        os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+        os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.local")
+        db = SupabaseClient()
+        db.client = SimpleNamespace(table=lambda name: FakeTable())
+
+        sessions = [f"session_{i}" for i in range(8)]
+
+        def turn(i: int):
+            session_id = sessions[i % len(sessions)]
+            db.save_message(f"question {i}", "user", session_id=session_id)
+            answer = ai.chat_completion(f"question {i}")
+            db.save_message(answer, "assistant", session_id=session_id)
+            # Changement de session concurrent: ne doit pas affecter les tours en cours
+            if i % 50 == 0:
+                db.session_id = random.choice(sessions)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(turn, range(turns)))
+
+        stats = ai.get_usage_statistics()
+        assert stats["chat_requests"] == turns, stats
+        assert stats["total_requests"] == turns, stats
+        assert len(rows) == 2 * turns, len(rows)
+
+        # Lectures concurrentes: aucune ne décale la valeur lue par les autres
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            reads = set(executor.map(lambda _: ai.get_usage_statistics()["chat_requests"], range(turns)))
+        assert reads == {turns}, reads
+
+        for record in rows.values():
+            index = int(record["content"].split(" ")[-1])
+            assert record["session_id"] == sessions[index % len(sessions)], record
+
+        history = ai.conversation_history.snapshot()
+        assert len(history) == ai.max_history_length
+        for question, answer in zip(history[0::2], history[1::2]):
+            assert question.role == "user" and answer.role == "assistant"
+            assert answer.content == f"réponse:{question.content}", (question, answer)
+
+        print(f"✅ {turns} tours cohérents: {stats['chat_requests']} requêtes, {len(rows)} messages")
+
+    stress_test()
@@ -0,0 +1,195 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+from utils.log import get_logger
+
+logger = get_logger("health")
+
+ONLINE = "online"
+DEGRADED = "degraded"
+OFFLINE = "offline"
+
+STATE_LABELS = {
+    ONLINE: "🟢 En ligne",
+    DEGRADED: "🟠 Connexion dégradée",
+    OFFLINE: "🔴 Hors ligne"
+}
+
+
+class CheckResult:
+    """Résultat d'une vérification: succès, latence et erreur éventuelle"""
+
+    __slots__ = ("ok", "latency", "error", "checked_at")
+
+    def __init__(self, ok: bool, latency: Optional[float], error: Optional[str] = None):
+        self.ok = ok
+        self.latency = latency
+        self.error = error
+        self.checked_at = time.monotonic()
+
+    def to_dict(self) -> Dict:
+        return {
+            "ok": self.ok,
+            "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+            "error": self.error
+        }
+
+
+class HealthMonitor:
+    """
+    État de connectivité des services (Supabase, OpenAI...).
+
+    Chaque service expose un ping trivial à délai court. Les résultats sont
+    mis en cache (ttl) et rafraîchis en arrière-plan; la lecture de l'état
+    (state, is_online) ne fait jamais d'E/S.
+    - online   : tous les services répondent dans les temps
+    - degraded : un service est en échec ou lent
+    - offline  : aucun service ne répond
+    """
+
+    def __init__(self,
+                 checks: Dict[str, Callable[[float], bool]],
+                 ttl: float = 30.0,
+                 interval: float = 30.0,
+                 timeout: float = 3.0,
+                 slow_threshold: float = 1.5,
+                 on_change: Optional[Callable[[str, str], None]] = None):
+        """
+        checks         : nom -> ping(timeout) retournant True si le service répond
+        ttl            : durée de validité d'un résultat
+        interval       : période des vérifications en arrière-plan
+        slow_threshold : au-delà (secondes), un service qui répond est jugé lent
+        on_change      : appelé avec (ancien état, nouvel état)
+        """
+        self.checks = checks
+        self.ttl = ttl
+        self.interval = interval
+        self.timeout = timeout
+        self.slow_threshold = slow_threshold
+        self.on_change = on_change
+
+        self.results: Dict[str, CheckResult] = {}
+        # None tant que la première vérification n'a pas eu lieu (considéré joignable)
+        self._state: Optional[str] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(checks)), thread_name_prefix="onlinex-health")
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> Optional[str]:
+        return self._state
+
+    def is_online(self) -> bool:
+        """Au moins un service joignable (utilisé par l'outbox pour ses envois)"""
+        return self._state != OFFLINE
+
+    def is_up(self, name: str) -> bool:
+        """Le service répondait lors du dernier appel ou ping (vrai tant qu'il n'a pas été vérifié)"""
+        result = self.results.get(name)
+        return result is None or result.ok
+
+    def _run_check(self, name: str, ping: Callable[[float], bool]) -> CheckResult:
+        start = time.monotonic()
+        try:
+            ok = bool(ping(self.timeout))
+            return CheckResult(ok, time.monotonic() - start, None if ok else "réponse invalide")
+        except Exception as e:
+            return CheckResult(False, time.monotonic() - start, type(e).__name__)
+
+    def _compute_state(self) -> str:
+        if not self.results:
+            return self._state
+        ok = [result for result in self.results.values() if result.ok]
+        if not ok:
+            return OFFLINE
+        if len(ok) < len(self.results) or any(result.latency > self.slow_threshold for result in ok):
+            return DEGRADED
+        return ONLINE
+
+    def check(self, force: bool = False) -> str:
+        """
+        Vérifie les services dont le résultat a expiré (tous si force=True),
+        en parallèle, et retourne l'état
+        """
+        now = time.monotonic()
+        stale = {
+            name: ping for name, ping in self.checks.items()
+            if force or name not in self.results or now - self.results[name].checked_at >= self.ttl
+        }
+        if stale:
+            futures = {name: self._executor.submit(self._run_check, name, ping) for name, ping in stale.items()}
+            for name, future in futures.items():
+                try:
+                    result = future.result(timeout=self.timeout + 0.5)
+                except FutureTimeout:
+                    result = CheckResult(False, None, "délai dépassé")
+                self.results[name] = result
+        return self._update_state()
+
+    def _update_state(self) -> str:
+        with self._lock:
+            previous, self._state = self._state, self._compute_state()
+            current = self._state
+        if current != previous:
+            services = {name: result.ok for name, result in self.results.items()}
+            if previous is None:
+                logger.info("📶 État de connexion initial", state=current, **services)
+            else:
+                logger.warning("📶 Changement d'état de connexion", previous=previous, state=current, **services)
+            if self.on_change is not None:
+                try:
+                    self.on_change(previous, current)
+                except Exception as e:
+                    logger.error("❌ Callback de santé en échec", error=e)
+        return current
+
+    def report_failure(self, name: str, error: Optional[str] = None):
+        """
+        Signale un échec constaté par un appel réel: l'état est mis à jour
+        sans attendre la prochaine vérification, qui est avancée
+        """
+        result = CheckResult(False, None, error or "échec signalé")
+        # Résultat marqué comme expiré: la vérification suivante refait un ping
+        result.checked_at -= self.ttl
+        self.results[name] = result
+        self._update_state()
+        self._wakeup.set()
+
+    def report_success(self, name: str, latency: Optional[float] = None):
+        """Signale un appel réel réussi (évite un ping inutile)"""
+        self.results[name] = CheckResult(True, latency or 0.0)
+        self._update_state()
+
+    def snapshot(self) -> Dict:
+        return {
+            "state": self._state,
+            "services": {name: result.to_dict() for name, result in self.results.items()}
+        }
+
+    def start(self) -> "HealthMonitor":
+        """Lance les vérifications périodiques (la première immédiatement)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("❌ Vérification de santé en échec", error=e)
+            # Hors ligne: on revérifie plus souvent pour détecter le retour du réseau
+            delay = self.interval if self._state == ONLINE else min(self.interval, 10.0)
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._executor.shutdown(wait=False)
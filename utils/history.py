@@ -0,0 +1,95 @@
+import threading
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.message import Message
+from utils.prompts import PromptTemplate
+
+
+class ConversationHistory:
+    """
+    Historique de conversation borné, adossé à un tampon circulaire.
+
+    Ajout et éviction en O(1) (deque à taille maximale). La liste des
+    messages au format API (préfixe du template + derniers messages) est
+    construite une seule fois puis mise en cache jusqu'au prochain ajout.
+    Sûr pour un accès concurrent depuis plusieurs threads.
+    """
+
+    def __init__(self, maxlen: int = 10, context_size: int = 6, template: Optional[PromptTemplate] = None):
+        """
+        maxlen       : nombre de messages conservés
+        context_size : nombre de messages envoyés à l'API à chaque tour
+        template     : préfixe statique (prompt système) placé en tête
+        """
+        self.context_size = context_size
+        self.template = template or PromptTemplate()
+        self._items: "deque[Message]" = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._api_context: Optional[Tuple[Dict, ...]] = None
+
+    @property
+    def system_prompt(self) -> Optional[Dict]:
+        return self.template.prefix[0] if self.template.prefix else None
+
+    @property
+    def maxlen(self) -> int:
+        return self._items.maxlen
+
+    def append(self, message: Message):
+        with self._lock:
+            self._items.append(message)
+            self._api_context = None
+
+    def extend(self, messages: List[Message]):
+        """Ajoute plusieurs messages de façon atomique (ex: question + réponse)"""
+        with self._lock:
+            self._items.extend(messages)
+            self._api_context = None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._api_context = None
+
+    def snapshot(self) -> Tuple[Message, ...]:
+        """Copie figée de l'historique"""
+        with self._lock:
+            return tuple(self._items)
+
+    def contents(self) -> set:
+        with self._lock:
+            return {message.content for message in self._items}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self.snapshot())
+
+    def __getitem__(self, index):
+        return self.snapshot()[index]
+
+    def _context(self) -> Tuple[Dict, ...]:
+        with self._lock:
+            if self._api_context is None:
+                start = max(0, len(self._items) - self.context_size)
+                self._api_context = tuple(
+                    self._items[i].to_api() for i in range(start, len(self._items))
+                )
+            return self._api_context
+
+    def api_messages(self,
+                     extra_system: Optional[List[Dict]] = None,
+                     use_history: bool = True,
+                     user_message: Optional[str] = None) -> List[Dict]:
+        """
+        Messages prêts pour l'API: préfixe du template, derniers messages,
+        contexte additionnel puis la question. Les dictionnaires partagés
+        ne doivent pas être modifiés.
+        """
+        return self.template.build(
+            self._context() if use_history else (),
+            extra_system,
+            user_message
+        )
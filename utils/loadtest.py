@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import openai
+
+from utils.server import ChatServer
+
+
+def install_mocks(model_delay: float = 0.05, chunks: int = 8):
+    """
+    Remplace les appels réseau par des faux locaux: OpenAI répond après
+    model_delay secondes (ou en chunks fragments en streaming), Supabase est
+    une table en mémoire
+    """
+    def fake_chat_completion(**kwargs):
+        question = kwargs["messages"][-1]["content"]
+        answer = f"réponse à {question}"
+        if kwargs.get("stream"):
+            def generate():
+                size = max(1, len(answer) // chunks)
+                for start in range(0, len(answer), size):
+                    time.sleep(model_delay / chunks)
+                    yield SimpleNamespace(choices=[SimpleNamespace(delta={"content": answer[start:start + size]})])
+            return generate()
+        time.sleep(model_delay)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=answer))],
+            usage=SimpleNamespace(total_tokens=20, prompt_tokens=12, completion_tokens=8)
+        )
+
+    openai.ChatCompletion.create = fake_chat_completion
+    os.environ.setdefault("ONLINEX_AUTO_ROUTING", "0")
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.local")
+
+    rows: Dict[str, Dict] = {}
+
+    class FakeQuery:
+        def __init__(self, data=None):
+            self.data = data or []
+
+        def __getattr__(self, name):
+            # select/eq/order/limit/gt...: requête chaînée sans effet
+            return lambda *args, **kwargs: self
+
+        def execute(self):
+            return SimpleNamespace(error=None, data=self.data)
+
+    class FakeTable(FakeQuery):
+        def upsert(self, records, on_conflict=""):
+            for record in records:
+                rows[record[on_conflict]] = record
+            return FakeQuery(records)
+
+    def fake_client():
+        return SimpleNamespace(table=lambda name: FakeTable())
+
+    return rows, fake_client
+
+
+async def _request(reader, writer, method: str, path: str, payload: Optional[Dict] = None) -> Tuple[int, bytes]:
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {line.split(":", 1)[0].lower(): line.split(":", 1)[1].strip() for line in lines[1:] if ":" in line}
+    if "content-length" in headers:
+        return status, await reader.readexactly(int(headers["content-length"]))
+    return status, await reader.read()
+
+
+async def run_load(port: int, clients: int, requests_per_client: int, stream_ratio: float, sessions: int):
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+
+    async def client(index: int):
+        reader = writer = None
+        for i in range(requests_per_client):
+            stream = random.random() < stream_ratio
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            payload = {"session_id": f"load_{(index + i) % sessions}", "message": f"question {index}-{i}", "stream": stream}
+            start = time.perf_counter()
+            status, body = await _request(reader, writer, "POST", "/v1/chat", payload)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if stream and status == 200:
+                assert b"event: done" in body, body
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def main(args):
+    rows, fake_client = install_mocks(model_delay=args.model_delay)
+
+    from utils.openai_handler import OpenAIClient
+    from utils.supabase_client import SupabaseClient
+
+    db = SupabaseClient()
+    db.client = fake_client()
+    server = ChatServer(
+        OpenAIClient(api_key="sk-test"), db,
+        host="127.0.0.1", port=0,
+        max_concurrency=args.concurrency, max_pending=args.pending
+    )
+    await server.start()
+
+    elapsed, latencies, statuses = await run_load(
+        server.port, args.clients, args.requests, args.stream_ratio, args.sessions
+    )
+    await server.shutdown()
+
+    ok = statuses.get(200, 0)
+    print(f"📊 {len(latencies)} requêtes en {elapsed:.2f}s sur {args.clients} clients "
+          f"(serveur: {args.concurrency} workers, modèle simulé {args.model_delay * 1000:.0f} ms)")
+    print(f"⚡ Débit: {ok / elapsed:.0f} req/s réussies, statuts: {statuses}")
+    print(f"⏱️ Latence p50 {_percentile(latencies, 0.50) * 1000:.0f} ms, "
+          f"p95 {_percentile(latencies, 0.95) * 1000:.0f} ms, p99 {_percentile(latencies, 0.99) * 1000:.0f} ms")
+    print(f"💾 Messages sauvegardés: {len(rows)}")
+    assert len(rows) == 2 * ok, (len(rows), ok)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge du serveur headless contre des faux OpenAI/Supabase")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20, help="requêtes par client")
+    parser.add_argument("--concurrency", type=int, default=16, help="tours simultanés côté serveur")
+    parser.add_argument("--pending", type=int, default=256, help="tours en attente avant 503")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--stream-ratio", type=float, default=0.2)
+    parser.add_argument("--model-delay", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
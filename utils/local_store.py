@@ -0,0 +1,142 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from utils.message import Message
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    UNIQUE (session_id, timestamp, role)
+);
+
+CREATE INDEX IF NOT EXISTS messages_session_idx ON messages (session_id, timestamp);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content='messages',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# Marqueurs de surlignage des extraits (caractères de contrôle absents des messages):
+# l'interface échappe le texte puis les remplace par son propre markup
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+
+class LocalMessageStore:
+    """
+    Magasin local SQLite des messages avec index plein texte FTS5.
+
+    L'index est alimenté au fil de l'eau (messages sauvegardés et
+    historiques chargés) et permet une recherche classée sur toutes les
+    sessions sans appel réseau.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('ONLINEX_LOCAL_STORE', 'onlinex_local.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def index_message(self, message: Message):
+        """Indexe un message (ignoré s'il est déjà présent)"""
+        self.index_messages([message])
+
+    def index_messages(self, messages: Iterable[Message]):
+        """Indexe un lot de messages dans une seule transaction"""
+        rows = [
+            (m.session_id, m.role, m.content, m.isoformat())
+            for m in messages
+            if m.content and m.session_id and m.ts is not None
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def delete_sessions(self, session_ids: Iterable[str]):
+        """Retire des sessions de l'index"""
+        ids = [(s,) for s in session_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM messages WHERE session_id = ?", ids)
+
+    @staticmethod
+    def _build_match(query: str) -> str:
+        """Transforme une saisie libre en requête FTS5 (termes préfixés, ET implicite)"""
+        terms = _TERM_RE.findall(query)
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def search(self, query: str, limit: int = 20, session_id: Optional[str] = None) -> List[Dict]:
+        """
+        Recherche plein texte classée (bm25) avec extrait surligné
+        (termes entourés de HIGHLIGHT_START / HIGHLIGHT_END)
+        Chaque résultat contient de quoi ouvrir la session et aller au message
+        """
+        match = self._build_match(query)
+        if not match:
+            return []
+
+        sql = """
+            SELECT m.id, m.session_id, m.role, m.content, m.timestamp,
+                   snippet(messages_fts, 0, ?, ?, '…', 12) AS snippet,
+                   bm25(messages_fts) AS rank
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+        """
+        params: list = [HIGHLIGHT_START, HIGHLIGHT_END, match]
+        if session_id:
+            sql += " AND m.session_id = ?"
+            params.append(session_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [
+            {
+                'message_id': row[0],
+                'session_id': row[1],
+                'role': row[2],
+                'content': row[3],
+                'timestamp': row[4],
+                'snippet': row[5],
+                'rank': row[6]
+            }
+            for row in rows
+        ]
+
+    def shrink_memory(self):
+        """Libère le cache de pages SQLite (appelé sous pression mémoire)"""
+        with self._lock:
+            self._conn.execute("PRAGMA shrink_memory")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import queue
+import atexit
+import itertools
+import logging
+import logging.handlers
+from typing import Dict, Optional
+
+ROOT_LOGGER = "onlinex"
+
+# Niveau global par défaut (build release): seuls les avertissements et erreurs
+DEFAULT_LEVEL = "WARNING"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_log_content = False
+_loggers: Dict[str, "StructuredLogger"] = {}
+
+
+def _parse_level(value: str) -> int:
+    level = logging.getLevelName(value.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"❌ Niveau de log inconnu: {value}")
+    return level
+
+
+def _parse_module_levels(spec: str) -> Dict[str, int]:
+    """'db=DEBUG,ai=INFO' -> {'db': 10, 'ai': 20}"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        module, level = item.split("=", 1)
+        levels[module.strip()] = _parse_level(level)
+    return levels
+
+
+def redact(text: Optional[str]) -> str:
+    """
+    Contenu d'un message tel qu'il peut apparaître dans les logs:
+    remplacé par sa longueur sauf si ONLINEX_LOG_CONTENT=1
+    """
+    if text is None:
+        return "<vide>"
+    if _log_content:
+        return text[:80]
+    return f"<{len(text)} car.>"
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formate un enregistrement et ses champs en texte (clé=valeur) ou en JSON"""
+
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if self.json_output:
+            entry = {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+                **fields
+            }
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        stamp = time.strftime("%H:%M:%S", time.localtime(record.created))
+        line = f"{stamp}.{int(record.msecs):03d} {record.levelname[0]} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler sans formatage côté appelant: l'enregistrement est mis en
+    file tel quel, le formatage et l'écriture se font sur le thread d'écriture
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class StructuredLogger:
+    """
+    Logger à champs structurés.
+
+    Le niveau est vérifié avant toute construction de l'enregistrement: un
+    appel sous le seuil ne coûte qu'une comparaison. Le message est une
+    chaîne constante, les valeurs variables passent en champs nommés.
+    every=N n'émet qu'un événement sur N (événements très fréquents).
+    """
+
+    __slots__ = ("_logger", "_samples")
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+        self._samples: Dict[str, "itertools.count"] = {}
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, msg: str, every: int, exc_info, fields: Dict):
+        if not self._logger.isEnabledFor(level):
+            return
+        if every > 1:
+            counter = self._samples.get(msg)
+            if counter is None:
+                counter = self._samples.setdefault(msg, itertools.count())
+            if next(counter) % every:
+                return
+            fields["sampled"] = f"1/{every}"
+        self._logger.log(level, msg, exc_info=exc_info, extra={"fields": fields}, stacklevel=3)
+
+    def debug(self, msg: str, every: int = 1, **fields):
+        self._log(logging.DEBUG, msg, every, None, fields)
+
+    def info(self, msg: str, every: int = 1, **fields):
+        self._log(logging.INFO, msg, every, None, fields)
+
+    def warning(self, msg: str, every: int = 1, **fields):
+        self._log(logging.WARNING, msg, every, None, fields)
+
+    def error(self, msg: str, every: int = 1, exc_info=None, **fields):
+        self._log(logging.ERROR, msg, every, exc_info, fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Logger d'un module (ex: 'db' -> onlinex.db), partagé par nom"""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, StructuredLogger(name))
+    return logger
+
+
+def setup_logging(level: Optional[str] = None,
+                  module_levels: Optional[Dict[str, str]] = None,
+                  json_output: Optional[bool] = None,
+                  log_content: Optional[bool] = None,
+                  handler: Optional[logging.Handler] = None) -> logging.handlers.QueueListener:
+    """
+    Configure les logs de l'application (idempotent).
+
+    Les enregistrements passent par une file et sont écrits par un thread
+    dédié: les threads UI et workers ne font jamais d'E/S de log.
+
+    Variables d'environnement (surchargées par les arguments):
+    ONLINEX_LOG_LEVEL    : niveau global (défaut WARNING)
+    ONLINEX_LOG_LEVELS   : niveaux par module, ex: "db=DEBUG,ai=INFO"
+    ONLINEX_LOG_FORMAT   : "json" pour une ligne JSON par événement
+    ONLINEX_LOG_CONTENT  : "1" pour inclure le contenu des messages
+    """
+    global _listener, _log_content
+
+    if _listener is not None:
+        shutdown_logging()
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(_parse_level(level or os.getenv("ONLINEX_LOG_LEVEL", DEFAULT_LEVEL)))
+
+    levels = _parse_module_levels(os.getenv("ONLINEX_LOG_LEVELS", ""))
+    levels.update({name: _parse_level(value) for name, value in (module_levels or {}).items()})
+    for name, module_level in levels.items():
+        logging.getLogger(f"{ROOT_LOGGER}.{name}").setLevel(module_level)
+
+    if json_output is None:
+        json_output = os.getenv("ONLINEX_LOG_FORMAT", "text").lower() == "json"
+    if log_content is None:
+        log_content = os.getenv("ONLINEX_LOG_CONTENT", "0") == "1"
+    _log_content = log_content
+
+    target = handler or logging.StreamHandler()
+    target.setFormatter(StructuredFormatter(json_output))
+
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    # Pas de remontée vers le logger racine (déjà utilisé par Kivy)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Vide la file et arrête le thread d'écriture"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+if __name__ == "__main__":
+    def benchmark(calls: int = 200_000):
+        """Coût d'un appel de log désactivé et d'un appel actif mis en file"""
+        sink = logging.NullHandler()
+        setup_logging(level="WARNING", handler=sink)
+        logger = get_logger("bench")
+
+        start = time.perf_counter()
+        for i in range(calls):
+            logger.info("💬 Réponse reçue", model="gpt-3.5-turbo", tokens=i)
+        disabled = (time.perf_counter() - start) / calls * 1e9
+
+        start = time.perf_counter()
+        for i in range(calls):
+            logger.warning("⚠️ Événement fréquent", every=100, n=i)
+        sampled = (time.perf_counter() - start) / calls * 1e9
+
+        start = time.perf_counter()
+        for i in range(calls // 10):
+            logger.warning("⚠️ Événement", n=i)
+        enqueued = (time.perf_counter() - start) / (calls // 10) * 1e9
+
+        shutdown_logging()
+        print(f"⏱️ Désactivé: {disabled:.0f} ns/appel")
+        print(f"⏱️ Échantillonné 1/100: {sampled:.0f} ns/appel")
+        print(f"⏱️ Mis en file: {enqueued:.0f} ns/appel")
+        assert redact("contenu privé") == "<13 car.>"
+
+    benchmark()
@@ -0,0 +1,342 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.message import Message
+from utils.log import get_logger
+
+logger = get_logger("memory")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (≈ 4 caractères par token)"""
+    return len(text) // 4 + 1
+
+
+class VectorStore:
+    """
+    Stockage compact de vecteurs d'embedding adossé à NumPy.
+
+    Les vecteurs sont normalisés et stockés en float16. La recherche
+    approchée utilise une signature LSH (hyperplans aléatoires) pour
+    présélectionner les candidats, puis un score cosinus exact sur ceux-ci.
+    """
+
+    def __init__(self, dim: int, signature_bits: int = 16, seed: int = 42):
+        self.dim = dim
+        self.signature_bits = signature_bits
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((signature_bits, dim)).astype(np.float32)
+
+        self._vectors = np.zeros((0, dim), dtype=np.float16)
+        self._signatures = np.zeros(0, dtype=np.uint32)
+        self._size = 0
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _signature(self, vectors: np.ndarray) -> np.ndarray:
+        bits = (vectors @ self._planes.T) > 0
+        weights = (1 << np.arange(self.signature_bits, dtype=np.uint32))
+        return (bits * weights).sum(axis=1).astype(np.uint32)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def add(self, vectors, records: List[Dict]):
+        """Ajoute un lot de vecteurs et leurs métadonnées"""
+        vectors = self._normalize(np.atleast_2d(vectors))
+        signatures = self._signature(vectors)
+
+        with self._lock:
+            needed = self._size + len(vectors)
+            if needed > len(self._vectors):
+                # Croissance géométrique pour des ajouts amortis en O(1)
+                capacity = max(needed, len(self._vectors) * 2, 256)
+                grown = np.zeros((capacity, self.dim), dtype=np.float16)
+                grown[:self._size] = self._vectors[:self._size]
+                self._vectors = grown
+                grown_sig = np.zeros(capacity, dtype=np.uint32)
+                grown_sig[:self._size] = self._signatures[:self._size]
+                self._signatures = grown_sig
+
+            self._vectors[self._size:needed] = vectors.astype(np.float16)
+            self._signatures[self._size:needed] = signatures
+            self._size = needed
+            self.records.extend(records)
+
+    def remove(self, predicate: Callable[[Dict], bool]) -> int:
+        """Retire les vecteurs dont les métadonnées vérifient predicate; retourne leur nombre"""
+        with self._lock:
+            keep = np.array([not predicate(record) for record in self.records], dtype=bool)
+            removed = int(self._size - keep.sum())
+            if removed == 0:
+                return 0
+            self._vectors = self._vectors[:self._size][keep]
+            self._signatures = self._signatures[:self._size][keep]
+            self._size = len(self._vectors)
+            self.records = [record for record, kept in zip(self.records, keep) if kept]
+        return removed
+
+    def remove_sessions(self, session_ids: Iterable[str]) -> int:
+        """Retire tous les vecteurs des sessions données"""
+        targets = set(session_ids)
+        return self.remove(lambda record: record.get("session_id") in targets)
+
+    def search(self, query, k: int = 5, max_hamming: int = 3, min_candidates: int = 64) -> List[Dict]:
+        """
+        Recherche approchée des k plus proches voisins (similarité cosinus)
+        """
+        query = self._normalize(np.atleast_2d(query))[0]
+        query_sig = self._signature(query[None, :])[0]
+
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return []
+            vectors = self._vectors[:size]
+            xor = np.bitwise_xor(self._signatures[:size], query_sig)
+            distances = np.unpackbits(xor.view(np.uint8).reshape(size, 4), axis=1).sum(axis=1)
+
+            candidates = np.nonzero(distances <= max_hamming)[0]
+            if len(candidates) < min(min_candidates, size):
+                # Trop peu de candidats: on élargit aux plus proches signatures
+                count = min(min_candidates, size)
+                candidates = np.argpartition(distances, count - 1)[:count]
+
+            scores = vectors[candidates].astype(np.float32) @ query
+            top = min(k, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+
+            return [
+                {**self.records[candidates[i]], "score": float(scores[i])}
+                for i in best
+            ]
+
+    def save(self, path: str):
+        with self._lock:
+            np.savez_compressed(
+                path,
+                vectors=self._vectors[:self._size],
+                signatures=self._signatures[:self._size],
+                planes=self._planes,
+                records=np.array(self.records, dtype=object)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "VectorStore":
+        data = np.load(path, allow_pickle=True)
+        planes = data["planes"]
+        store = cls(planes.shape[1], signature_bits=planes.shape[0])
+        store._planes = planes
+        store._vectors = data["vectors"]
+        store._signatures = data["signatures"]
+        store._size = len(store._vectors)
+        store.records = list(data["records"])
+        return store
+
+
+class RetrievalMemory:
+    """
+    Mémoire à long terme des conversations (RAG).
+
+    Les messages sauvegardés sont mis en file puis vectorisés par lots en
+    arrière-plan; chat_completion interroge ensuite la mémoire pour injecter
+    les extraits passés les plus pertinents dans la limite d'un budget de tokens.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 embedding_model: str = "text-embedding-ada-002",
+                 dim: int = 1536,
+                 batch_size: int = 32,
+                 flush_interval: float = 2.0,
+                 save_interval: float = 30.0,
+                 min_length: int = 20,
+                 embedder: Optional[Callable[[List[str], str], List[List[float]]]] = None):
+        """
+        embedder : fonction (textes, modèle) -> vecteurs, en pratique OpenAIClient.embed
+                   (pool d'endpoints et comptabilité des tokens); renseignée par le client
+        """
+        self.path = path or os.getenv('ONLINEX_MEMORY_PATH', 'onlinex_memory.npz')
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.save_interval = save_interval
+        self.min_length = min_length
+        self.embedder = embedder
+
+        if os.path.exists(self.path):
+            try:
+                self.store = VectorStore.load(self.path)
+            except Exception as e:
+                logger.warning("⚠️ Mémoire illisible, réinitialisée", error=e)
+                self.store = VectorStore(dim)
+        else:
+            self.store = VectorStore(dim)
+
+        self._pending: List[Dict] = []
+        self._pending_lock = threading.Lock()
+        # Sessions supprimées -> instant de suppression (ms): un lot en cours de
+        # vectorisation ne doit pas réintroduire leurs anciens messages.
+        # Oubliées dès qu'aucun lot n'est en cours (la file est déjà filtrée)
+        self._removed: Dict[str, int] = {}
+        self._inflight = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if self.embedder is None:
+            raise RuntimeError("aucun client d'embedding configuré")
+        return np.array(self.embedder(texts, self.embedding_model), dtype=np.float32)
+
+    def add(self, message: Message):
+        """Met en file un message à indexer (non bloquant)"""
+        if not message.content or len(message.content) < self.min_length:
+            return
+        with self._pending_lock:
+            self._pending.append({
+                "session_id": message.session_id,
+                "role": message.role,
+                "content": message.content,
+                "ts": message.ts
+            })
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Vectorise et indexe les messages en attente"""
+        while True:
+            with self._pending_lock:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                if not batch:
+                    if self._inflight == 0:
+                        self._removed.clear()
+                    break
+                self._inflight += 1
+            try:
+                vectors = self._embed([item["content"] for item in batch])
+                with self._pending_lock:
+                    keep = [not self._is_removed(item) for item in batch]
+                if not all(keep):
+                    vectors = vectors[keep]
+                    batch = [item for item, kept in zip(batch, keep) if kept]
+                if batch:
+                    self.store.add(vectors, batch)
+                    self._dirty = True
+            except Exception as e:
+                logger.error("❌ Indexation mémoire échouée", count=len(batch), error=e)
+                with self._pending_lock:
+                    self._pending[:0] = batch
+                break
+            finally:
+                with self._pending_lock:
+                    self._inflight -= 1
+
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def _is_removed(self, item: Dict) -> bool:
+        removed_at = self._removed.get(item["session_id"])
+        return removed_at is not None and (item["ts"] or 0) <= removed_at
+
+    def remove_sessions(self, session_ids: Iterable[str]) -> int:
+        """
+        Oublie des sessions supprimées: vecteurs indexés et messages en attente
+        (les messages écrits ensuite dans la même session restent indexables)
+        Retourne le nombre de vecteurs retirés
+        """
+        targets = set(session_ids)
+        if not targets:
+            return 0
+        now = int(time.time() * 1000)
+        with self._pending_lock:
+            for session_id in targets:
+                self._removed[session_id] = now
+            self._pending = [item for item in self._pending if not self._is_removed(item)]
+        removed = self.store.remove_sessions(targets)
+        if removed:
+            self.save()
+        logger.info("🧹 Sessions retirées de la mémoire", sessions=len(targets), vectors=removed)
+        return removed
+
+    def remove_older_than(self, cutoff_ts: Optional[int]) -> int:
+        """Retire les vecteurs antérieurs à cutoff_ts (messages compactés par la rétention)"""
+        if cutoff_ts is None:
+            return 0
+        removed = self.store.remove(lambda record: (record.get("ts") or 0) < cutoff_ts)
+        if removed:
+            self._dirty = True
+        return removed
+
+    def save(self):
+        try:
+            self.store.save(self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except Exception as e:
+            logger.error("❌ Sauvegarde mémoire échouée", error=e)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def retrieve(self,
+                 query: str,
+                 k: int = 5,
+                 token_budget: int = 400,
+                 exclude_contents: Optional[set] = None,
+                 min_score: float = 0.75) -> List[Dict]:
+        """
+        Retourne les extraits passés les plus pertinents dans la limite du budget
+        """
+        if len(self.store) == 0:
+            return []
+        try:
+            query_vector = self._embed([query])[0]
+        except Exception as e:
+            logger.error("❌ Recherche mémoire échouée", error=e)
+            return []
+
+        exclude_contents = exclude_contents or set()
+        results, used = [], 0
+        for hit in self.store.search(query_vector, k=k * 2):
+            if hit["score"] < min_score or hit["content"] in exclude_contents:
+                continue
+            cost = estimate_tokens(hit["content"])
+            if used + cost > token_budget:
+                continue
+            results.append(hit)
+            used += cost
+            if len(results) >= k:
+                break
+        return results
+
+    def close(self):
+        """Arrête le worker et persiste l'index"""
+        self._stop.set()
+        self._wakeup.set()
+        self._worker.join(timeout=5)
+        self.flush()
+        if self._dirty:
+            self.save()
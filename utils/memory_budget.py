@@ -0,0 +1,220 @@
+import os
+import sys
+import threading
+from typing import Callable, Dict, List
+
+from utils.log import get_logger
+
+logger = get_logger("budget")
+
+# Niveaux de libération (équivalents simplifiés de onTrimMemory Android)
+TRIM_BACKGROUND = "background"   # application en pause: on réduit de moitié
+TRIM_CRITICAL = "critical"       # avertissement mémoire du système: on vide tout ce qui peut l'être
+
+
+class MemoryBudget:
+    """
+    Budget mémoire global des caches de l'application.
+
+    Chaque cache enregistré expose size_bytes() (taille approximative,
+    tenue à jour de façon incrémentale) et evict(nbytes) qui libère au moins
+    nbytes si possible et retourne le nombre d'octets libérés. Au-delà du
+    budget, les caches sont vidés par priorité croissante jusqu'à
+    redescendre sous low_watermark * budget.
+    """
+
+    def __init__(self, budget_bytes: int = 64 * 1024 * 1024, low_watermark: float = 0.8):
+        self.budget_bytes = budget_bytes
+        self.low_watermark = low_watermark
+        self._caches: Dict[str, tuple] = {}
+        self._trim_hooks: List[Callable[[str], None]] = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls) -> "MemoryBudget":
+        """Budget depuis ONLINEX_MEMORY_BUDGET_MB (défaut 64)"""
+        return cls(int(float(os.getenv('ONLINEX_MEMORY_BUDGET_MB', '64')) * 1024 * 1024))
+
+    def register(self, name: str, cache, priority: int = 0):
+        """
+        Enregistre un cache (size_bytes/evict); les priorités basses sont vidées en premier
+        """
+        with self._lock:
+            self._caches[name] = (priority, cache)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._caches.pop(name, None)
+
+    def on_trim(self, hook: Callable[[str], None]):
+        """Ajoute une action à exécuter lors d'un trim (ex: PRAGMA shrink_memory)"""
+        self._trim_hooks.append(hook)
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: cache.size_bytes() for name, (_, cache) in self._caches.items()}
+
+    def total(self) -> int:
+        with self._lock:
+            return sum(cache.size_bytes() for _, cache in self._caches.values())
+
+    def check(self) -> int:
+        """
+        À appeler après une croissance d'un cache: libère de la mémoire si
+        le budget est dépassé. Retourne le nombre d'octets libérés
+        """
+        if self.total() <= self.budget_bytes:
+            return 0
+        return self._evict_to(int(self.budget_bytes * self.low_watermark), "budget")
+
+    def trim(self, level: str = TRIM_CRITICAL) -> int:
+        """Réponse à un signal du système (mise en arrière-plan, mémoire faible)"""
+        target = 0 if level == TRIM_CRITICAL else min(self.total(), self.budget_bytes) // 2
+        freed = self._evict_to(target, level)
+        for hook in self._trim_hooks:
+            try:
+                hook(level)
+            except Exception as e:
+                logger.warning("⚠️ Action de libération en échec", error=e)
+        return freed
+
+    def _evict_to(self, target: int, reason: str) -> int:
+        with self._lock:
+            ordered = sorted(self._caches.items(), key=lambda item: item[1][0])
+            total = sum(cache.size_bytes() for _, (_, cache) in ordered)
+            freed = 0
+            for name, (_, cache) in ordered:
+                if total - freed <= target:
+                    break
+                try:
+                    freed += cache.evict(total - freed - target)
+                except Exception as e:
+                    logger.warning("⚠️ Éviction en échec", cache=name, error=e)
+        logger.info("🧹 Caches libérés", reason=reason, freed_kb=freed // 1024, total_kb=(total - freed) // 1024)
+        return freed
+
+
+class KivyCacheAdapter:
+    """
+    Caches globaux de Kivy (textures et images chargées) vus comme un cache
+    du budget: taille estimée d'après les dimensions des textures.
+    Seules les entrées que plus aucun widget n'affiche sont retirées (les
+    autres resteraient en mémoire), les moins récemment utilisées d'abord;
+    le retrait a lieu sur le thread UI
+    """
+
+    # Références d'une entrée retenue par le seul cache: le cache, la variable locale, l'argument de getrefcount
+    _UNREFERENCED = 3
+
+    def __init__(self, categories=("kv.texture", "kv.image")):
+        from kivy.cache import Cache
+        from kivy.clock import Clock
+        self._cache = Cache
+        self._clock = Clock
+        self.categories = categories
+
+    @staticmethod
+    def _texture_bytes(obj) -> int:
+        texture = getattr(obj, "texture", obj)
+        width, height = getattr(texture, "size", (0, 0))
+        return int(width * height * 4)
+
+    def _entries(self, category: str) -> list:
+        # Cache._objects n'a pas d'accesseur public: simple lecture
+        objects = getattr(self._cache, "_objects", {}).get(category, {})
+        return list(objects.items())
+
+    def size_bytes(self) -> int:
+        return sum(
+            self._texture_bytes(entry.get("object"))
+            for category in self.categories
+            for _, entry in self._entries(category)
+        )
+
+    def _droppable(self, category: str) -> list:
+        """(clé, taille) des entrées que seul le cache retient, les plus anciennement utilisées d'abord"""
+        droppable = []
+        for key, entry in sorted(self._entries(category), key=lambda item: item[1].get("lastaccess") or 0):
+            obj = entry.get("object")
+            if sys.getrefcount(obj) > self._UNREFERENCED:
+                continue
+            droppable.append((key, self._texture_bytes(obj)))
+        return droppable
+
+    def evict(self, nbytes: int) -> int:
+        freed, doomed = 0, []
+        for category in self.categories:
+            if freed >= nbytes:
+                break
+            for key, size in self._droppable(category):
+                if freed >= nbytes:
+                    break
+                doomed.append((category, key))
+                freed += size
+        if doomed:
+            if threading.current_thread() is threading.main_thread():
+                self._remove(doomed)
+            else:
+                self._clock.schedule_once(lambda dt: self._remove(doomed), 0)
+        return freed
+
+    def _remove(self, doomed: list):
+        for category, key in doomed:
+            self._cache.remove(category, key)
+
+
+if __name__ == "__main__":
+    def ceiling_test(budget_mb: int = 4, sessions: int = 40, messages_per_session: int = 400):
+        """
+        Charge bien plus de sessions que le budget n'en permet et vérifie
+        avec tracemalloc que la mémoire réellement allouée reste plafonnée
+        """
+        import gc
+        import tracemalloc
+        from utils.message import Message
+        from utils.session_cache import SessionCache
+
+        def loader(session_id: str):
+            return [
+                Message(
+                    'user' if i % 2 else 'assistant',
+                    f"{session_id} message {i} " + "contenu d'une longue réponse " * 40,
+                    1_700_000_000_000 + i * 1000,
+                    session_id
+                )
+                for i in range(messages_per_session)
+            ]
+
+        budget = MemoryBudget(budget_mb * 1024 * 1024)
+        cache = SessionCache(loader, max_sessions=sessions, budget=budget)
+
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        # Session affichée chargée en premier puis rendue la moins récente par les autres
+        cache.pin("session_0")
+        for i in range(sessions):
+            cache.load(f"session_{i}")
+        gc.collect()
+        current, peak = (value - baseline for value in tracemalloc.get_traced_memory())
+
+        ceiling = budget.budget_bytes
+        session_bytes = cache.size_bytes() / max(1, len(cache))
+        print(f"📦 {sessions} sessions chargées (~{session_bytes / 1024:.0f} Ko chacune), "
+              f"{len(cache)} conservées")
+        print(f"📊 Estimé {budget.total() / 1e6:.2f} Mo, alloué {current / 1e6:.2f} Mo, "
+              f"pic {peak / 1e6:.2f} Mo (budget {ceiling / 1e6:.2f} Mo)")
+        # Le pic inclut une session en cours de chargement avant éviction
+        assert current <= ceiling * 1.1, (current, ceiling)
+        assert peak <= ceiling * 1.1 + 2 * session_bytes, (peak, ceiling)
+
+        budget.trim(TRIM_CRITICAL)
+        gc.collect()
+        after_trim = tracemalloc.get_traced_memory()[0] - baseline
+        print(f"🧹 Après trim critique: {after_trim / 1e6:.2f} Mo ({len(cache)} session conservée)")
+        assert len(cache) == 1 and after_trim <= session_bytes * 1.5
+        assert cache.get_messages("session_0"), "la session active a été évincée"
+        tracemalloc.stop()
+        print("✅ Plafond mémoire respecté")
+
+    ceiling_test()
@@ -0,0 +1,113 @@
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+_FRACTION_RE = re.compile(r"\.(\d+)")
+
+
+def parse_timestamp(value) -> Optional[int]:
+    """
+    Convertit un timestamp ISO (Supabase ou local) en millisecondes epoch
+    Les timestamps sans fuseau sont interprétés en heure locale
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = value.replace('Z', '+00:00')
+    # Postgres peut renvoyer moins de 6 décimales, que fromisoformat (< 3.11) refuse
+    text = _FRACTION_RE.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), text, count=1)
+    try:
+        return int(datetime.fromisoformat(text).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def format_iso(ts: Optional[int]) -> Optional[str]:
+    """Millisecondes epoch -> ISO 8601 en UTC"""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts / 1000, timezone.utc).isoformat(timespec='milliseconds')
+
+
+class Message:
+    """
+    Message de conversation compact, partagé par utils/ et l'interface.
+
+    Le timestamp est parsé une seule fois en millisecondes epoch; le rôle et
+    l'identifiant de session sont internés, ce qui évite une chaîne par
+    message sur les gros historiques.
+    """
+
+    __slots__ = ("role", "content", "ts", "session_id", "client_id", "id", "metadata")
+
+    def __init__(self,
+                 role: str,
+                 content: str,
+                 ts: Optional[int] = None,
+                 session_id: Optional[str] = None,
+                 client_id: Optional[str] = None,
+                 id=None,
+                 metadata: Optional[Dict] = None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.ts = ts
+        self.session_id = sys.intern(session_id) if session_id else None
+        self.client_id = client_id
+        self.id = id
+        self.metadata = metadata
+
+    @classmethod
+    def now(cls, role: str, content: str, session_id: Optional[str] = None, **kwargs) -> "Message":
+        return cls(role, content, int(time.time() * 1000), session_id, **kwargs)
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "Message":
+        """Construit un message depuis une ligne chat_history (ou un enregistrement d'outbox)"""
+        return cls(
+            row['role'],
+            row['content'],
+            parse_timestamp(row.get('timestamp')),
+            row.get('session_id'),
+            row.get('client_id'),
+            row.get('id'),
+            row.get('metadata') or None
+        )
+
+    def to_row(self) -> Dict:
+        """Ligne chat_history prête à écrire"""
+        return {
+            "client_id": self.client_id,
+            "session_id": self.session_id,
+            "role": self.role,
+            "content": self.content,
+            "timestamp": self.isoformat(),
+            "metadata": self.metadata or {}
+        }
+
+    def to_api(self) -> Dict:
+        """Message au format de l'API OpenAI"""
+        return {"role": self.role, "content": self.content}
+
+    @property
+    def is_user(self) -> bool:
+        return self.role == 'user'
+
+    @property
+    def key(self) -> str:
+        """Identifiant stable pour la déduplication"""
+        return str(self.client_id or self.id or (self.ts, self.role, self.content))
+
+    def isoformat(self) -> Optional[str]:
+        return format_iso(self.ts)
+
+    def time_label(self) -> str:
+        """Heure locale HH:MM affichée dans les bulles"""
+        if self.ts is None:
+            return "maintenant"
+        return time.strftime('%H:%M', time.localtime(self.ts // 1000))
+
+    def __repr__(self):
+        return f"Message({self.role}, {self.content[:30]!r}, ts={self.ts})"
@@ -0,0 +1,116 @@
+import os
+import re
+from typing import Dict, List, Optional
+
+# Indices de code: blocs markdown, mots-clés et ponctuation typiques
+_CODE_RE = re.compile(
+    r"```|\bdef |\bclass |\bimport |\bfunction\b|\breturn\b|=>|;\s*$|\{\s*$|</?\w+>|SELECT\s|\bconst ",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Demandes qui méritent le grand modèle même si elles sont courtes
+_HARD_RE = re.compile(
+    r"\b(explique|expliquer|analyse|analyser|compare|comparer|démontre|démontrer|prouve|"
+    r"raisonne|étape par étape|algorithme|optimise|architecture|stratégie|debug|bug|erreur|"
+    r"traduis|rédige|résume|calcule|explain|analyze|prove|step by step)\b",
+    re.IGNORECASE
+)
+
+
+class Route:
+    """Décision de routage pour une requête"""
+
+    __slots__ = ("model", "max_tokens", "fallbacks", "tier", "reason")
+
+    def __init__(self, model: str, max_tokens: int, fallbacks: List[str], tier: str, reason: str):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.fallbacks = fallbacks
+        self.tier = tier
+        self.reason = reason
+
+    def candidates(self) -> List[str]:
+        """Modèle principal suivi des modèles de repli, sans doublon"""
+        return list(dict.fromkeys([self.model] + self.fallbacks))
+
+    def __repr__(self):
+        return f"Route({self.tier}: {self.model}, max_tokens={self.max_tokens}, {self.reason})"
+
+
+class RoutingPolicy:
+    """
+    Politique de routage configurable (modèles, seuils, délais)
+    """
+
+    def __init__(self,
+                 small_model: str = "gpt-3.5-turbo-1106",
+                 large_model: str = "gpt-4-1106-preview",
+                 small_max_tokens: int = 600,
+                 large_max_tokens: int = 2000,
+                 short_message_chars: int = 280,
+                 long_history_messages: int = 8,
+                 small_timeout: float = 20.0,
+                 large_timeout: float = 60.0,
+                 fallbacks: Optional[Dict[str, List[str]]] = None):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.small_max_tokens = small_max_tokens
+        self.large_max_tokens = large_max_tokens
+        self.short_message_chars = short_message_chars
+        self.long_history_messages = long_history_messages
+        self.small_timeout = small_timeout
+        self.large_timeout = large_timeout
+        # Modèles essayés, dans l'ordre, si le modèle choisi échoue
+        self.fallbacks = fallbacks or {
+            large_model: [small_model],
+            small_model: [large_model]
+        }
+
+    @classmethod
+    def from_env(cls) -> "RoutingPolicy":
+        """Surcharge des modèles via ONLINEX_SMALL_MODEL / ONLINEX_LARGE_MODEL"""
+        return cls(
+            small_model=os.getenv('ONLINEX_SMALL_MODEL', "gpt-3.5-turbo-1106"),
+            large_model=os.getenv('ONLINEX_LARGE_MODEL', "gpt-4-1106-preview")
+        )
+
+
+class ModelRouter:
+    """
+    Classifie localement chaque requête (longueur, historique, image, code)
+    et choisit entre un modèle rapide et le grand modèle.
+    """
+
+    def __init__(self, policy: Optional[RoutingPolicy] = None):
+        self.policy = policy or RoutingPolicy.from_env()
+
+    def classify(self, message: str, history_length: int = 0, has_image: bool = False) -> str:
+        """Retourne la raison pour laquelle la requête est complexe, ou '' si elle est simple"""
+        policy = self.policy
+        if has_image:
+            return "image"
+        if _CODE_RE.search(message):
+            return "code"
+        if len(message) > policy.short_message_chars:
+            return "long"
+        if _HARD_RE.search(message):
+            return "difficile"
+        if history_length >= policy.long_history_messages and len(message) > policy.short_message_chars // 2:
+            return "contexte"
+        return ""
+
+    def route(self, message: str, history_length: int = 0, has_image: bool = False) -> Route:
+        policy = self.policy
+        reason = self.classify(message, history_length, has_image)
+
+        if reason:
+            model, max_tokens, tier = policy.large_model, policy.large_max_tokens, "large"
+        else:
+            model, max_tokens, tier = policy.small_model, policy.small_max_tokens, "small"
+            reason = "simple"
+
+        return Route(model, max_tokens, policy.fallbacks.get(model, []), tier, reason)
+
+    def timeout_for(self, model: str) -> float:
+        policy = self.policy
+        return policy.small_timeout if model == policy.small_model else policy.large_timeout
@@ -3,21 +3,28 @@ import openai
 import requests
 import json
 import base64
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
 from datetime import datetime
-import logging
 
-# Configuration du logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("OnlineX_AI")
+from utils.model_router import ModelRouter
+from utils.provider_pool import ProviderPool, CHAT, IMAGE, AUDIO, EMBEDDING
+from utils.message import Message
+from utils.history import ConversationHistory
+from utils.concurrency import UsageCounters
+from utils.prompts import CHAT_TEMPLATE, enhance_image_prompt
+from utils.memory import estimate_tokens
+from utils.token_budget import TokenLedger
+from utils.log import get_logger, redact
+
+logger = get_logger("ai")
 
 class OpenAIClient:
     """
     Client OpenAI avancé pour Online X Chat AI
-    Supporte le chat, les images, et bientôt l'audio/vidéo
+    Supporte le chat, les images et l'audio (transcription, synthèse vocale)
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, memory=None):
         """
         Initialise le client OpenAI avec gestion d'erreur robuste
         """
@@ -29,39 +36,69 @@ class OpenAIClient:
         # Configuration OpenAI
         openai.api_key = self.api_key
         
+        # Pool de clés/endpoints (OPENAI_API_KEYS, serveur local, hedging)
+        self.provider_pool = ProviderPool.from_env(self.api_key)
+        
         # Modèles par défaut
         self.chat_model = "gpt-4-1106-preview"  # GPT-4 Turbo
         self.image_model = "dall-e-3"
         self.vision_model = "gpt-4-vision-preview"
+        self.transcription_model = "whisper-1"
+        self.speech_model = "tts-1"
+        self.speech_voice = os.getenv('ONLINEX_TTS_VOICE', "nova")
         
         # Configuration des paramètres
         self.default_max_tokens = 2000
         self.default_temperature = 0.7
         
+        # Routage automatique petit/grand modèle (désactivé par set_model)
+        self.router = ModelRouter()
+        self.auto_routing = os.getenv('ONLINEX_AUTO_ROUTING', '1') != '0'
+        
         # Historique des conversations pour le contexte
-        self.conversation_history: List[Dict] = []
         self.max_history_length = 10
+        self.conversation_history = ConversationHistory(
+            maxlen=self.max_history_length,
+            context_size=6,
+            template=CHAT_TEMPLATE
+        )
         
-        # Statistiques d'usage
-        self.usage_stats = {
-            "total_requests": 0,
-            "chat_requests": 0,
-            "image_requests": 0,
-            "last_request": None
-        }
+        # Mémoire à long terme (RetrievalMemory), optionnelle
+        self.memory = memory
+        self.memory_top_k = 4
+        self.memory_token_budget = 400
+        
+        # Moniteur de santé (HealthMonitor), renseigné par l'application
+        self.health = None
+        
+        # Tokens par session et par modèle, budgets journaliers (persisté si l'application fournit un fichier)
+        self.ledger = TokenLedger.from_env()
+        
+        # La mémoire vectorise via le pool d'endpoints et la comptabilité du client
+        if self.memory is not None and self.memory.embedder is None:
+            self.memory.embedder = self.embed
+        
+        # Statistiques d'usage (compteurs atomiques, partagés entre threads)
+        self.usage_stats = UsageCounters(
+            ["total_requests", "chat_requests", "image_requests", "fallbacks"],
+            ["last_model", "last_request"]
+        )
         
         logger.info("✅ Client OpenAI initialisé avec succès")
     
-    def _make_request(self, func, *args, **kwargs):
+    def _make_request(self, func, *args, hedge: Optional[bool] = False, kind: str = CHAT, **kwargs):
         """
         Wrapper pour toutes les requêtes OpenAI avec gestion d'erreur
+        hedge=None applique la politique du pool (requêtes doublées pour le chat)
+        kind : type de requête, seuls les endpoints qui le servent sont sollicités
         """
         try:
-            self.usage_stats["total_requests"] += 1
-            self.usage_stats["last_request"] = datetime.now().isoformat()
+            self.usage_stats.mark_request()
             
-            response = func(*args, **kwargs)
-            logger.info(f"✅ Requête OpenAI réussie")
+            response = self.provider_pool.call(func, *args, hedge=hedge, kind=kind, **kwargs)
+            if self.health is not None:
+                self.health.report_success("openai")
+            logger.debug("✅ Requête OpenAI réussie", every=20)
             return response
             
         except openai.error.AuthenticationError:
@@ -72,136 +109,249 @@ class OpenAIClient:
         except openai.error.RateLimitError:
             error_msg = "⚠️ Limite de taux dépassée. Réessaye dans quelques instants."
             logger.warning(error_msg)
-            return {"error": error_msg}
+            return {"error": error_msg, "retryable": True}
             
         except openai.error.APIConnectionError:
             error_msg = "🔌 Erreur de connexion à l'API OpenAI. Vérifie ta connexion internet."
             logger.error(error_msg)
-            return {"error": error_msg}
+            if self.health is not None:
+                self.health.report_failure("openai", "APIConnectionError")
+            return {"error": error_msg, "retryable": True}
             
         except openai.error.Timeout:
             error_msg = "⏰ Timeout de l'API OpenAI. Réessaye."
             logger.error(error_msg)
-            return {"error": error_msg}
+            if self.health is not None:
+                self.health.report_failure("openai", "Timeout")
+            return {"error": error_msg, "retryable": True}
             
         except openai.error.ServiceUnavailableError:
             error_msg = "🔧 Service OpenAI temporairement indisponible."
             logger.error(error_msg)
-            return {"error": error_msg}
+            return {"error": error_msg, "retryable": True}
             
         except openai.error.InvalidRequestError as e:
             error_msg = f"📝 Requête invalide: {str(e)}"
-            logger.error(error_msg)
+            logger.error("📝 Requête invalide", error=type(e).__name__, exc_info=e)
             return {"error": error_msg}
             
         except Exception as e:
             error_msg = f"❌ Erreur inattendue: {str(e)}"
-            logger.error(error_msg)
+            logger.error("❌ Erreur inattendue", error=type(e).__name__, exc_info=e)
             return {"error": error_msg}
     
-    def _update_conversation_history(self, role: str, content: str):
+    def _update_conversation_history(self,
+                                     user_content: str,
+                                     assistant_content: str,
+                                     history: Optional[ConversationHistory] = None):
         """
         Met à jour l'historique de conversation pour le contexte
+        Le tampon circulaire évince les messages les plus anciens en O(1)
         """
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        self.conversation_history.append(message)
-        
-        # Garde seulement les N derniers messages
-        if len(self.conversation_history) > self.max_history_length:
-            self.conversation_history = self.conversation_history[-self.max_history_length:]
+        (history or self.conversation_history).extend([
+            Message.now("user", user_content),
+            Message.now("assistant", assistant_content)
+        ])
     
-    def _get_system_prompt(self) -> Dict:
+    def get_memory_context(self, user_message: str, history: Optional[ConversationHistory] = None) -> Optional[Dict]:
         """
-        Retourne le prompt système pour Online X Chat AI
+        Construit un message système avec les extraits passés pertinents
         """
+        if self.memory is None:
+            return None
+        
+        recent = (history or self.conversation_history).contents()
+        hits = self.memory.retrieve(
+            user_message,
+            k=self.memory_top_k,
+            token_budget=self.memory_token_budget,
+            exclude_contents=recent
+        )
+        if not hits:
+            return None
+        
+        lines = [f"- ({hit['role']}) {hit['content']}" for hit in hits]
         return {
             "role": "system",
-            "content": """Tu es Online X Chat AI, un assistant IA multimodal avancé, élégant et futuriste.
-
-🎯 **TON IDENTITÉ** :
-- Nom : Online X Chat AI
-- Style : Professionnel, chaleureux et innovant
-- Ton : Équilibré entre technique et accessible
-- Objectif : Aider l'utilisateur de manière exhaustive
-
-🌟 **TES SPÉCIALITÉS** :
-- Réponses détaillées et structurées
-- Création de contenu (texte, idées, stratégies)
-- Analyse et résolution de problèmes
-- Génération d'images créatives
-- Support technique et éducatif
-
-📝 **FORMAT DE RÉPONSE** :
-- Utilise des emojis pertinents pour aérer le texte
-- Structure avec des titres clairs si nécessaire
-- Sois concis mais complet
-- Propose des étapes ou des alternatives quand c'est utile
-
-🚀 **ÉLÉMENTS FUTURISTES** :
-- Terminologie moderne mais accessible
-- Vision orientée solutions
-- Approche innovante des problèmes
-
-N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
+            "content": "Souvenirs pertinents de conversations passées avec l'utilisateur:\n" + "\n".join(lines)
         }
     
+    def _prepare_chat(self,
+                      user_message: str,
+                      history: ConversationHistory,
+                      use_history: bool,
+                      memory_context: Optional[Dict],
+                      retrieve_memory: bool,
+                      max_tokens: Optional[int] = None,
+                      session_id: Optional[str] = None):
+        """
+        Construit les messages et choisit les modèles candidats d'une requête de chat
+        Retourne (messages, candidats, max_tokens borné par le budget, tokens estimés du prompt)
+        """
+        # Souvenirs pertinents (autres sessions)
+        if memory_context is None and retrieve_memory and use_history:
+            memory_context = self.get_memory_context(user_message, history)
+        elif not use_history:
+            memory_context = None
+        
+        # Construction des messages: préfixe précalculé, derniers messages, souvenirs et question
+        messages = history.api_messages(
+            extra_system=[memory_context] if memory_context else None,
+            use_history=use_history,
+            user_message=user_message
+        )
+        prompt_tokens = history.template.estimate_tokens(messages)
+        
+        # Choix du modèle: routage automatique ou modèle fixé manuellement
+        if self.auto_routing:
+            route = self.router.route(user_message, history_length=len(history))
+            candidates, routed_max_tokens = route.candidates(), route.max_tokens
+        else:
+            candidates, routed_max_tokens = [self.chat_model], self.default_max_tokens
+        
+        # Budgets journaliers: max_tokens réduit, puis modèle moins cher à l'approche des limites
+        candidates, max_tokens = self.ledger.apply(candidates, max_tokens or routed_max_tokens, session_id)
+        return messages, candidates, max_tokens, prompt_tokens
+    
+    def _request_chat(self, candidates: List[str], hedge: Optional[bool] = None, **kwargs):
+        """
+        Appel à l'API OpenAI, avec repli sur le modèle suivant en cas d'échec transitoire
+        Retourne (réponse, modèle utilisé)
+        """
+        for attempt, model in enumerate(candidates):
+            if attempt:
+                self.usage_stats.increment("fallbacks")
+                logger.warning("↪️ Repli vers un autre modèle", model=model)
+            
+            response = self._make_request(
+                openai.ChatCompletion.create,
+                model=model,
+                top_p=0.9,
+                frequency_penalty=0.1,
+                presence_penalty=0.1,
+                request_timeout=self.router.timeout_for(model),
+                hedge=hedge,
+                **kwargs
+            )
+            
+            if not (isinstance(response, dict) and response.get("retryable")):
+                break
+        return response, model
+    
     def chat_completion(self, 
                        user_message: str, 
                        use_history: bool = True,
                        max_tokens: Optional[int] = None,
-                       temperature: Optional[float] = None) -> str:
+                       temperature: Optional[float] = None,
+                       memory_context: Optional[Dict] = None,
+                       retrieve_memory: bool = True,
+                       history: Optional[ConversationHistory] = None,
+                       session_id: Optional[str] = None,
+                       usage: Optional[Dict] = None) -> str:
         """
         Génère une réponse de chat avancée avec gestion du contexte
+        memory_context  : souvenirs déjà récupérés (ex: en parallèle par TurnPipeline)
+        retrieve_memory : False si la récupération a déjà été faite par l'appelant
+        history         : historique propre à une session (mode serveur), sinon l'historique du client
+        session_id      : session du tour (comptabilité et budget par session)
+        usage           : dictionnaire rempli avec la consommation du tour (métadonnées du message)
         """
         try:
-            self.usage_stats["chat_requests"] += 1
-            
-            # Construction des messages
-            messages = [self._get_system_prompt()]
-            
-            # Ajout de l'historique si demandé
-            if use_history and self.conversation_history:
-                for msg in self.conversation_history[-6:]:  # Derniers 6 messages
-                    messages.append({"role": msg["role"], "content": msg["content"]})
+            self.usage_stats.increment("chat_requests")
+            history = history or self.conversation_history
             
-            # Ajout du nouveau message
-            messages.append({"role": "user", "content": user_message})
+            messages, candidates, max_tokens, prompt_tokens = self._prepare_chat(
+                user_message, history, use_history, memory_context, retrieve_memory, max_tokens, session_id
+            )
             
-            # Appel à l'API OpenAI
-            response = self._make_request(
-                openai.ChatCompletion.create,
-                model=self.chat_model,
+            response, model = self._request_chat(
+                candidates,
                 messages=messages,
-                max_tokens=max_tokens or self.default_max_tokens,
-                temperature=temperature or self.default_temperature,
-                top_p=0.9,
-                frequency_penalty=0.1,
-                presence_penalty=0.1
+                max_tokens=max_tokens,
+                temperature=temperature or self.default_temperature
             )
             
             if isinstance(response, dict) and "error" in response:
                 return response["error"]
             
+            self.usage_stats.set("last_model", model)
+            
             # Extraction de la réponse
             ai_response = response.choices[0].message.content
             
             # Mise à jour de l'historique
-            self._update_conversation_history("user", user_message)
-            self._update_conversation_history("assistant", ai_response)
+            self._update_conversation_history(user_message, ai_response, history)
+            
+            turn_usage = self.ledger.record(
+                session_id, model, response.usage.prompt_tokens, response.usage.completion_tokens
+            )
+            if usage is not None:
+                usage.update(turn_usage)
             
-            logger.info(f"💬 Chat completion réussi - Tokens: {response.usage.total_tokens}")
+            logger.info("💬 Chat completion réussi", model=model, tokens=response.usage.total_tokens, estimated_prompt=prompt_tokens)
             return ai_response
             
         except Exception as e:
             error_msg = f"❌ Erreur lors de la génération de réponse: {str(e)}"
-            logger.error(error_msg)
+            logger.error("❌ Erreur lors de la génération de réponse", error=type(e).__name__, exc_info=e)
             return error_msg
     
+    def stream_chat_completion(self,
+                               user_message: str,
+                               history: Optional[ConversationHistory] = None,
+                               max_tokens: Optional[int] = None,
+                               temperature: Optional[float] = None,
+                               memory_context: Optional[Dict] = None,
+                               session_id: Optional[str] = None,
+                               usage: Optional[Dict] = None,
+                               retrieve_memory: bool = True) -> Iterator[str]:
+        """
+        Variante en streaming de chat_completion: produit les fragments de la
+        réponse au fur et à mesure. L'historique est mis à jour à la fin.
+        Pas de requêtes doublées: un flux ne peut pas être rejoué.
+        Le flux ne renvoie pas l'usage: les tokens sont estimés localement.
+        """
+        try:
+            self.usage_stats.increment("chat_requests")
+            history = history or self.conversation_history
+            
+            messages, candidates, max_tokens, prompt_tokens = self._prepare_chat(
+                user_message, history, True, memory_context, retrieve_memory, max_tokens, session_id
+            )
+            
+            response, model = self._request_chat(
+                candidates,
+                hedge=False,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature or self.default_temperature,
+                stream=True
+            )
+            
+            if isinstance(response, dict) and "error" in response:
+                yield response["error"]
+                return
+            
+            self.usage_stats.set("last_model", model)
+            
+            parts = []
+            for chunk in response:
+                delta = chunk.choices[0].delta.get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            
+            answer = "".join(parts)
+            self._update_conversation_history(user_message, answer, history)
+            turn_usage = self.ledger.record(session_id, model, prompt_tokens, estimate_tokens(answer), estimated=True)
+            if usage is not None:
+                usage.update(turn_usage)
+            logger.info("💬 Chat completion (stream) réussi", model=model, estimated_prompt=prompt_tokens)
+            
+        except Exception as e:
+            logger.error("❌ Erreur lors de la génération de réponse", error=type(e).__name__, exc_info=e)
+            yield f"❌ Erreur lors de la génération de réponse: {str(e)}"
+    
     def generate_image(self, 
                       prompt: str, 
                       size: str = "1024x1024",
@@ -211,13 +361,14 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
         Génère une image avec DALL-E 3 avec des paramètres avancés
         """
         try:
-            self.usage_stats["image_requests"] += 1
+            self.usage_stats.increment("image_requests")
             
             # Amélioration du prompt pour DALL-E 3
-            enhanced_prompt = self._enhance_image_prompt(prompt)
+            enhanced_prompt = enhance_image_prompt(prompt)
             
             response = self._make_request(
                 openai.Image.create,
+                kind=IMAGE,
                 model=self.image_model,
                 prompt=enhanced_prompt,
                 size=size,
@@ -232,31 +383,16 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
             image_url = response.data[0].url
             
             # Mise à jour de l'historique
-            self._update_conversation_history("user", f"[Génération d'image] {prompt}")
-            self._update_conversation_history("assistant", f"🖼️ Image générée: {image_url}")
+            self._update_conversation_history(f"[Génération d'image] {prompt}", f"🖼️ Image générée: {image_url}")
             
-            logger.info(f"🎨 Image générée avec succès: {prompt[:50]}...")
+            logger.info("🎨 Image générée avec succès", prompt=redact(prompt))
             return image_url
             
         except Exception as e:
             error_msg = f"❌ Erreur lors de la génération d'image: {str(e)}"
-            logger.error(error_msg)
+            logger.error("❌ Erreur lors de la génération d'image", error=type(e).__name__, exc_info=e)
             return error_msg
     
-    def _enhance_image_prompt(self, prompt: str) -> str:
-        """
-        Améliore les prompts d'image pour de meilleurs résultats
-        """
-        enhancements = [
-            "Haute qualité, détaillé, professionnel",
-            "Style futuriste et cyberpunk",
-            "Éclairage dramatique, couleurs vibrantes",
-            "8K, ultra HD, rendu réaliste"
-        ]
-        
-        enhanced = f"{prompt}. {', '.join(enhancements)}"
-        return enhanced
-    
     def vision_analysis(self, image_url: str, question: str) -> str:
         """
         Analyse une image avec GPT-4 Vision
@@ -286,14 +422,13 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
             analysis = response.choices[0].message.content
             
             # Mise à jour de l'historique
-            self._update_conversation_history("user", f"[Analyse d'image] {question}")
-            self._update_conversation_history("assistant", f"🔍 Analyse: {analysis}")
+            self._update_conversation_history(f"[Analyse d'image] {question}", f"🔍 Analyse: {analysis}")
             
             return analysis
             
         except Exception as e:
             error_msg = f"❌ Erreur lors de l'analyse d'image: {str(e)}"
-            logger.error(error_msg)
+            logger.error("❌ Erreur lors de l'analyse d'image", error=type(e).__name__, exc_info=e)
             return error_msg
     
     def multi_modal_chat(self, text: str, image_url: Optional[str] = None) -> str:
@@ -301,7 +436,7 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
         Chat multimodal supportant texte + image
         """
         try:
-            messages = [self._get_system_prompt()]
+            messages = [self.conversation_history.system_prompt]
             
             content = [{"type": "text", "text": text}]
             if image_url:
@@ -310,7 +445,7 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
                     "image_url": {"url": image_url}
                 })
             
-            messages.append({"
+            messages.append({
                 "role": "user",
                 "content": content
             })
@@ -329,9 +464,83 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
             
         except Exception as e:
             error_msg = f"❌ Erreur chat multimodal: {str(e)}"
-            logger.error(error_msg)
+            logger.error("❌ Erreur chat multimodal", error=type(e).__name__, exc_info=e)
             return error_msg
     
+    def embed(self, texts: List[str], model: str = "text-embedding-ada-002") -> List[List[float]]:
+        """
+        Vectorise des textes (mémoire à long terme); lève une exception en cas d'échec
+        pour que l'appelant remette le lot en file
+        """
+        response = self._make_request(openai.Embedding.create, kind=EMBEDDING, model=model, input=texts)
+        if isinstance(response, dict) and "error" in response:
+            raise RuntimeError(response["error"])
+        self.ledger.record(None, model, response["usage"]["prompt_tokens"], 0)
+        ordered = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in ordered]
+    
+    def transcribe_audio(self, audio: bytes, filename: str = "audio.wav", language: str = "fr") -> str:
+        """
+        Transcrit un extrait audio (ex: un bloc WAV du micro)
+        Retourne une chaîne vide en cas d'échec: un bloc perdu ne doit pas injecter d'erreur dans le texte
+        """
+        response = self._make_request(
+            openai.Audio.transcribe_raw,
+            kind=AUDIO,
+            model=self.transcription_model,
+            file=audio,
+            filename=filename,
+            language=language,
+            request_timeout=30
+        )
+        if isinstance(response, dict) and "error" in response:
+            return ""
+        return response.get("text", "")
+    
+    @staticmethod
+    def _post_speech(api_key: str, api_base: Optional[str] = None, **payload) -> bytes:
+        # Endpoint absent du SDK openai 0.28: appel HTTP direct
+        response = requests.post(
+            f"{api_base or openai.api_base}/audio/speech",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json=payload,
+            timeout=30
+        )
+        if response.status_code >= 500:
+            raise openai.error.ServiceUnavailableError(f"synthèse vocale: HTTP {response.status_code}")
+        response.raise_for_status()
+        return response.content
+    
+    def synthesize_speech(self, text: str, voice: Optional[str] = None, response_format: str = "mp3") -> Optional[bytes]:
+        """
+        Synthèse vocale d'un texte court (une phrase): retourne l'audio, ou None en cas d'échec
+        """
+        response = self._make_request(
+            self._post_speech,
+            kind=AUDIO,
+            model=self.speech_model,
+            input=text,
+            voice=voice or self.speech_voice,
+            response_format=response_format
+        )
+        if isinstance(response, dict) and "error" in response:
+            return None
+        return response
+    
+    def ping(self, timeout: float = 3.0) -> bool:
+        """
+        Vérification de connectivité légère: fiche d'un seul modèle
+        (petite réponse) sur le premier endpoint, avec un délai court
+        """
+        endpoint = self.provider_pool.endpoints[0]
+        model = endpoint.model or self.chat_model
+        response = requests.get(
+            f"{endpoint.api_base or openai.api_base}/models/{model}",
+            headers={"Authorization": f"Bearer {endpoint.api_key}"},
+            timeout=timeout
+        )
+        return response.status_code == 200
+    
     def get_models(self) -> List[str]:
         """
         Récupère la liste des modèles disponibles
@@ -340,7 +549,7 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
             models = openai.Model.list()
             return [model.id for model in models.data]
         except Exception as e:
-            logger.error(f"❌ Erreur récupération modèles: {e}")
+            logger.error("❌ Erreur récupération modèles", error=e)
             return []
     
     def get_usage_statistics(self) -> Dict:
@@ -348,10 +557,12 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
         Retourne les statistiques d'usage
         """
         return {
-            **self.usage_stats,
+            **self.usage_stats.snapshot(),
             "conversation_history_length": len(self.conversation_history),
+            "endpoints": self.provider_pool.health(),
+            "tokens_today": self.ledger.snapshot(),
             "active_models": {
-                "chat": self.chat_model,
+                "chat": "auto" if self.auto_routing else self.chat_model,
                 "image": self.image_model,
                 "vision": self.vision_model
             }
@@ -372,14 +583,15 @@ N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
         
         if model_type == "chat" and model_name.startswith("gpt"):
             self.chat_model = model_name
-            logger.info(f"🔧 Modèle chat changé vers: {model_name}")
+            self.auto_routing = False
+            logger.info("🔧 Modèle chat changé", model=model_name)
         
         elif model_type == "image" and model_name.startswith("dall-e"):
             self.image_model = model_name
-            logger.info(f"🎨 Modèle image changé vers: {model_name}")
+            logger.info("🎨 Modèle image changé", model=model_name)
         
         else:
-            logger.warning(f"⚠️ Modèle non supporté: {model_name}")
+            logger.warning("⚠️ Modèle non supporté", model=model_name)
 
 # Singleton pour une utilisation globale
 _onlinex_ai_instance = None
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from utils.log import get_logger
+
+logger = get_logger("outbox")
+
+# Résultat d'un envoi: confirmé, échec passager (réseau, 5xx) ou refus définitif (4xx, validation)
+SENT, TRANSIENT, REJECTED = "sent", "transient", "rejected"
+
+
+class Outbox:
+    """
+    File d'attente durable des messages à envoyer à Supabase.
+
+    Journal append-only au format JSONL, synchronisé sur disque (fsync)
+    à chaque écriture: une entrée "put" par message, identifié par un UUID
+    généré côté client, et une entrée "ack" quand un lot a été confirmé par
+    le serveur. Au redémarrage, le journal est rejoué pour retrouver les
+    messages non confirmés. Il est réécrit lorsque les entrées confirmées
+    dominent.
+
+    Un message refusé plusieurs fois par le serveur est déplacé dans un
+    fichier de lettres mortes (JSONL) pour ne pas bloquer les suivants.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 compact_threshold: int = 500,
+                 dead_letter_path: Optional[str] = None):
+        self.path = path or os.getenv('ONLINEX_OUTBOX_PATH', 'onlinex_outbox.jsonl')
+        self.dead_letter_path = dead_letter_path or os.path.splitext(self.path)[0] + ".dead.jsonl"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[str, Dict]" = OrderedDict()
+        self._attempts: Dict[str, int] = {}
+        self._acked_since_compaction = 0
+
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    @staticmethod
+    def new_id() -> str:
+        return str(uuid.uuid4())
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal: ignorée
+                    continue
+                if entry.get("op") == "put":
+                    record = entry["record"]
+                    self._pending[record["client_id"]] = record
+                elif entry.get("op") == "ack":
+                    for client_id in entry["ids"]:
+                        self._pending.pop(client_id, None)
+                    self._acked_since_compaction += len(entry["ids"])
+
+    def _write(self, entry: Dict):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, record: Dict) -> str:
+        """Enregistre durablement un message (ajoute client_id si absent)"""
+        record.setdefault("client_id", self.new_id())
+        with self._lock:
+            self._write({"op": "put", "record": record})
+            self._pending[record["client_id"]] = record
+        return record["client_id"]
+
+    def peek(self, limit: int) -> List[Dict]:
+        """Retourne les plus anciens messages non confirmés"""
+        with self._lock:
+            return [record for _, record in zip(range(limit), self._pending.values())]
+
+    def pending_for(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            return [r for r in self._pending.values() if r.get("session_id") == session_id]
+
+    def ack(self, client_ids: List[str]):
+        """Marque des messages comme confirmés par le serveur"""
+        if not client_ids:
+            return
+        with self._lock:
+            self._ack_locked(client_ids)
+
+    def _ack_locked(self, client_ids: List[str]):
+        self._write({"op": "ack", "ids": list(client_ids)})
+        for client_id in client_ids:
+            self._pending.pop(client_id, None)
+            self._attempts.pop(client_id, None)
+        self._acked_since_compaction += len(client_ids)
+        if self._acked_since_compaction >= self.compact_threshold:
+            self._compact()
+
+    def drop_sessions(self, session_ids: Iterable[str]) -> int:
+        """
+        Abandonne les messages en attente de sessions supprimées (entrée "ack"
+        dans le journal), pour qu'ils ne soient pas renvoyés après la suppression
+        Retourne le nombre de messages abandonnés
+        """
+        targets = set(session_ids)
+        with self._lock:
+            client_ids = [cid for cid, record in self._pending.items() if record.get("session_id") in targets]
+            if client_ids:
+                self._ack_locked(client_ids)
+        return len(client_ids)
+
+    def fail(self, records: List[Dict], max_attempts: int, error: str = "") -> int:
+        """
+        Compte un refus du serveur pour chaque message; au-delà de max_attempts,
+        le message part dans le fichier de lettres mortes et quitte l'outbox
+        Les tentatives sont comptées en mémoire (remises à zéro au redémarrage)
+        Retourne le nombre de messages abandonnés
+        """
+        with self._lock:
+            dead = []
+            for record in records:
+                client_id = record["client_id"]
+                if client_id not in self._pending:
+                    continue
+                self._attempts[client_id] = self._attempts.get(client_id, 0) + 1
+                if self._attempts[client_id] >= max_attempts:
+                    dead.append(record)
+            if not dead:
+                return 0
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for record in dead:
+                    entry = {"record": record, "attempts": self._attempts[record["client_id"]],
+                             "error": error, "at": time.time()}
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._ack_locked([record["client_id"] for record in dead])
+        logger.error("☠️ Messages refusés déplacés en lettres mortes", count=len(dead), path=self.dead_letter_path)
+        return len(dead)
+
+    def _compact(self):
+        """Réécrit le journal avec les seuls messages en attente (remplacement atomique)"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as tmp:
+            for record in self._pending.values():
+                tmp.write(json.dumps({"op": "put", "record": record}, ensure_ascii=False) + "\n")
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._acked_since_compaction = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class OutboxReplayer:
+    """
+    Vide l'outbox en arrière-plan, par lots, dès que la connexion le permet.
+
+    flush_fn reçoit un lot de messages et doit les écrire de façon
+    idempotente (upsert sur client_id); elle retourne SENT, TRANSIENT ou
+    REJECTED (True/False valent SENT/TRANSIENT). Un lot refusé par un
+    serveur joignable est renvoyé message par message: les messages
+    acceptés sont confirmés, ceux refusés comptent une tentative et partent
+    en lettres mortes après max_attempts. Les échecs passagers ne sont
+    jamais comptés. En cas d'échec, les tentatives sont espacées (backoff).
+    """
+
+    def __init__(self,
+                 outbox: Outbox,
+                 flush_fn: Callable[[List[Dict]], Union[str, bool]],
+                 batch_size: int = 50,
+                 interval: float = 2.0,
+                 max_backoff: float = 60.0,
+                 is_online: Optional[Callable[[], bool]] = None,
+                 is_up: Optional[Callable[[], bool]] = None,
+                 max_attempts: int = 5):
+        """
+        is_online : connexion disponible (sinon aucun envoi)
+        is_up     : le serveur de destination répond (sinon un refus n'est pas compté)
+        """
+        self.outbox = outbox
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.is_online = is_online
+        self.is_up = is_up
+        self.max_attempts = max_attempts
+
+        # Tenu pendant chaque envoi: une suppression de session attend l'envoi en cours
+        self.lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._backoff = interval
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def notify(self):
+        """Signale de nouveaux messages à envoyer"""
+        self._wakeup.set()
+
+    def _send(self, batch: List[Dict]) -> str:
+        try:
+            status = self.flush_fn(batch)
+        except Exception as e:
+            logger.error("❌ Envoi outbox échoué", count=len(batch), error=e)
+            return TRANSIENT
+        if isinstance(status, bool):
+            return SENT if status else TRANSIENT
+        return status
+
+    def flush_once(self) -> bool:
+        """Envoie les lots en attente; False s'il reste des messages refusés"""
+        while True:
+            with self.lock:
+                batch = self.outbox.peek(self.batch_size)
+                if not batch:
+                    return True
+                status = self._send(batch)
+                if status == SENT:
+                    self.outbox.ack([record["client_id"] for record in batch])
+                    continue
+                # Échec passager ou serveur injoignable: rien n'est compté, on réessaiera
+                if status != REJECTED or (self.is_up is not None and not self.is_up()):
+                    return False
+
+                # Lot refusé: un message invalide ne doit pas bloquer les autres
+                sent, rejected, interrupted = [], [], False
+                for record in batch:
+                    status = self._send([record]) if len(batch) > 1 else REJECTED
+                    if status == SENT:
+                        sent.append(record)
+                    elif status == REJECTED:
+                        rejected.append(record)
+                    else:
+                        interrupted = True
+                        break
+                self.outbox.ack([record["client_id"] for record in sent])
+                dead = self.outbox.fail(rejected, self.max_attempts, error="refusé par le serveur")
+                if interrupted or dead < len(rejected):
+                    return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self._backoff)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            if len(self.outbox) == 0:
+                continue
+            if self.is_online is not None and not self.is_online():
+                continue
+
+            if self.flush_once():
+                self._backoff = self.interval
+            else:
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def stop(self, flush: bool = True, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout=timeout)
+        if flush:
+            self.flush_once()
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+from utils.log import get_logger
+
+logger = get_logger("profile")
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000
+
+
+class Profiler:
+    """
+    Mode développeur: traces au format Chrome trace-event (chrome://tracing,
+    Perfetto), ouvrables hors ligne.
+
+    - spans : durée des fonctions instrumentées, avec la mémoire allouée
+      (tracemalloc) pendant l'appel
+    - échantillonnage : piles de tous les threads toutes les sample_interval
+    - frames Kivy : durée de chaque frame, frames lentes en évidence
+
+    Désactivé, une fonction instrumentée ne coûte qu'un test de booléen.
+    """
+
+    def __init__(self, sample_interval: float = 0.005, max_events: int = 200_000):
+        self.sample_interval = sample_interval
+        self.enabled = False
+        self._events: deque = deque(maxlen=max_events)
+        self._samples: deque = deque(maxlen=max_events)
+        self._stack_frames: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._frame_event = None
+        self._owns_tracemalloc = False
+        self._pid = os.getpid()
+
+    # ---- Activation ---------------------------------------------------
+
+    def start(self, frame_timing: bool = True):
+        if self.enabled:
+            return
+        self._events.clear()
+        self._samples.clear()
+        self._stack_frames.clear()
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(10)
+        self.enabled = True
+
+        self._sampler = threading.Thread(target=self._sample_loop, name="onlinex-profiler")
+        self._sampler.daemon = True
+        self._sampler.start()
+        if frame_timing:
+            self._start_frame_timing()
+        logger.warning("🔬 Profilage activé")
+
+    def stop(self, path: Optional[str] = None) -> Optional[str]:
+        """Arrête le profilage et écrit la trace (retourne son chemin)"""
+        if not self.enabled:
+            return None
+        self.enabled = False
+        if self._frame_event is not None:
+            self._frame_event.cancel()
+            self._frame_event = None
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+        path = self.dump(path)
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        return path
+
+    def toggle(self, path: Optional[str] = None) -> Optional[str]:
+        if self.enabled:
+            return self.stop(path)
+        self.start()
+        return None
+
+    # ---- Spans ----------------------------------------------------------
+
+    def add_span(self, name: str, cat: str, start_us: float, end_us: float, args: Optional[Dict] = None):
+        self._events.append({
+            "name": name, "cat": cat, "ph": "X",
+            "ts": start_us, "dur": end_us - start_us,
+            "pid": self._pid, "tid": threading.get_ident(),
+            "args": args or {}
+        })
+
+    def add_counter(self, name: str, values: Dict[str, float]):
+        self._events.append({
+            "name": name, "ph": "C", "ts": _now_us(),
+            "pid": self._pid, "tid": 0, "args": values
+        })
+
+    def traced(self, name: Optional[str] = None, cat: str = "app"):
+        """Décorateur: enregistre la durée et la mémoire allouée de chaque appel"""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                memory_before = tracemalloc.get_traced_memory()[0]
+                start = _now_us()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    end = _now_us()
+                    if self.enabled:
+                        allocated = tracemalloc.get_traced_memory()[0] - memory_before
+                        self.add_span(span_name, cat, start, end, {"alloc_kb": round(allocated / 1024, 1)})
+            return wrapper
+        return decorator
+
+    def instrument(self, obj, methods: Iterable[str], cat: str):
+        """Instrumente des méthodes d'une instance (ex: clients OpenAI/Supabase)"""
+        prefix = type(obj).__name__
+        for method in methods:
+            bound = getattr(obj, method, None)
+            if bound is not None:
+                setattr(obj, method, self.traced(f"{prefix}.{method}", cat)(bound))
+
+    # ---- Échantillonnage --------------------------------------------------
+
+    def _frame_id(self, stack: List[tuple]) -> Optional[int]:
+        """Interne une pile (de la racine vers la feuille) dans l'arbre stackFrames"""
+        parent = None
+        for key in stack:
+            node = (parent, key)
+            frame_id = self._stack_frames.get(node)
+            if frame_id is None:
+                frame_id = len(self._stack_frames) + 1
+                self._stack_frames[node] = frame_id
+            parent = frame_id
+        return parent
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while self.enabled:
+            ts = _now_us()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    stack.append((code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+                    frame = frame.f_back
+                stack.reverse()
+                with self._lock:
+                    frame_id = self._frame_id(stack)
+                self._samples.append({"cpu": 0, "tid": thread_id, "ts": ts, "name": "sample", "sf": frame_id, "weight": 1})
+            time.sleep(self.sample_interval)
+
+    # ---- Frames Kivy ------------------------------------------------------
+
+    def _start_frame_timing(self, slow_frame: float = 1 / 30):
+        try:
+            from kivy.clock import Clock
+        except ImportError:
+            return
+        last = {"t": _now_us()}
+
+        def on_frame(dt):
+            now = _now_us()
+            duration = now - last["t"]
+            last["t"] = now
+            self.add_counter("frame_ms", {"ms": round(duration / 1000, 2)})
+            if duration / 1e6 > slow_frame:
+                self.add_span("frame lente", "kivy", now - duration, now, {"fps": round(1e6 / duration, 1)})
+            tracemalloc_current, _ = tracemalloc.get_traced_memory()
+            self.add_counter("memoire_mo", {"python": round(tracemalloc_current / 1e6, 2)})
+
+        self._frame_event = Clock.schedule_interval(on_frame, 0)
+
+    # ---- Export -----------------------------------------------------------
+
+    def trace(self) -> Dict:
+        """Trace au format Chrome trace-event (objet JSON)"""
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        with self._lock:
+            stack_frames = {
+                str(frame_id): {
+                    "name": f"{key[0]} ({key[1]}:{key[2]})",
+                    **({"parent": str(parent)} if parent is not None else {})
+                }
+                for (parent, key), frame_id in self._stack_frames.items()
+            }
+
+        top_allocations = []
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            top_allocations = [
+                {"site": str(stat.traceback[0]), "kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:25]
+            ]
+
+        return {
+            "traceEvents": metadata + list(self._events),
+            "stackFrames": stack_frames,
+            "samples": list(self._samples),
+            "displayTimeUnit": "ms",
+            "otherData": {"app": "Online X Chat AI", "top_allocations": top_allocations}
+        }
+
+    def dump(self, path: Optional[str] = None) -> str:
+        path = path or os.path.join(
+            os.getenv('ONLINEX_PROFILE_DIR', '.'),
+            time.strftime("onlinex_trace_%Y%m%d_%H%M%S.json")
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f)
+        logger.warning("📁 Trace enregistrée", path=path, events=len(self._events), samples=len(self._samples))
+        return path
+
+
+# Profiler partagé par l'application (activé par ONLINEX_PROFILE=1 ou le geste caché)
+profiler = Profiler()
+traced = profiler.traced
+
+
+if __name__ == "__main__":
+    def trace_test():
+        """Profile quelques appels et vérifie que la trace est valide"""
+        import tempfile
+
+        @traced("calcul", cat="test")
+        def work(n: int):
+            data = [str(i) * 10 for i in range(n)]
+            time.sleep(0.01)
+            return len(data)
+
+        def plain(n: int):
+            return n
+
+        instrumented = traced("vide")(plain)
+        count = 200_000
+        start = time.perf_counter()
+        for i in range(count):
+            plain(i)
+        reference = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(count):
+            instrumented(i)
+        overhead_ns = (time.perf_counter() - start - reference) / count * 1e9
+        print(f"⚡ Surcoût désactivé: {overhead_ns:.0f} ns par appel")
+
+        profiler.start(frame_timing=False)
+        for _ in range(5):
+            work(50_000)
+        path = profiler.stop(os.path.join(tempfile.gettempdir(), "onlinex_trace_test.json"))
+
+        with open(path, encoding="utf-8") as f:
+            trace = json.load(f)
+        spans = [event for event in trace["traceEvents"] if event.get("name") == "calcul"]
+        assert len(spans) == 5 and all(span["dur"] >= 10_000 for span in spans)
+        assert trace["samples"] and all(str(s["sf"]) in trace["stackFrames"] for s in trace["samples"])
+        print(f"✅ Trace valide: {len(spans)} spans, {len(trace['samples'])} échantillons, "
+              f"{len(trace['stackFrames'])} frames de pile -> {path}")
+        print(f"📊 Allocation max d'un span: {max(span['args']['alloc_kb'] for span in spans)} Ko")
+
+    trace_test()
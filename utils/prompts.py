@@ -0,0 +1,134 @@
+import json
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from utils.memory import estimate_tokens
+
+# Prompt système d'Online X Chat AI (constant: premier bloc de chaque requête)
+SYSTEM_PROMPT = """Tu es Online X Chat AI, un assistant IA multimodal avancé, élégant et futuriste.
+
+🎯 **TON IDENTITÉ** :
+- Nom : Online X Chat AI
+- Style : Professionnel, chaleureux et innovant
+- Ton : Équilibré entre technique et accessible
+- Objectif : Aider l'utilisateur de manière exhaustive
+
+🌟 **TES SPÉCIALITÉS** :
+- Réponses détaillées et structurées
+- Création de contenu (texte, idées, stratégies)
+- Analyse et résolution de problèmes
+- Génération d'images créatives
+- Support technique et éducatif
+
+📝 **FORMAT DE RÉPONSE** :
+- Utilise des emojis pertinents pour aérer le texte
+- Structure avec des titres clairs si nécessaire
+- Sois concis mais complet
+- Propose des étapes ou des alternatives quand c'est utile
+
+🚀 **ÉLÉMENTS FUTURISTES** :
+- Terminologie moderne mais accessible
+- Vision orientée solutions
+- Approche innovante des problèmes
+
+N'oublie pas : tu es l'assistant IA le plus avancé et utile possible !"""
+
+SYSTEM_MESSAGE: Dict = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Suffixe ajouté aux prompts d'image (DALL-E 3), construit une seule fois
+IMAGE_ENHANCEMENTS = (
+    "Haute qualité, détaillé, professionnel",
+    "Style futuriste et cyberpunk",
+    "Éclairage dramatique, couleurs vibrantes",
+    "8K, ultra HD, rendu réaliste"
+)
+_IMAGE_SUFFIX = ". " + ", ".join(IMAGE_ENHANCEMENTS)
+
+# Surcoût fixe par message du format chat (rôle, séparateurs)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def enhance_image_prompt(prompt: str) -> str:
+    """Améliore un prompt d'image pour de meilleurs résultats"""
+    return prompt + _IMAGE_SUFFIX
+
+
+def message_tokens(message: Dict) -> int:
+    """Estimation du nombre de tokens d'un message au format API"""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        # Contenu multimodal: seules les parties texte sont comptées
+        content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content)
+
+
+class PromptTemplate:
+    """
+    Préfixe statique d'une famille de requêtes, précalculé une fois.
+
+    Les messages du préfixe sont partagés (jamais recopiés ni modifiés):
+    d'un tour à l'autre, le début du corps JSON envoyé à l'API est identique
+    octet pour octet, ce qui permet la mise en cache du prompt côté serveur.
+    """
+
+    __slots__ = ("prefix", "prefix_json", "prefix_tokens")
+
+    def __init__(self, *static_messages: Dict):
+        self.prefix = tuple(static_messages)
+        # Début du tableau "messages" tel que sérialisé par le client openai (json.dumps)
+        self.prefix_json = json.dumps(list(self.prefix))[:-1]
+        self.prefix_tokens = sum(message_tokens(message) for message in self.prefix)
+
+    def build(self,
+              history: Sequence[Dict] = (),
+              context: Optional[Iterable[Dict]] = None,
+              user_message: Optional[str] = None) -> List[Dict]:
+        """
+        Messages d'une requête: préfixe, historique, contexte variable, question
+        Le contexte variable (souvenirs) est placé après l'historique pour ne
+        pas rompre le préfixe commun entre deux tours
+        """
+        messages = list(self.prefix)
+        messages.extend(history)
+        if context:
+            messages.extend(context)
+        if user_message is not None:
+            messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def estimate_tokens(self, messages: Sequence[Dict]) -> int:
+        """Tokens estimés d'une requête construite par build() (préfixe précalculé)"""
+        return self.prefix_tokens + sum(message_tokens(message) for message in messages[len(self.prefix):])
+
+
+CHAT_TEMPLATE = PromptTemplate(SYSTEM_MESSAGE)
+
+
+if __name__ == "__main__":
+    def prefix_test(turns: int = 5, repeat: int = 20_000):
+        """
+        Vérifie que le préfixe sérialisé est identique d'un tour à l'autre
+        et mesure le coût de construction d'une requête
+        """
+        import time
+        from utils.history import ConversationHistory
+        from utils.message import Message
+
+        history = ConversationHistory(maxlen=10, context_size=6, template=CHAT_TEMPLATE)
+        bodies = []
+        for turn in range(turns):
+            memories = [{"role": "system", "content": f"Souvenirs du tour {turn}"}]
+            messages = history.api_messages(extra_system=memories, user_message=f"question {turn}")
+            bodies.append(json.dumps({"model": "gpt-4-1106-preview", "messages": messages}))
+            history.extend([Message.now("user", f"question {turn}"), Message.now("assistant", f"réponse {turn}")])
+
+        head = '{"model": "gpt-4-1106-preview", "messages": ' + CHAT_TEMPLATE.prefix_json
+        assert all(body.startswith(head) for body in bodies)
+        print(f"✅ Préfixe identique sur {turns} tours ({len(head)} octets, ~{CHAT_TEMPLATE.prefix_tokens} tokens)")
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            history.api_messages(user_message="question")
+        elapsed = (time.perf_counter() - start) / repeat * 1e6
+        print(f"⏱️ Construction d'une requête: {elapsed:.1f} µs")
+
+    prefix_test()
@@ -0,0 +1,276 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, List, Optional
+
+import openai
+
+from utils.log import get_logger
+
+logger = get_logger("pool")
+
+# Types de requêtes qu'un endpoint peut servir
+CHAT, IMAGE, AUDIO, EMBEDDING = "chat", "image", "audio", "embedding"
+ALL_KINDS = frozenset({CHAT, IMAGE, AUDIO, EMBEDDING})
+
+
+class Endpoint:
+    """
+    Une clé API sur un endpoint compatible OpenAI, avec son état de santé
+    """
+
+    def __init__(self,
+                 name: str,
+                 api_key: str,
+                 api_base: Optional[str] = None,
+                 model: Optional[str] = None,
+                 weight: float = 1.0,
+                 kinds: Iterable[str] = ALL_KINDS):
+        """
+        api_base : None pour l'API OpenAI, sinon un serveur compatible (ex: local)
+        model    : modèle de chat imposé sur cet endpoint (serveurs locaux)
+        weight   : préférence relative (plus grand = plus sollicité)
+        kinds    : types de requêtes servis (chat, image, audio, embedding)
+        """
+        self.name = name
+        self.api_key = api_key
+        self.api_base = api_base
+        self.model = model
+        self.weight = weight
+        self.kinds = frozenset(kinds)
+
+        self.latencies = deque(maxlen=50)
+        self.ewma_latency: Optional[float] = None
+        self.inflight = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 5:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def score(self) -> float:
+        """Plus petit = meilleur: latence estimée pondérée par la charge en cours"""
+        latency = self.ewma_latency if self.ewma_latency is not None else 1.0
+        return latency * (1 + self.inflight) / self.weight
+
+    def request_kwargs(self, kwargs: dict, kind: str = CHAT) -> dict:
+        params = dict(kwargs, api_key=self.api_key)
+        if self.api_base:
+            params["api_base"] = self.api_base
+        if self.model and kind == CHAT and "model" in params:
+            params["model"] = self.model
+        return params
+
+    def __repr__(self):
+        return f"Endpoint({self.name}, ewma={self.ewma_latency}, failures={self.failures})"
+
+
+class ProviderPool:
+    """
+    Pool de clés et d'endpoints avec suivi de santé, équilibrage de charge
+    et requêtes doublées (hedging) optionnelles.
+
+    Avec le hedging, si la première tentative n'a pas répondu après le p95
+    de latence de son endpoint, une seconde tentative part sur un autre
+    endpoint et la première réponse reçue est retenue.
+    """
+
+    def __init__(self,
+                 endpoints: List[Endpoint],
+                 hedge: bool = False,
+                 default_hedge_delay: float = 8.0,
+                 min_hedge_delay: float = 1.0,
+                 base_cooldown: float = 5.0,
+                 max_cooldown: float = 120.0,
+                 max_workers: int = 8):
+        if not endpoints:
+            raise ValueError("❌ Aucun endpoint OpenAI configuré")
+
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="onlinex-hedge")
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str] = None) -> "ProviderPool":
+        """
+        Construit le pool depuis l'environnement:
+        - OPENAI_API_KEYS  : clés séparées par des virgules (sinon OPENAI_API_KEY)
+        - OPENAI_API_BASES : endpoints associés (un seul = partagé par toutes les clés)
+        - ONLINEX_LOCAL_LLM_BASE / _MODEL : serveur local compatible OpenAI
+        - ONLINEX_LOCAL_LLM_KINDS : types de requêtes qu'il sert (défaut: chat)
+        - ONLINEX_HEDGE=1  : active les requêtes doublées
+        """
+        keys = [k.strip() for k in os.getenv('OPENAI_API_KEYS', '').split(',') if k.strip()]
+        if api_key and api_key not in keys:
+            keys.insert(0, api_key)
+        if not keys and os.getenv('OPENAI_API_KEY'):
+            keys = [os.getenv('OPENAI_API_KEY')]
+
+        bases = [b.strip() or None for b in os.getenv('OPENAI_API_BASES', '').split(',')] if os.getenv('OPENAI_API_BASES') else []
+
+        endpoints = []
+        for i, key in enumerate(keys):
+            base = bases[i] if i < len(bases) else (bases[0] if len(bases) == 1 else None)
+            endpoints.append(Endpoint(f"openai-{i}", key, api_base=base))
+
+        local_base = os.getenv('ONLINEX_LOCAL_LLM_BASE')
+        if local_base:
+            endpoints.append(Endpoint(
+                "local",
+                os.getenv('ONLINEX_LOCAL_LLM_KEY', 'local'),
+                api_base=local_base,
+                model=os.getenv('ONLINEX_LOCAL_LLM_MODEL'),
+                weight=float(os.getenv('ONLINEX_LOCAL_LLM_WEIGHT', '0.5')),
+                kinds=[k.strip() for k in os.getenv('ONLINEX_LOCAL_LLM_KINDS', CHAT).split(',') if k.strip()]
+            ))
+
+        return cls(endpoints, hedge=os.getenv('ONLINEX_HEDGE', '0') == '1')
+
+    def serving(self, kind: str = CHAT) -> List[Endpoint]:
+        """Endpoints capables de servir ce type de requête"""
+        return [e for e in self.endpoints if kind in e.kinds]
+
+    def pick(self, exclude: Optional[Endpoint] = None, kind: str = CHAT) -> Optional[Endpoint]:
+        """Choisit l'endpoint disponible le mieux noté pour ce type de requête (et réserve une place)"""
+        now = time.monotonic()
+        with self._lock:
+            serving = [e for e in self.serving(kind) if e is not exclude]
+            candidates = [e for e in serving if e.is_available(now)]
+            if not candidates:
+                # Tous en pause: on prend celui dont la pause se termine le plus tôt
+                candidates = serving
+                if not candidates:
+                    return None
+                endpoint = min(candidates, key=lambda e: e.cooldown_until)
+            else:
+                endpoint = min(candidates, key=lambda e: e.score())
+            endpoint.inflight += 1
+            return endpoint
+
+    def _record_success(self, endpoint: Endpoint, latency: float):
+        with self._lock:
+            endpoint.inflight -= 1
+            endpoint.latencies.append(latency)
+            endpoint.ewma_latency = latency if endpoint.ewma_latency is None \
+                else 0.8 * endpoint.ewma_latency + 0.2 * latency
+            endpoint.failures = 0
+            endpoint.cooldown_until = 0.0
+
+    def _record_failure(self, endpoint: Endpoint, error: Exception):
+        with self._lock:
+            endpoint.inflight -= 1
+            if isinstance(error, openai.error.InvalidRequestError):
+                # Erreur de la requête, pas de l'endpoint
+                return
+            endpoint.failures += 1
+            cooldown = min(self.base_cooldown * (2 ** (endpoint.failures - 1)), self.max_cooldown)
+            endpoint.cooldown_until = time.monotonic() + cooldown
+        logger.warning("⚠️ Endpoint en pause", endpoint=endpoint.name, cooldown=round(cooldown), error=type(error).__name__)
+
+    def _attempt(self, endpoint: Endpoint, func: Callable, args, kwargs, kind: str = CHAT):
+        start = time.monotonic()
+        try:
+            response = func(*args, **endpoint.request_kwargs(kwargs, kind))
+        except Exception as e:
+            self._record_failure(endpoint, e)
+            raise
+        self._record_success(endpoint, time.monotonic() - start)
+        return response
+
+    def _hedge_delay(self, endpoint: Endpoint) -> float:
+        p95 = endpoint.p95()
+        if p95 is None:
+            return self.default_hedge_delay
+        return max(p95, self.min_hedge_delay)
+
+    def call(self, func: Callable, *args, hedge: Optional[bool] = None, kind: str = CHAT, **kwargs):
+        """
+        Exécute func sur le meilleur endpoint servant ce type de requête, avec
+        bascule sur un autre endpoint en cas d'échec et hedging optionnel
+        """
+        self.stats["requests"] += 1
+        hedge = self.hedge if hedge is None else hedge
+        primary = self.pick(kind=kind)
+        if primary is None:
+            raise openai.error.ServiceUnavailableError(f"aucun endpoint configuré pour: {kind}")
+
+        if not hedge or len(self.serving(kind)) < 2:
+            try:
+                return self._attempt(primary, func, args, kwargs, kind)
+            except (openai.error.RateLimitError, openai.error.APIConnectionError,
+                    openai.error.Timeout, openai.error.ServiceUnavailableError,
+                    openai.error.AuthenticationError):
+                secondary = self.pick(exclude=primary, kind=kind)
+                if secondary is None:
+                    raise
+                self.stats["failovers"] += 1
+                return self._attempt(secondary, func, args, kwargs, kind)
+
+        futures = {self._executor.submit(self._attempt, primary, func, args, kwargs, kind): primary}
+        done, _ = wait(futures, timeout=self._hedge_delay(primary))
+        hedged = False
+
+        if not done:
+            # Première tentative plus lente que son p95: on double la requête
+            secondary = self.pick(exclude=primary, kind=kind)
+            if secondary is not None:
+                hedged = True
+                self.stats["hedged"] += 1
+                futures[self._executor.submit(self._attempt, secondary, func, args, kwargs, kind)] = secondary
+
+        pending = set(futures)
+        last_error: Optional[Exception] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if futures[future] is not primary:
+                    self.stats["hedge_wins"] += 1
+                return response
+
+            if not pending and not hedged:
+                # Échec rapide de la première tentative: bascule simple
+                hedged = True
+                secondary = self.pick(exclude=primary, kind=kind)
+                if secondary is not None:
+                    self.stats["failovers"] += 1
+                    future = self._executor.submit(self._attempt, secondary, func, args, kwargs, kind)
+                    futures[future] = secondary
+                    pending = {future}
+
+        raise last_error
+
+    def health(self) -> List[dict]:
+        """État de santé de chaque endpoint"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": e.name,
+                    "available": e.is_available(now),
+                    "ewma_latency": e.ewma_latency,
+                    "p95": e.p95(),
+                    "inflight": e.inflight,
+                    "failures": e.failures
+                }
+                for e in self.endpoints
+            ]
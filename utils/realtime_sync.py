@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from realtime.connection import Socket
+
+from utils.message import Message, format_iso
+from utils.log import get_logger
+
+logger = get_logger("sync")
+
+
+class SessionSync:
+    """
+    Synchronisation multi-appareils d'une session via le flux Realtime
+    de Supabase sur chat_history (filtré par session_id).
+
+    Les insertions et suppressions sont poussées vers les callbacks au fil
+    de l'eau. À chaque (re)connexion, les messages manqués sont récupérés
+    par timestamp (backfill) et les doublons sont écartés.
+    """
+
+    def __init__(self,
+                 url: str,
+                 key: str,
+                 on_insert: Callable[[Message], None],
+                 on_delete: Callable[[Dict], None],
+                 backfill: Callable[[str, Optional[str]], List[Message]],
+                 ignore: Optional[Callable[[Message], bool]] = None,
+                 table_name: str = "chat_history",
+                 max_backoff: float = 30.0):
+        """
+        backfill : (session_id, depuis_timestamp) -> messages plus récents
+        ignore   : écarte les messages déjà affichés localement (écrits par cet appareil)
+        """
+        self.ws_url = url.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") \
+            + f"/realtime/v1/websocket?apikey={key}&vsn=1.0.0"
+        self.on_insert = on_insert
+        self.on_delete = on_delete
+        self.backfill = backfill
+        self.ignore = ignore
+        self.table_name = table_name
+        self.max_backoff = max_backoff
+
+        self.session_id: Optional[str] = None
+        # Curseur de rattrapage: dernier timestamp serveur vu (millisecondes epoch)
+        self.last_ts: Optional[int] = None
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._socket: Optional[Socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _accept(self, message: Message) -> bool:
+        """Déduplique et met à jour le curseur de rattrapage"""
+        key = message.key
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen[key] = None
+            while len(self._seen) > 2000:
+                self._seen.popitem(last=False)
+            if message.ts is not None and (self.last_ts is None or message.ts > self.last_ts):
+                self.last_ts = message.ts
+        return not (self.ignore and self.ignore(message))
+
+    def subscribe(self, session_id: str, known: Optional[List[Message]] = None):
+        """
+        Suit une nouvelle session (remplace l'abonnement courant)
+        known : messages déjà affichés, pour dédupliquer et borner le rattrapage
+        """
+        self.stop()
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self.session_id = session_id
+            self.last_ts = None
+            self._seen.clear()
+            for message in known or []:
+                self._seen[message.key] = None
+                # Seuls les messages venant du serveur servent de curseur
+                if message.id is not None and message.ts is not None:
+                    self.last_ts = max(self.last_ts or 0, message.ts)
+
+        self._thread = threading.Thread(target=self._run, args=(generation, session_id))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._generation += 1
+            socket, loop = self._socket, self._loop
+            self._socket = None
+        if socket is not None and getattr(socket, "ws_connection", None) is not None:
+            # Ferme la websocket depuis sa propre boucle asyncio, ce qui termine listen()
+            try:
+                asyncio.run_coroutine_threadsafe(socket.ws_connection.close(), loop)
+            except Exception:
+                pass
+
+    def _active(self, generation: int) -> bool:
+        return generation == self._generation
+
+    def _handle(self, generation: int, payload: Dict):
+        if not self._active(generation):
+            return
+        event = payload.get("type")
+        if event == "INSERT":
+            message = Message.from_row(payload.get("record") or {})
+            if self._accept(message):
+                self.on_insert(message)
+        elif event == "DELETE":
+            self.on_delete(payload.get("old_record") or {})
+
+    def _catch_up(self, generation: int, session_id: str):
+        """Récupère les messages écrits pendant la déconnexion"""
+        # Marge d'une seconde sur le curseur: les doublons sont écartés par _accept
+        since = format_iso(self.last_ts - 1000) if self.last_ts is not None else None
+        for message in self.backfill(session_id, since):
+            if not self._active(generation):
+                return
+            if self._accept(message):
+                self.on_insert(message)
+
+    def _run(self, generation: int, session_id: str):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        backoff = 1.0
+
+        while self._active(generation):
+            try:
+                socket = Socket(self.ws_url)
+                socket.connect()
+                with self._lock:
+                    if not self._active(generation):
+                        break
+                    self._socket = socket
+                    self._loop = loop
+
+                topic = f"realtime:public:{self.table_name}:session_id=eq.{session_id}"
+                channel = socket.set_channel(topic)
+                channel.join()
+                channel.on("INSERT", lambda payload: self._handle(generation, payload))
+                channel.on("DELETE", lambda payload: self._handle(generation, payload))
+
+                self._catch_up(generation, session_id)
+                backoff = 1.0
+                socket.listen()
+
+            except Exception as e:
+                if self._active(generation):
+                    logger.warning("⚠️ Realtime déconnecté, reconnexion", backoff=round(backoff), error=e)
+
+            if not self._active(generation):
+                break
+            threading.Event().wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
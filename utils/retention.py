@@ -0,0 +1,214 @@
+import os
+import json
+import uuid
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+
+def default_summarizer(messages: List[Dict]) -> str:
+    """
+    Résumé extractif simple: dates couvertes et début des questions posées
+    """
+    first = messages[0]['timestamp']
+    last = messages[-1]['timestamp']
+    questions = [m['content'].strip().replace("\n", " ") for m in messages if m['role'] == 'user']
+
+    lines = [f"📝 Résumé de {len(messages)} messages ({first:%d/%m/%Y} → {last:%d/%m/%Y})"]
+    for question in questions[:5]:
+        lines.append(f"• {question[:120]}")
+    if len(questions) > 5:
+        lines.append(f"• ... et {len(questions) - 5} autres questions")
+    return "\n".join(lines)
+
+
+class RetentionPolicy:
+    """
+    Politique de rétention de la table chat_history
+    """
+
+    def __init__(self,
+                 max_age_days: Optional[int] = 90,
+                 max_messages_per_session: Optional[int] = 500):
+        self.max_age_days = max_age_days
+        self.max_messages_per_session = max_messages_per_session
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """Construit la politique depuis ONLINEX_RETENTION_MAX_AGE_DAYS / _MAX_MESSAGES (0 = désactivé)"""
+        max_age = int(os.getenv('ONLINEX_RETENTION_MAX_AGE_DAYS', '90'))
+        max_messages = int(os.getenv('ONLINEX_RETENTION_MAX_MESSAGES', '500'))
+        return cls(max_age_days=max_age or None, max_messages_per_session=max_messages or None)
+
+    def cutoff(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        if not self.max_age_days:
+            return None
+        now = now or datetime.now(timezone.utc)
+        return now - timedelta(days=self.max_age_days)
+
+
+class CompactionJob:
+    """
+    Job de compaction: remplace les messages trop anciens ou en surnombre
+    d'une session par un unique message de résumé.
+
+    Travaille directement sur Postgres via une connexion DB-API (psycopg2),
+    ce qui permet de l'exécuter en local contre une base de test comme
+    contre la base Supabase.
+    """
+
+    SUMMARY_FILTER = "coalesce(metadata->>'type', '') <> 'summary'"
+    SUMMARY_NAMESPACE = uuid.UUID("6f1c2a8e-3b5d-4e7f-9a10-5c2d8b7e4f31")
+
+    def __init__(self,
+                 connection,
+                 policy: RetentionPolicy,
+                 summarizer: Callable[[List[Dict]], str] = default_summarizer,
+                 table_name: str = "chat_history",
+                 delete_batch_size: int = 1000):
+        self.connection = connection
+        self.policy = policy
+        self.summarizer = summarizer
+        self.table_name = table_name
+        self.delete_batch_size = delete_batch_size
+
+    def _candidate_sessions(self, cursor, cutoff) -> List[str]:
+        cursor.execute(
+            f"""
+            SELECT session_id FROM {self.table_name}
+            WHERE {self.SUMMARY_FILTER}
+            GROUP BY session_id
+            HAVING (%(max_messages)s IS NOT NULL AND count(*) > %(max_messages)s)
+                OR (%(cutoff)s IS NOT NULL AND min(timestamp) < %(cutoff)s)
+            """,
+            {"max_messages": self.policy.max_messages_per_session, "cutoff": cutoff}
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def _expired_messages(self, cursor, session_id: str, cutoff) -> List[Dict]:
+        cursor.execute(
+            f"""
+            SELECT id, role, content, timestamp FROM (
+                SELECT id, role, content, timestamp,
+                       row_number() OVER (ORDER BY timestamp DESC) AS rank
+                FROM {self.table_name}
+                WHERE session_id = %(session_id)s AND {self.SUMMARY_FILTER}
+            ) ranked
+            WHERE (%(max_messages)s IS NOT NULL AND rank > %(max_messages)s)
+               OR (%(cutoff)s IS NOT NULL AND timestamp < %(cutoff)s)
+            ORDER BY timestamp
+            """,
+            {
+                "session_id": session_id,
+                "max_messages": self.policy.max_messages_per_session,
+                "cutoff": cutoff
+            }
+        )
+        return [
+            {"id": row[0], "role": row[1], "content": row[2], "timestamp": row[3]}
+            for row in cursor.fetchall()
+        ]
+
+    @classmethod
+    def summary_client_id(cls, session_id: str, expired: List[Dict]) -> str:
+        """
+        Identifiant déterministe du résumé d'une plage (client_id unique, sql/outbox.sql):
+        une exécution concurrente ou rejouée sur la même plage n'insère pas de second résumé
+        """
+        key = f"{session_id}|{expired[0]['timestamp'].isoformat()}|{expired[-1]['timestamp'].isoformat()}"
+        return str(uuid.uuid5(cls.SUMMARY_NAMESPACE, key))
+
+    def compact_session(self, session_id: str, cutoff=None, dry_run: bool = False) -> int:
+        """
+        Compacte une session dans sa propre transaction
+        Retourne le nombre de messages remplacés par le résumé
+        """
+        with self.connection.cursor() as cursor:
+            expired = self._expired_messages(cursor, session_id, cutoff)
+            if not expired or dry_run:
+                self.connection.rollback()
+                return len(expired)
+
+            metadata = {
+                "type": "summary",
+                "compacted_count": len(expired),
+                "from": expired[0]['timestamp'].isoformat(),
+                "to": expired[-1]['timestamp'].isoformat()
+            }
+            cursor.execute(
+                f"""
+                INSERT INTO {self.table_name} (session_id, role, content, timestamp, metadata, client_id)
+                VALUES (%s, 'system', %s, %s, %s, %s)
+                ON CONFLICT (client_id) DO NOTHING
+                """,
+                (session_id, self.summarizer(expired), expired[-1]['timestamp'], json.dumps(metadata),
+                 self.summary_client_id(session_id, expired))
+            )
+
+            ids = [m['id'] for m in expired]
+            for start in range(0, len(ids), self.delete_batch_size):
+                cursor.execute(
+                    f"DELETE FROM {self.table_name} WHERE id = ANY(%s)",
+                    (ids[start:start + self.delete_batch_size],)
+                )
+
+        self.connection.commit()
+        return len(expired)
+
+    def run(self, dry_run: bool = False) -> Dict:
+        """
+        Applique la politique à toutes les sessions concernées
+        """
+        cutoff = self.policy.cutoff()
+        with self.connection.cursor() as cursor:
+            sessions = self._candidate_sessions(cursor, cutoff)
+        self.connection.rollback()
+
+        stats = {"sessions": 0, "compacted_messages": 0, "errors": 0}
+        for session_id in sessions:
+            try:
+                count = self.compact_session(session_id, cutoff, dry_run=dry_run)
+                if count:
+                    stats["sessions"] += 1
+                    stats["compacted_messages"] += count
+            except Exception as e:
+                self.connection.rollback()
+                stats["errors"] += 1
+                print(f"❌ Compaction de {session_id} échouée: {e}")
+
+        print(f"✅ Compaction terminée: {stats}")
+        return stats
+
+
+def connect(dsn: Optional[str] = None):
+    """Ouvre une connexion Postgres (psycopg2 requis, hors APK)"""
+    try:
+        import psycopg2
+    except ImportError:
+        raise ImportError("❌ psycopg2 requis pour le job de rétention: pip install psycopg2-binary")
+
+    dsn = dsn or os.getenv('DATABASE_URL')
+    if not dsn:
+        raise ValueError("❌ DSN Postgres manquant. Utilise --dsn ou DATABASE_URL")
+    return psycopg2.connect(dsn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rétention et compaction de chat_history")
+    parser.add_argument("--dsn", help="DSN Postgres (défaut: $DATABASE_URL)")
+    parser.add_argument("--max-age-days", type=int, help="Âge maximum des messages (0 = désactivé)")
+    parser.add_argument("--max-messages", type=int, help="Messages conservés par session (0 = désactivé)")
+    parser.add_argument("--dry-run", action="store_true", help="Compte sans rien modifier")
+    args = parser.parse_args()
+
+    policy = RetentionPolicy.from_env()
+    if args.max_age_days is not None:
+        policy.max_age_days = args.max_age_days or None
+    if args.max_messages is not None:
+        policy.max_messages_per_session = args.max_messages or None
+
+    conn = connect(args.dsn)
+    try:
+        CompactionJob(conn, policy).run(dry_run=args.dry_run)
+    finally:
+        conn.close()
@@ -0,0 +1,482 @@
+import os
+import json
+import signal
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from utils.history import ConversationHistory
+from utils.log import get_logger, setup_logging
+from utils.prompts import CHAT_TEMPLATE
+
+logger = get_logger("server")
+
+_STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable"
+}
+
+_END_OF_STREAM = object()
+
+# Taille maximale d'une page d'historique (GET /v1/sessions/<id>/messages?limit=)
+MAX_HISTORY_LIMIT = 200
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class SessionHistories:
+    """
+    Historiques de conversation par session (LRU borné), pour servir
+    plusieurs utilisateurs avec un seul OpenAIClient.
+
+    L'état (entrées, verrous) n'est modifié que depuis la boucle asyncio;
+    seul le chargement depuis la base (load) s'exécute sur un thread.
+    Une session tenue par un tour en cours n'est jamais évincée.
+    """
+
+    def __init__(self, loader, max_sessions: int = 1000, maxlen: int = 10, context_size: int = 6):
+        """
+        loader : charge les derniers messages d'une session (ex: get_chat_history)
+        """
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.maxlen = maxlen
+        self.context_size = context_size
+        self._entries: "OrderedDict[str, ConversationHistory]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, session_id: str):
+        """Sérialise les tours d'une même session (boucle asyncio uniquement)"""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        self._holders[session_id] = self._holders.get(session_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._holders[session_id] -= 1
+            if not self._holders[session_id]:
+                del self._holders[session_id]
+                if session_id not in self._entries:
+                    del self._locks[session_id]
+                # Éviction différée des sessions qui étaient en cours
+                self._evict()
+
+    async def get(self, session_id: str, executor=None) -> ConversationHistory:
+        """Historique d'une session, chargé depuis la base (sur executor) au premier accès"""
+        history = self._entries.get(session_id)
+        if history is not None:
+            self._entries.move_to_end(session_id)
+            return history
+
+        history = await asyncio.get_running_loop().run_in_executor(executor, self.load, session_id)
+        history = self._entries.setdefault(session_id, history)
+        self._entries.move_to_end(session_id)
+        self._evict()
+        return history
+
+    def load(self, session_id: str) -> ConversationHistory:
+        """Construit l'historique depuis la base (bloquant, ne touche pas à l'état partagé)"""
+        history = ConversationHistory(self.maxlen, self.context_size, template=CHAT_TEMPLATE)
+        history.extend(self.loader(session_id)[-self.maxlen:])
+        return history
+
+    def _evict(self):
+        """Retire les sessions les moins récentes au-delà de max_sessions, sauf celles en cours"""
+        excess = len(self._entries) - self.max_sessions
+        if excess <= 0:
+            return
+        for session_id in [sid for sid in self._entries if sid not in self._holders][:excess]:
+            del self._entries[session_id]
+            self._locks.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ChatServer:
+    """
+    Serveur HTTP asyncio exposant le pipeline de chat (mode headless).
+
+    Routes:
+      GET  /health                          état du serveur
+      POST /v1/chat                         {"session_id", "message", "stream"}
+      GET  /v1/sessions/<id>/messages       historique d'une session
+
+    Les appels OpenAI/Supabase (bloquants) s'exécutent sur un pool borné.
+    Au-delà de max_concurrency tours en cours et max_pending en attente,
+    les requêtes sont refusées en 503 (Retry-After) plutôt que mises en file
+    sans limite. L'arrêt (SIGINT/SIGTERM) termine les tours en cours.
+    """
+
+    def __init__(self,
+                 ai_client,
+                 db_client,
+                 host: str = "0.0.0.0",
+                 port: int = 8080,
+                 max_concurrency: int = 16,
+                 max_pending: int = 64,
+                 max_sessions: int = 1000,
+                 max_body: int = 64 * 1024,
+                 shutdown_grace: float = 30.0):
+        self.ai_client = ai_client
+        self.db_client = db_client
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.shutdown_grace = shutdown_grace
+
+        self.sessions = SessionHistories(
+            lambda session_id: db_client.get_chat_history(limit=10, session_id=session_id, latest=True),
+            max_sessions=max_sessions
+        )
+        # Une place de plus pour les sauvegardes, qui ne doivent pas bloquer les tours
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency + 2, thread_name_prefix="onlinex-server")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._active = 0
+        self._connections: Dict[asyncio.Task, bool] = {}
+        self._background: set = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._closing = False
+        self._stopped: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_env(cls) -> "ChatServer":
+        """
+        Construit le serveur et ses clients depuis l'environnement:
+        ONLINEX_SERVER_HOST / _PORT / _CONCURRENCY / _PENDING
+        ONLINEX_SERVER_OUTBOX : outbox d'écriture par lots (optionnelle)
+        ONLINEX_SERVER_USAGE  : fichier des totaux de tokens du jour (optionnel)
+        """
+        from utils.openai_handler import OpenAIClient
+        from utils.supabase_client import SupabaseClient
+        from utils.outbox import Outbox
+        from utils.token_budget import TokenLedger
+
+        outbox_path = os.getenv('ONLINEX_SERVER_OUTBOX')
+        db_client = SupabaseClient(outbox=Outbox(outbox_path) if outbox_path else None)
+        ai_client = OpenAIClient()
+        ai_client.ledger = TokenLedger.from_env(os.getenv('ONLINEX_SERVER_USAGE'))
+        return cls(
+            ai_client,
+            db_client,
+            host=os.getenv('ONLINEX_SERVER_HOST', '0.0.0.0'),
+            port=int(os.getenv('ONLINEX_SERVER_PORT', '8080')),
+            max_concurrency=int(os.getenv('ONLINEX_SERVER_CONCURRENCY', '16')),
+            max_pending=int(os.getenv('ONLINEX_SERVER_PENDING', '64'))
+        )
+
+    # ---- Cycle de vie -------------------------------------------------
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("🌐 Serveur démarré", host=self.host, port=self.port, concurrency=self.max_concurrency)
+
+    async def serve_forever(self):
+        """Démarre le serveur et attend un signal d'arrêt"""
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: asyncio.ensure_future(self.shutdown()))
+            except (NotImplementedError, RuntimeError):
+                pass
+        await self._stopped.wait()
+
+    async def shutdown(self):
+        """
+        Arrêt gracieux: plus de nouvelles connexions, les tours en cours se
+        terminent (dans la limite de shutdown_grace), puis les connexions
+        inactives sont fermées et les sauvegardes en attente vidées
+        """
+        if self._closing:
+            return
+        self._closing = True
+        logger.info("🛑 Arrêt du serveur", active=self._active)
+        self._server.close()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.shutdown_grace
+        while self._active and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+        await loop.run_in_executor(None, self._executor.shutdown, True)
+        ledger = getattr(self.ai_client, "ledger", None)
+        if ledger is not None:
+            ledger.flush()
+        if getattr(self.db_client, "replayer", None) is not None:
+            self.db_client.replayer.stop()
+        self._stopped.set()
+
+    # ---- HTTP ----------------------------------------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "En-têtes trop longs")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Ligne de requête invalide")
+
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        if headers.get("transfer-encoding"):
+            raise HTTPError(411, "Content-Length requis")
+        length = int(headers.get("content-length", "0") or 0)
+        if length > self.max_body:
+            raise HTTPError(413, "Corps de requête trop volumineux")
+        if length:
+            body = await reader.readexactly(length)
+        return method.upper(), target, headers, body
+
+    @staticmethod
+    def _head(status: int, content_type: str, extra: Optional[Dict[str, str]] = None, length: Optional[int] = None) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, 'OK')}", f"Content-Type: {content_type}"]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        for name, value in (extra or {}).items():
+            lines.append(f"{name}: {value}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                         extra: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(self._head(status, "application/json; charset=utf-8", extra, len(body)) + body)
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = False
+        try:
+            while not self._closing:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, {"Connection": "close"})
+                    break
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._connections[task] = True
+                try:
+                    keep_alive = await self._dispatch(writer, method, target, body) and keep_alive
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": e.message})
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    logger.error("❌ Erreur serveur", path=urlsplit(target).path, exc_info=e)
+                    await self._send_json(writer, 500, {"error": "Erreur interne"})
+                finally:
+                    self._connections[task] = False
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _dispatch(self, writer, method: str, target: str, body: bytes) -> bool:
+        """Route une requête; retourne False si la connexion doit être fermée"""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"]:
+            await self._send_json(writer, 200, self.health())
+            return True
+
+        if parts == ["v1", "chat"]:
+            if method != "POST":
+                raise HTTPError(405, "POST attendu")
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "JSON invalide")
+            message = (payload.get("message") or "").strip()
+            session_id = payload.get("session_id")
+            if not message or not session_id:
+                raise HTTPError(400, "session_id et message sont requis")
+            return await self._chat(writer, session_id, message, bool(payload.get("stream")))
+
+        if len(parts) == 4 and parts[:2] == ["v1", "sessions"] and parts[3] == "messages":
+            if method != "GET":
+                raise HTTPError(405, "GET attendu")
+            try:
+                limit = int(parse_qs(url.query).get("limit", ["50"])[0])
+            except ValueError:
+                raise HTTPError(400, "limit doit être un entier")
+            if limit < 1:
+                raise HTTPError(400, "limit doit être positif")
+            limit = min(limit, MAX_HISTORY_LIMIT)
+            loop = asyncio.get_running_loop()
+            history = await loop.run_in_executor(
+                self._executor,
+                lambda: self.db_client.get_chat_history(limit=limit, session_id=parts[2], latest=True)
+            )
+            await self._send_json(writer, 200, {"session_id": parts[2], "messages": [m.to_row() for m in history]})
+            return True
+
+        raise HTTPError(404, "Route inconnue")
+
+    # ---- Chat ----------------------------------------------------------
+
+    async def _acquire_slot(self):
+        """Réserve une place de travail, ou refuse si la file d'attente est pleine"""
+        if self._closing:
+            raise HTTPError(503, "Serveur en cours d'arrêt")
+        if self._slots.locked() and self._waiting >= self.max_pending:
+            raise HTTPError(503, "Serveur saturé")
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+
+    def _release_slot(self):
+        self._active -= 1
+        self._slots.release()
+
+    async def _chat(self, writer, session_id: str, message: str, stream: bool) -> bool:
+        try:
+            await self._acquire_slot()
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": e.message}, {"Retry-After": "1"})
+            return True
+
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.sessions.hold(session_id):
+                # Historique chargé avant la sauvegarde: le message du tour n'y figure pas en double
+                history = await self.sessions.get(session_id, self._executor)
+                user_save = loop.run_in_executor(
+                    self._executor, lambda: self.db_client.save_message(message, 'user', session_id=session_id)
+                )
+
+                usage: Dict = {}
+                if stream:
+                    answer = await self._stream_answer(writer, message, history, session_id, usage)
+                else:
+                    answer = await loop.run_in_executor(
+                        self._executor,
+                        lambda: self.ai_client.chat_completion(
+                            message, history=history, retrieve_memory=False, session_id=session_id, usage=usage
+                        )
+                    )
+                    await self._send_json(writer, 200, {"session_id": session_id, "answer": answer})
+        finally:
+            self._release_slot()
+
+        # Réponse envoyée: la sauvegarde de l'IA suit celle de l'utilisateur, hors du chemin critique
+        async def persist():
+            await user_save
+            await loop.run_in_executor(
+                self._executor,
+                lambda: self.db_client.save_message(
+                    answer, 'assistant', metadata={"usage": usage} if usage else None, session_id=session_id
+                )
+            )
+        task = asyncio.ensure_future(persist())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return not stream
+
+    async def _stream_answer(self, writer, message: str, history: ConversationHistory,
+                             session_id: str, usage: Dict) -> str:
+        """Envoie la réponse en Server-Sent Events au fil de sa génération"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+        cancelled = threading.Event()
+
+        def produce():
+            # File bornée: un client lent ralentit la lecture du flux OpenAI
+            deltas = self.ai_client.stream_chat_completion(
+                message, history=history, memory_context=None, session_id=session_id, usage=usage
+            )
+            for delta in deltas:
+                if cancelled.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(delta), loop).result()
+            asyncio.run_coroutine_threadsafe(queue.put(_END_OF_STREAM), loop).result()
+
+        writer.write(self._head(200, "text/event-stream; charset=utf-8",
+                                {"Cache-Control": "no-cache", "Connection": "close"}))
+        producer = loop.run_in_executor(self._executor, produce)
+        parts = []
+        try:
+            while True:
+                delta = await queue.get()
+                if delta is _END_OF_STREAM:
+                    break
+                parts.append(delta)
+                writer.write(f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await writer.drain()
+            writer.write(b"event: done\ndata: {}\n\n")
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            cancelled.set()
+            # Débloque le producteur s'il attend une place dans la file
+            while not producer.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+            raise
+        await producer
+        return "".join(parts)
+
+    def health(self) -> Dict:
+        return {
+            "status": "closing" if self._closing else "ok",
+            "active": self._active,
+            "waiting": self._waiting,
+            "sessions": len(self.sessions),
+            "connections": len(self._connections)
+        }
+
+
+if __name__ == "__main__":
+    # Mode headless: python -m utils.server
+    setup_logging()
+    asyncio.run(ChatServer.from_env().serve_forever())
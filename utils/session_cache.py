@@ -0,0 +1,211 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.message import Message
+from utils.log import get_logger
+
+logger = get_logger("cache")
+
+# Élément prêt à afficher: (contenu, is_user, heure formatée)
+RenderItem = Tuple[str, bool, str]
+
+# Surcoût approximatif par message en cache: Message, tuple d'affichage, heure
+MESSAGE_OVERHEAD_BYTES = 300
+
+
+def message_bytes(message: Message) -> int:
+    """Taille mémoire approximative d'un message en cache"""
+    return sys.getsizeof(message.content) + MESSAGE_OVERHEAD_BYTES
+
+
+class SessionCache:
+    """
+    Cache mémoire borné (LRU) des sessions récemment utilisées.
+
+    Chaque entrée contient les messages parsés et leur version prête à
+    afficher, ce qui permet de revenir sur une conversation récente sans
+    aucun appel réseau. Les sessions peuvent être préchargées en arrière-plan.
+    La taille de chaque entrée est suivie pour le budget mémoire (MemoryBudget).
+    """
+
+    def __init__(self,
+                 loader: Callable[[str], List[Message]],
+                 max_sessions: int = 8,
+                 budget=None):
+        """
+        loader       : charge l'historique d'une session (ex: get_chat_history);
+                       lève une exception ou retourne None en cas d'échec (rien n'est mis en cache)
+        max_sessions : nombre maximum de sessions conservées
+        budget       : MemoryBudget auquel le cache s'enregistre (optionnel)
+        """
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.budget = budget
+        self._bytes = 0
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = set()
+        # Session affichée: jamais évincée (un préchargement la rend moins récente que d'autres)
+        self._pinned: Optional[str] = None
+        
+        if budget is not None:
+            budget.register("sessions", self, priority=5)
+
+    @staticmethod
+    def _render(message: Message) -> RenderItem:
+        return (message.content, message.is_user, message.time_label())
+
+    def _build_entry(self, history: List[Message]) -> Dict:
+        return {
+            "messages": list(history),
+            "render": [self._render(msg) for msg in history],
+            "bytes": sum(message_bytes(msg) for msg in history)
+        }
+
+    def get(self, session_id: str) -> Optional[List[RenderItem]]:
+        """Retourne les éléments prêts à afficher, ou None si absent du cache"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(session_id)
+            return list(entry["render"])
+
+    def get_messages(self, session_id: str) -> Optional[List[Message]]:
+        """Retourne les messages parsés d'une session en cache"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return list(entry["messages"]) if entry is not None else None
+
+    def put(self, session_id: str, history: List[Message], replace: bool = True) -> bool:
+        """
+        Enregistre l'historique d'une session dans le cache
+        replace=False : n'insère que si la session est absente (une entrée
+        remplie entre-temps par load/append est conservée)
+        Retourne True si l'entrée a été écrite
+        """
+        entry = self._build_entry(history)
+        with self._lock:
+            if not replace and session_id in self._entries:
+                return False
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                self._bytes -= previous["bytes"]
+            self._entries[session_id] = entry
+            self._bytes += entry["bytes"]
+            while len(self._entries) > self.max_sessions:
+                self._bytes -= self._pop_oldest()["bytes"]
+        if self.budget is not None:
+            self.budget.check()
+        return True
+
+    def pin(self, session_id: Optional[str]):
+        """Désigne la session active, conservée par les évictions"""
+        with self._lock:
+            self._pinned = session_id
+
+    def _pop_oldest(self) -> Dict:
+        """Retire l'entrée la moins récente hors session active (appelé sous verrou)"""
+        for session_id in self._entries:
+            if session_id != self._pinned:
+                return self._entries.pop(session_id)
+        raise KeyError("seule la session active est en cache")
+
+    def load(self, session_id: str) -> List[RenderItem]:
+        """
+        Retourne la session depuis le cache, ou la charge et la met en cache
+        Un échec du chargement n'est pas mis en cache (l'exception remonte)
+        """
+        cached = self.get(session_id)
+        if cached is not None:
+            return cached
+        history = self.loader(session_id)
+        if history is None:
+            return []
+        self.put(session_id, history, replace=False)
+        return self.get(session_id) or []
+
+    def append(self, session_id: str, message: Message):
+        """Ajoute un nouveau message à une session déjà en cache"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            entry["messages"].append(message)
+            entry["render"].append(self._render(message))
+            size = message_bytes(message)
+            entry["bytes"] += size
+            self._bytes += size
+
+    def invalidate(self, session_id: str):
+        """Retire une session du cache"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry["bytes"]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def evict(self, nbytes: int) -> int:
+        """
+        Libère au moins nbytes en retirant les sessions les moins récemment
+        utilisées; la session active (pin) reste
+        """
+        freed = 0
+        with self._lock:
+            floor = 1 if self._pinned in self._entries else 0
+            while freed < nbytes and len(self._entries) > floor:
+                freed += self._pop_oldest()["bytes"]
+            self._bytes -= freed
+        return freed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def prefetch(self, session_ids: Iterable[str], top_n: int = 3) -> Optional[threading.Thread]:
+        """
+        Précharge en arrière-plan les N premières sessions absentes du cache
+        """
+        with self._lock:
+            targets = []
+            for session_id in session_ids:
+                if len(targets) >= top_n:
+                    break
+                if session_id in self._entries or session_id in self._inflight:
+                    continue
+                targets.append(session_id)
+            self._inflight.update(targets)
+
+        if not targets:
+            return None
+
+        def worker():
+            for session_id in targets:
+                try:
+                    if session_id not in self:
+                        history = self.loader(session_id)
+                        if history is not None:
+                            self.put(session_id, history, replace=False)
+                except Exception as e:
+                    logger.warning("⚠️ Préchargement échoué", session=session_id, error=e)
+                finally:
+                    with self._lock:
+                        self._inflight.discard(session_id)
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -1,12 +1,44 @@
 import os
+import time
+import threading
+import requests
+from collections import OrderedDict
+from contextlib import nullcontext
 from supabase import create_client, Client
 from datetime import datetime
 import uuid
 import json
 from typing import List, Dict, Optional
 
+from utils.outbox import Outbox, OutboxReplayer, SENT, TRANSIENT, REJECTED
+from utils.message import Message, format_iso, parse_timestamp
+from utils.log import get_logger, redact
+
+logger = get_logger("db")
+
+# Codes d'erreur PostgREST/Postgres d'un refus définitif (requête ou données invalides):
+# PGRST1xx requête, PGRST2xx schéma, 22 donnée invalide, 23 contrainte, 42 syntaxe ou droits
+REJECTION_CODE_PREFIXES = ("PGRST1", "PGRST2", "22", "23", "42")
+# Statuts HTTP 4xx qui restent passagers
+TRANSIENT_HTTP_CODES = {"401", "408", "429"}
+
+
+def is_rejection(error) -> bool:
+    """
+    Vrai si l'erreur est un refus définitif du serveur (4xx, validation),
+    faux pour un échec passager (connexion, 5xx, délai)
+    """
+    code = error.get("code") if isinstance(error, dict) else getattr(error, "code", None)
+    if not code:
+        return False
+    code = str(code)
+    if code.isdigit() and len(code) == 3:
+        return code.startswith("4") and code not in TRANSIENT_HTTP_CODES
+    return code.startswith(REJECTION_CODE_PREFIXES)
+
+
 class SupabaseClient:
-    def __init__(self):
+    def __init__(self, local_store=None, memory=None, outbox=None):
         # Récupère les variables d'environnement
         self.url = os.getenv('SUPABASE_URL')
         self.key = os.getenv('SUPABASE_KEY')
@@ -17,11 +49,38 @@ class SupabaseClient:
         try:
             self.client: Client = create_client(self.url, self.key)
             self.table_name = "chat_history"
-            self.session_id = self.get_or_create_session_id()
-            print("✅ Client Supabase initialisé avec succès")
+            # Index plein texte local (LocalMessageStore), optionnel
+            self.local_store = local_store
+            # Mémoire vectorielle (RetrievalMemory), optionnelle
+            self.memory = memory
+            # File d'envoi durable (Outbox), optionnelle
+            self.outbox = outbox
+            self.replayer = None
+            # Moniteur de santé (HealthMonitor), renseigné par l'application
+            self.health = None
+            # Identifiants des messages écrits par cet appareil (ignorés par la synchro)
+            self.own_client_ids: "OrderedDict[str, None]" = OrderedDict()
+            # Sessions supprimées par cet appareil -> instant (monotonic), pour ignorer l'écho Realtime
+            self.own_deletes: Dict[str, float] = {}
+            if outbox is not None:
+                self.replayer = OutboxReplayer(outbox, self.push_messages).start()
+            self._state_lock = threading.Lock()
+            self._session_id = self.get_or_create_session_id()
+            logger.info("✅ Client Supabase initialisé avec succès")
         except Exception as e:
             raise ConnectionError(f"❌ Erreur connexion Supabase: {e}")
     
+    @property
+    def session_id(self) -> str:
+        """Session active (lecture atomique: à capturer une fois par requête)"""
+        with self._state_lock:
+            return self._session_id
+    
+    @session_id.setter
+    def session_id(self, value: str):
+        with self._state_lock:
+            self._session_id = value
+    
     def get_or_create_session_id(self) -> str:
         """Génère ou récupère un ID de session unique"""
         try:
@@ -31,35 +90,96 @@ class SupabaseClient:
         except:
             return "default_session"
     
-    def save_message(self, content: str, role: str, metadata: Optional[Dict] = None) -> bool:
+    def save_message(self,
+                     content: str,
+                     role: str,
+                     metadata: Optional[Dict] = None,
+                     session_id: Optional[str] = None) -> bool:
         """
         Sauvegarde un message dans la base de données
+        Avec une outbox, le message est écrit sur disque et envoyé en arrière-plan
+        session_id : session capturée au début du tour (défaut: session active)
         """
         try:
-            data = {
-                "session_id": self.session_id,
-                "role": role,
-                "content": content,
-                "timestamp": datetime.now().isoformat(),
-                "metadata": metadata or {}
-            }
+            message = Message.now(
+                role,
+                content,
+                session_id or self.session_id,
+                client_id=Outbox.new_id(),
+                metadata=metadata
+            )
+            data = message.to_row()
             
-            response = self.client.table(self.table_name).insert(data).execute()
+            with self._state_lock:
+                self.own_client_ids[message.client_id] = None
+                while len(self.own_client_ids) > 1000:
+                    self.own_client_ids.popitem(last=False)
             
-            if hasattr(response, 'error') and response.error:
-                print(f"❌ Erreur sauvegarde: {response.error}")
-                return False
+            if self.local_store is not None:
+                self.local_store.index_message(message)
+            if self.memory is not None:
+                self.memory.add(message)
             
-            print(f"✅ Message sauvegardé ({role}): {content[:50]}...")
-            return True
+            if self.outbox is not None:
+                self.outbox.append(data)
+                self.replayer.notify()
+                return True
+            
+            return self.upsert_messages([data])
             
         except Exception as e:
-            print(f"❌ Erreur critique sauvegarde: {e}")
+            logger.error("❌ Erreur critique sauvegarde", role=role, content=redact(content), error=e)
             return False
     
-    def get_chat_history(self, limit: int = 20, session_id: str = None) -> List[Dict]:
+    def upsert_messages(self, records: List[Dict]) -> bool:
+        """
+        Écrit un lot de messages de façon idempotente (upsert sur client_id)
+        """
+        return self.push_messages(records) == SENT
+    
+    def push_messages(self, records: List[Dict]) -> str:
+        """
+        Variante d'upsert_messages pour l'outbox: retourne SENT, TRANSIENT
+        (réseau, 5xx: à réessayer) ou REJECTED (lot refusé par le serveur)
+        """
+        try:
+            response = self.client.table(self.table_name)\
+                .upsert(records, on_conflict="client_id")\
+                .execute()
+            
+            if hasattr(response, 'error') and response.error:
+                logger.error("❌ Erreur sauvegarde", count=len(records), error=response.error)
+                return self._classify_failure(response.error)
+            
+            logger.debug("✅ Messages sauvegardés", count=len(records))
+            if self.health is not None:
+                self.health.report_success("supabase")
+            return SENT
+            
+        except Exception as e:
+            logger.error("❌ Erreur critique sauvegarde", count=len(records), error=e)
+            return self._classify_failure(e)
+    
+    def _classify_failure(self, error) -> str:
+        """Un refus prouve que le serveur répond; un échec passager est signalé au moniteur de santé"""
+        if is_rejection(error):
+            if self.health is not None:
+                self.health.report_success("supabase")
+            return REJECTED
+        if self.health is not None:
+            self.health.report_failure("supabase", type(error).__name__)
+        return TRANSIENT
+    
+    def get_chat_history(self,
+                         limit: int = 20,
+                         session_id: str = None,
+                         raise_errors: bool = False,
+                         latest: bool = False) -> List[Message]:
         """
-        Récupère l'historique des conversations
+        Récupère l'historique des conversations (ordre chronologique)
+        latest       : les `limit` derniers messages au lieu des `limit` premiers
+        raise_errors : lève une exception en cas d'échec au lieu de retourner []
+                       (pour les caches: un échec ne doit pas passer pour une session vide)
         """
         try:
             target_session = session_id or self.session_id
@@ -67,53 +187,209 @@ class SupabaseClient:
             response = self.client.table(self.table_name)\
                 .select("*")\
                 .eq("session_id", target_session)\
-                .order("timestamp", desc=False)\
+                .order("timestamp", desc=latest)\
                 .limit(limit)\
                 .execute()
             
             if hasattr(response, 'error') and response.error:
-                print(f"❌ Erreur récupération historique: {response.error}")
+                if raise_errors:
+                    raise ConnectionError(f"Historique indisponible: {response.error}")
+                logger.error("❌ Erreur récupération historique", session=target_session, error=response.error)
                 return []
             
             # Formatte les données
-            history = []
-            for item in response.data:
-                history.append({
-                    'role': item['role'],
-                    'content': item['content'],
-                    'timestamp': item['timestamp'],
-                    'metadata': item.get('metadata', {})
-                })
+            rows = reversed(response.data) if latest else response.data
+            history = [Message.from_row(item) for item in rows]
+            
+            # Messages encore dans l'outbox (pas encore envoyés)
+            if self.outbox is not None:
+                saved_ids = {message.client_id for message in history}
+                pending = [
+                    Message.from_row(record) for record in self.outbox.pending_for(target_session)
+                    if record['client_id'] not in saved_ids
+                ]
+                if pending:
+                    history.extend(pending)
+                    history.sort(key=lambda message: message.ts or 0)
             
-            print(f"✅ Historique chargé: {len(history)} messages")
+            if self.local_store is not None:
+                self.local_store.index_messages(history)
+            
+            logger.debug("✅ Historique chargé", session=target_session, count=len(history))
             return history
             
         except Exception as e:
-            print(f"❌ Erreur récupération historique: {e}")
+            logger.error("❌ Erreur récupération historique", error=e)
+            if raise_errors:
+                raise
+            return []
+    
+    def get_messages_since(self, session_id: str, since: Optional[str] = None, limit: int = 200) -> List[Message]:
+        """
+        Récupère les messages d'une session postérieurs à un timestamp (rattrapage)
+        """
+        try:
+            query = self.client.table(self.table_name)\
+                .select("*")\
+                .eq("session_id", session_id)
+            if since:
+                query = query.gt("timestamp", since)
+            response = query.order("timestamp", desc=False).limit(limit).execute()
+            
+            if hasattr(response, 'error') and response.error:
+                logger.error("❌ Erreur rattrapage", session=session_id, error=response.error)
+                return []
+            return [Message.from_row(item) for item in response.data]
+            
+        except Exception as e:
+            logger.error("❌ Erreur rattrapage", session=session_id, error=e)
+            return []
+    
+    def get_messages_around(self, session_id: str, timestamp: str, context: int = 7) -> List[Message]:
+        """
+        Récupère les messages d'une session autour d'un timestamp
+        (saut vers un résultat de recherche absent de l'historique chargé)
+        """
+        try:
+            response = self.client.table(self.table_name)\
+                .select("*")\
+                .eq("session_id", session_id)\
+                .lte("timestamp", timestamp)\
+                .order("timestamp", desc=True)\
+                .limit(context + 1)\
+                .execute()
+            
+            if hasattr(response, 'error') and response.error:
+                logger.error("❌ Erreur chargement du contexte", session=session_id, error=response.error)
+                return []
+            before = [Message.from_row(item) for item in reversed(response.data)]
+            return before + self.get_messages_since(session_id, timestamp, limit=context)
+            
+        except Exception as e:
+            logger.error("❌ Erreur chargement du contexte", session=session_id, error=e)
             return []
     
     def clear_session_history(self, session_id: str = None) -> bool:
         """
         Supprime l'historique d'une session
         """
+        target_session = session_id or self.session_id
+        return self.delete_sessions([target_session]) == 1
+    
+    def delete_sessions(self, session_ids: List[str], batch_size: int = 50) -> int:
+        """
+        Supprime plusieurs sessions en une requête par lot
+        Retourne le nombre de sessions effectivement supprimées
+        """
+        unique_ids = list(dict.fromkeys(s for s in session_ids if s))
+        deleted = 0
+        
+        with self._state_lock:
+            now = time.monotonic()
+            for session_id in unique_ids:
+                self.own_deletes[session_id] = now
+        
+        for start in range(0, len(unique_ids), batch_size):
+            batch = unique_ids[start:start + batch_size]
+            try:
+                # Messages de ces sessions encore dans l'outbox abandonnés avant la
+                # suppression (et après l'envoi en cours): sinon le rejeu les recréerait
+                with self.replayer.lock if self.replayer is not None else nullcontext():
+                    if self.outbox is not None:
+                        self.outbox.drop_sessions(batch)
+                    response = self.client.table(self.table_name)\
+                        .delete()\
+                        .in_("session_id", batch)\
+                        .execute()
+                
+                if hasattr(response, 'error') and response.error:
+                    logger.error("❌ Erreur suppression sessions", count=len(batch), error=response.error)
+                    continue
+                
+                # Lignes supprimées retournées par PostgREST: seules les sessions existantes comptent
+                deleted += len({row['session_id'] for row in (response.data or [])})
+                if self.local_store is not None:
+                    self.local_store.delete_sessions(batch)
+                if self.memory is not None:
+                    self.memory.remove_sessions(batch)
+                
+            except Exception as e:
+                logger.error("❌ Erreur suppression sessions", count=len(batch), error=e)
+        
+        logger.info("✅ Sessions supprimées", count=deleted)
+        return deleted
+    
+    def is_own_delete(self, session_id: Optional[str], window: float = 60.0) -> bool:
+        """Suppression récente de cette session par cet appareil (écho Realtime à ignorer)"""
+        with self._state_lock:
+            now = time.monotonic()
+            for expired in [s for s, at in self.own_deletes.items() if now - at > window]:
+                del self.own_deletes[expired]
+            return session_id in self.own_deletes
+    
+    def search_messages(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Recherche plein texte sur toutes les sessions
+        L'index local (instantané) ne couvre que les messages vus sur cet appareil:
+        ses résultats sont complétés par la recherche Postgres (sql/search.sql)
+        quand le réseau est disponible
+        """
+        hits = self.search_messages_local(query, limit=limit)
+        return self.merge_remote_hits(query, hits, limit=limit)
+    
+    def search_messages_local(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Recherche dans l'index FTS5 local uniquement (sans réseau, appelable depuis l'UI)
+        """
+        return self.local_store.search(query, limit=limit) if self.local_store is not None else []
+    
+    def merge_remote_hits(self, query: str, hits: List[Dict], limit: int = 20) -> List[Dict]:
+        """
+        Complète les résultats locaux par ceux du serveur (bloquant, à appeler hors du thread UI)
+        """
+        if self.health is not None and not self.health.is_online():
+            return hits
+        
+        seen = {(hit['session_id'], hit['timestamp'], hit['role']) for hit in hits}
+        remote_hits = [
+            hit for hit in self.search_messages_remote(query, limit=limit)
+            if (hit['session_id'], hit['timestamp'], hit['role']) not in seen
+        ]
+        if self.local_store is not None and remote_hits:
+            # Les messages trouvés sur le serveur sont indexés pour les prochaines recherches
+            self.local_store.index_messages(Message.from_row(hit) for hit in remote_hits)
+        return (hits + remote_hits)[:limit]
+    
+    def search_messages_remote(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Recherche plein texte côté serveur (websearch_to_tsquery, config french)
+        """
         try:
-            target_session = session_id or self.session_id
-            
             response = self.client.table(self.table_name)\
-                .delete()\
-                .eq("session_id", target_session)\
+                .select("session_id, role, content, timestamp")\
+                .filter("content", "wfts(french)", query)\
+                .order("timestamp", desc=True)\
+                .limit(limit)\
                 .execute()
             
             if hasattr(response, 'error') and response.error:
-                print(f"❌ Erreur suppression historique: {response.error}")
-                return False
+                logger.error("❌ Erreur recherche", error=response.error)
+                return []
             
-            print(f"✅ Historique de la session {target_session} supprimé")
-            return True
+            return [
+                {
+                    'session_id': item['session_id'],
+                    'role': item['role'],
+                    'content': item['content'],
+                    'timestamp': format_iso(parse_timestamp(item['timestamp'])),
+                    'snippet': item['content'][:120]
+                }
+                for item in response.data
+            ]
             
         except Exception as e:
-            print(f"❌ Erreur suppression historique: {e}")
-            return False
+            logger.error("❌ Erreur recherche", error=e)
+            return []
     
     def get_all_sessions(self) -> List[Dict]:
         """
@@ -139,24 +415,35 @@ class SupabaseClient:
             return sessions
             
         except Exception as e:
-            print(f"❌ Erreur récupération sessions: {e}")
+            logger.error("❌ Erreur récupération sessions", error=e)
             return []
     
+    def ping(self, timeout: float = 3.0) -> bool:
+        """
+        Vérification de connectivité légère: requête HEAD sur une seule ligne,
+        sans comptage, avec un délai court (indépendant de la taille de la table)
+        """
+        response = requests.head(
+            f"{self.url}/rest/v1/{self.table_name}",
+            params={"select": "id", "limit": "1"},
+            headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+            timeout=timeout
+        )
+        return response.status_code < 300
+    
     def test_connection(self) -> bool:
         """
         Teste la connexion à Supabase
         """
         try:
-            response = self.client.table(self.table_name)\
-                .select("count", count="exact")\
-                .limit(1)\
-                .execute()
-            
-            print("✅ Connexion Supabase fonctionnelle")
-            return True
+            if self.ping():
+                logger.info("✅ Connexion Supabase fonctionnelle")
+                return True
+            logger.error("❌ Test connexion échoué", error="statut HTTP")
+            return False
             
         except Exception as e:
-            print(f"❌ Test connexion échoué: {e}")
+            logger.error("❌ Test connexion échoué", error=e)
             return False
 
 # Fonction utilitaire pour initialiser le client
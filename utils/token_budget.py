@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from utils.log import get_logger
+
+logger = get_logger("tokens")
+
+# Prix indicatifs en USD pour 1K tokens: (prompt, complétion)
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4-1106-preview": (0.01, 0.03),
+    "gpt-4-vision-preview": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo-1106": (0.001, 0.002),
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "text-embedding-ada-002": (0.0001, 0.0),
+}
+
+
+def model_price(model: str) -> Tuple[float, float]:
+    """Prix d'un modèle (un modèle inconnu, ex: serveur local, est compté au prix le plus élevé)"""
+    return MODEL_PRICES.get(model) or max(MODEL_PRICES.values())
+
+
+def usage_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = model_price(model)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+class TokenLedger:
+    """
+    Comptabilité des tokens par session et par modèle, avec budgets journaliers.
+
+    Chaque tour enregistre ses tokens (prompt/complétion) et son coût estimé;
+    le détail du tour est aussi joint aux métadonnées du message assistant
+    (sauvegardé par lots via l'outbox). Les totaux du jour sont écrits sur
+    disque au plus une fois par flush_interval pour survivre au redémarrage.
+
+    À l'approche d'un budget (soft_ratio), max_tokens est réduit
+    progressivement, puis le modèle le moins cher passe en premier.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 daily_tokens: Optional[int] = None,
+                 daily_cost: Optional[float] = None,
+                 session_daily_tokens: Optional[int] = None,
+                 soft_ratio: float = 0.8,
+                 min_max_tokens: int = 256,
+                 flush_interval: float = 30.0):
+        """
+        path                 : fichier JSON des totaux du jour (None: en mémoire uniquement)
+        daily_tokens         : budget journalier global en tokens
+        daily_cost           : budget journalier global en USD
+        session_daily_tokens : budget journalier par session en tokens
+        soft_ratio           : fraction d'un budget à partir de laquelle les requêtes sont bridées
+        """
+        self.path = path
+        self.daily_tokens = daily_tokens
+        self.daily_cost = daily_cost
+        self.session_daily_tokens = session_daily_tokens
+        self.soft_ratio = soft_ratio
+        self.min_max_tokens = min_max_tokens
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._day = date.today().isoformat()
+        self._totals = {"prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+        self._models: Dict[str, Dict] = {}
+        self._sessions: Dict[str, int] = {}
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._load()
+
+    @classmethod
+    def from_env(cls, path: Optional[str] = None) -> "TokenLedger":
+        """Budgets depuis ONLINEX_DAILY_TOKENS, ONLINEX_DAILY_COST_USD et ONLINEX_SESSION_DAILY_TOKENS"""
+        def read(name: str, cast):
+            value = os.getenv(name)
+            return cast(value) if value else None
+
+        return cls(
+            path,
+            daily_tokens=read('ONLINEX_DAILY_TOKENS', int),
+            daily_cost=read('ONLINEX_DAILY_COST_USD', float),
+            session_daily_tokens=read('ONLINEX_SESSION_DAILY_TOKENS', int)
+        )
+
+    # ---- Persistance ----------------------------------------------------
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Compteurs de tokens illisibles", error=e)
+            return
+        if data.get("day") != self._day:
+            return
+        self._totals.update(data.get("totals", {}))
+        self._models = data.get("models", {})
+        self._sessions = data.get("sessions", {})
+
+    def flush(self, force: bool = True):
+        """Écrit les totaux du jour (écriture atomique)"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._last_flush < self.flush_interval):
+                return
+            data = {"day": self._day, "totals": dict(self._totals),
+                    "models": {model: dict(usage) for model, usage in self._models.items()},
+                    "sessions": dict(self._sessions)}
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("⚠️ Compteurs de tokens non sauvegardés", error=e)
+
+    def _roll_day(self):
+        """Nouveau jour: les budgets repartent de zéro (appelé sous verrou)"""
+        today = date.today().isoformat()
+        if today != self._day:
+            self._day = today
+            self._totals = {"prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+            self._models = {}
+            self._sessions = {}
+
+    # ---- Comptabilité ---------------------------------------------------
+
+    def record(self,
+               session_id: Optional[str],
+               model: str,
+               prompt_tokens: int,
+               completion_tokens: int,
+               estimated: bool = False) -> Dict:
+        """
+        Enregistre la consommation d'un tour
+        Retourne le détail à joindre aux métadonnées du message
+        """
+        cost = usage_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            self._roll_day()
+            self._totals["prompt_tokens"] += prompt_tokens
+            self._totals["completion_tokens"] += completion_tokens
+            self._totals["cost"] += cost
+            usage = self._models.setdefault(model, {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0})
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+            usage["requests"] += 1
+            if session_id:
+                self._sessions[session_id] = self._sessions.get(session_id, 0) + prompt_tokens + completion_tokens
+            self._dirty = True
+        self.flush(force=False)
+
+        record = {"model": model, "prompt_tokens": prompt_tokens,
+                  "completion_tokens": completion_tokens, "cost": round(cost, 6)}
+        if estimated:
+            record["estimated"] = True
+        return record
+
+    def pressure(self, session_id: Optional[str] = None) -> float:
+        """Fraction consommée du budget le plus entamé (0 sans budget)"""
+        with self._lock:
+            self._roll_day()
+            ratios = [0.0]
+            if self.daily_tokens:
+                used = self._totals["prompt_tokens"] + self._totals["completion_tokens"]
+                ratios.append(used / self.daily_tokens)
+            if self.daily_cost:
+                ratios.append(self._totals["cost"] / self.daily_cost)
+            if self.session_daily_tokens and session_id:
+                ratios.append(self._sessions.get(session_id, 0) / self.session_daily_tokens)
+        return max(ratios)
+
+    def apply(self,
+              candidates: List[str],
+              max_tokens: int,
+              session_id: Optional[str] = None) -> Tuple[List[str], int]:
+        """
+        Bride une requête selon la consommation du jour:
+        - sous soft_ratio           : inchangée
+        - entre soft_ratio et 1     : max_tokens réduit linéairement jusqu'à min_max_tokens,
+                                      modèle le moins cher en premier passé mi-chemin
+        - budget atteint            : modèle le moins cher seul, min_max_tokens
+        """
+        pressure = self.pressure(session_id)
+        if pressure < self.soft_ratio:
+            return candidates, max_tokens
+
+        cheapest = min(candidates, key=lambda model: sum(model_price(model)))
+        floor = min(self.min_max_tokens, max_tokens)
+        if pressure >= 1.0:
+            logger.warning("💸 Budget de tokens atteint", pressure=round(pressure, 2), model=cheapest)
+            return [cheapest], floor
+
+        progress = (pressure - self.soft_ratio) / (1.0 - self.soft_ratio)
+        limited = int(max_tokens - (max_tokens - floor) * progress)
+        if progress >= 0.5:
+            candidates = [cheapest] + [model for model in candidates if model != cheapest]
+        logger.info("💸 Requête bridée par le budget", pressure=round(pressure, 2), max_tokens=limited, model=candidates[0])
+        return candidates, limited
+
+    def session_tokens(self, session_id: str) -> int:
+        with self._lock:
+            return self._sessions.get(session_id, 0)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "day": self._day,
+                "totals": {**self._totals, "cost": round(self._totals["cost"], 4)},
+                "models": {model: dict(usage) for model, usage in self._models.items()},
+                "sessions": len(self._sessions)
+            }
+
+
+if __name__ == "__main__":
+    def budget_test():
+        """Vérifie le bridage progressif et la persistance des totaux"""
+        import tempfile
+
+        path = os.path.join(tempfile.mkdtemp(), "usage.json")
+        ledger = TokenLedger(path, daily_tokens=10_000, flush_interval=0)
+        models = ["gpt-4-1106-preview", "gpt-3.5-turbo-1106"]
+
+        steps = []
+        while ledger.pressure() < 1.2:
+            candidates, max_tokens = ledger.apply(models, 2000, "session_a")
+            steps.append((round(ledger.pressure(), 2), candidates[0], max_tokens))
+            ledger.record("session_a", candidates[0], 600, min(max_tokens, 400))
+        for pressure, model, max_tokens in steps:
+            print(f"📊 pression {pressure:.2f} -> {model}, max_tokens={max_tokens}")
+
+        assert steps[0] == (0.0, models[0], 2000)
+        limits = [max_tokens for _, _, max_tokens in steps]
+        assert limits == sorted(limits, reverse=True) and limits[-1] == 256
+        assert steps[-1][1] == models[1]
+
+        reloaded = TokenLedger(path, daily_tokens=10_000)
+        assert reloaded.snapshot()["totals"] == ledger.snapshot()["totals"]
+        assert reloaded.session_tokens("session_a") == ledger.session_tokens("session_a")
+        print(f"💾 Totaux rechargés: {reloaded.snapshot()['totals']}")
+        print("✅ Budgets respectés")
+
+    budget_test()
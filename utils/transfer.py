@@ -0,0 +1,260 @@
+import io
+import os
+import json
+import time
+import uuid
+import gzip
+import argparse
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.message import parse_timestamp
+
+ARCHIVE_FORMAT = "onlinex-chat-history"
+ARCHIVE_VERSION = 1
+
+# Espace de noms des client_id générés pour les lignes qui n'en ont pas
+_IMPORT_NAMESPACE = uuid.UUID("4f6e6c69-6e65-5820-4368-617420414921")
+
+
+def open_archive(path: str, mode: str = "r"):
+    """
+    Ouvre une archive JSONL en texte, compressée selon l'extension:
+    .gz (gzip), .zst (zstandard, optionnel) ou non compressée
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("❌ zstandard requis pour les archives .zst: pip install zstandard")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+class Progress:
+    """Affiche l'avancement (messages traités et débit) au plus une fois par intervalle"""
+
+    def __init__(self, label: str, interval: float = 1.0, output: Callable[[str], None] = print):
+        self.label = label
+        self.interval = interval
+        self.output = output
+        self.count = 0
+        self._start = time.monotonic()
+        self._last = 0.0
+
+    def update(self, count: int):
+        self.count += count
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.output(f"📦 {self.label}: {self.count} messages ({self.rate():.0f}/s)")
+
+    def rate(self) -> float:
+        return self.count / max(time.monotonic() - self._start, 1e-6)
+
+    def done(self):
+        elapsed = time.monotonic() - self._start
+        self.output(f"✅ {self.label} terminé: {self.count} messages en {elapsed:.1f}s ({self.rate():.0f}/s)")
+
+
+def iter_rows(db_client,
+              session_ids: Optional[List[str]] = None,
+              page_size: int = 1000,
+              sessions_per_query: int = 50) -> Iterator[Dict]:
+    """
+    Parcourt les lignes de chat_history page par page (pagination par clé
+    sur id: chaque page coûte le même prix, quelle que soit sa position)
+    """
+    groups = [None] if not session_ids else [
+        session_ids[i:i + sessions_per_query] for i in range(0, len(session_ids), sessions_per_query)
+    ]
+    for group in groups:
+        last_id = None
+        while True:
+            query = db_client.client.table(db_client.table_name).select("*")
+            if group is not None:
+                query = query.in_("session_id", group)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            response = query.order("id").limit(page_size).execute()
+
+            if hasattr(response, 'error') and response.error:
+                raise ConnectionError(f"❌ Erreur lecture chat_history: {response.error}")
+            if not response.data:
+                break
+            yield from response.data
+            last_id = response.data[-1]["id"]
+            if len(response.data) < page_size:
+                break
+
+
+def export_sessions(db_client,
+                    path: str,
+                    session_ids: Optional[List[str]] = None,
+                    page_size: int = 1000,
+                    progress: Optional[Progress] = None) -> int:
+    """
+    Exporte une, plusieurs ou toutes les sessions vers une archive JSONL
+    (mémoire constante: une seule page en mémoire à la fois)
+    """
+    progress = progress or Progress("Export")
+    count = 0
+    with open_archive(path, "w") as archive:
+        archive.write(json.dumps({
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "exported_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "sessions": session_ids
+        }) + "\n")
+        pending = 0
+        for row in iter_rows(db_client, session_ids, page_size=page_size):
+            archive.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            count += 1
+            pending += 1
+            if pending >= page_size:
+                progress.update(pending)
+                pending = 0
+        progress.update(pending)
+    progress.done()
+    return count
+
+
+def _import_record(row: Dict) -> Dict:
+    """Ligne d'archive -> enregistrement à upserter (id laissé à la base)"""
+    record = {
+        "client_id": row.get("client_id"),
+        "session_id": row["session_id"],
+        "role": row["role"],
+        "content": row["content"],
+        "timestamp": row.get("timestamp"),
+        "metadata": row.get("metadata") or {}
+    }
+    if not record["client_id"]:
+        # Ligne antérieure à l'outbox: identifiant déterministe pour un import rejouable
+        record["client_id"] = _legacy_client_id(record)
+    return record
+
+
+def _legacy_client_id(record: Dict) -> str:
+    key = f"{record['session_id']}|{record['timestamp']}|{record['role']}|{record['content']}"
+    return str(uuid.uuid5(_IMPORT_NAMESPACE, key))
+
+
+def _legacy_key(row: Dict):
+    return row["session_id"], parse_timestamp(row.get("timestamp")), row["role"]
+
+
+def _skip_existing_legacy(db_client, batch: List[Dict]) -> List[Dict]:
+    """
+    Écarte les lignes sans client_id d'origine déjà présentes dans la base cible
+    (restauration dans la base source: leur client_id y est NULL, l'upsert ne
+    les reconnaîtrait pas). Rapprochement sur (session_id, timestamp, role)
+    """
+    legacy = [record for record in batch if record["client_id"] == _legacy_client_id(record)]
+    if not legacy:
+        return batch
+    timestamps = sorted(record["timestamp"] for record in legacy if record["timestamp"])
+    query = db_client.client.table(db_client.table_name)\
+        .select("session_id, timestamp, role")\
+        .in_("session_id", list({record["session_id"] for record in legacy}))\
+        .is_("client_id", "null")
+    if timestamps:
+        query = query.gte("timestamp", timestamps[0]).lte("timestamp", timestamps[-1])
+    response = query.execute()
+    if hasattr(response, 'error') and response.error:
+        raise ConnectionError(f"❌ Erreur lecture chat_history: {response.error}")
+
+    existing = {_legacy_key(row) for row in response.data}
+    if not existing:
+        return batch
+    legacy_ids = {id(record) for record in legacy}
+    return [record for record in batch if id(record) not in legacy_ids or _legacy_key(record) not in existing]
+
+
+def _read_records(path: str) -> Iterator[Dict]:
+    with open_archive(path, "r") as archive:
+        header = json.loads(archive.readline() or "{}")
+        if header.get("format") != ARCHIVE_FORMAT:
+            raise ValueError(f"❌ {path} n'est pas une archive {ARCHIVE_FORMAT}")
+        if header.get("version", 0) > ARCHIVE_VERSION:
+            raise ValueError(f"❌ Version d'archive non supportée: {header.get('version')}")
+        for line in archive:
+            if line.strip():
+                yield _import_record(json.loads(line))
+
+
+def _batches(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_sessions(db_client,
+                    path: str,
+                    batch_size: int = 500,
+                    retries: int = 3,
+                    progress: Optional[Progress] = None) -> int:
+    """
+    Importe une archive par lots d'upserts idempotents (sur client_id):
+    un import interrompu peut être relancé sans créer de doublons.
+    Les lignes exportées sans client_id reçoivent un identifiant déterministe;
+    celles déjà présentes dans la base cible (client_id NULL, même session,
+    timestamp et rôle) ne sont pas réimportées
+    """
+    progress = progress or Progress("Import")
+    count = 0
+    for batch in _batches(_read_records(path), batch_size):
+        for attempt in range(retries + 1):
+            try:
+                records = _skip_existing_legacy(db_client, batch)
+            except Exception as e:
+                print(f"⚠️ Rapprochement des anciennes lignes échoué: {e}")
+                records = None
+            if records is not None and (not records or db_client.upsert_messages(records)):
+                break
+            if attempt == retries:
+                raise ConnectionError(f"❌ Import interrompu après {count} messages (relancer pour reprendre)")
+            time.sleep(2 ** attempt)
+        count += len(batch)
+        progress.update(len(batch))
+    progress.done()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / import des conversations (JSONL .gz ou .zst)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="Exporte des sessions vers une archive")
+    export_cmd.add_argument("path", help="Fichier de sortie (.jsonl, .jsonl.gz ou .jsonl.zst)")
+    export_cmd.add_argument("--session", action="append", dest="sessions", help="Session à exporter (répétable, défaut: toutes)")
+    export_cmd.add_argument("--page-size", type=int, default=1000)
+
+    import_cmd = commands.add_parser("import", help="Importe une archive dans Supabase")
+    import_cmd.add_argument("path", help="Archive à importer")
+    import_cmd.add_argument("--batch-size", type=int, default=500)
+
+    args = parser.parse_args()
+
+    from utils.supabase_client import SupabaseClient
+    db = SupabaseClient()
+
+    if args.command == "export":
+        export_sessions(db, args.path, session_ids=args.sessions, page_size=args.page_size)
+    else:
+        if not os.path.exists(args.path):
+            raise SystemExit(f"❌ Archive introuvable: {args.path}")
+        import_sessions(db, args.path, batch_size=args.batch_size)
@@ -0,0 +1,224 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Iterator, Optional
+
+from utils.concurrency import UsageCounters
+from utils.log import get_logger
+
+logger = get_logger("turn")
+
+
+class TurnPipeline:
+    """
+    Exécute un tour de conversation avec un minimum d'attente.
+
+    La sauvegarde du message utilisateur et la récupération des souvenirs
+    démarrent en même temps; l'appel au modèle n'attend que les souvenirs
+    (bornés par retrieval_timeout). La réponse est affichée dès sa réception,
+    puis la réponse de l'IA est sauvegardée en arrière-plan, après le
+    message utilisateur pour conserver l'ordre d'écriture.
+
+    La récupération inclut un aller-retour d'embedding: sa durée et la part
+    des tours qui la dépassent sont mesurées (retrieval_stats) pour régler
+    le délai (ONLINEX_RETRIEVAL_TIMEOUT).
+    """
+
+    def __init__(self,
+                 ai_client,
+                 db_client,
+                 retrieval_timeout: Optional[float] = None,
+                 max_workers: int = 4):
+        """
+        ai_client         : OpenAIClient
+        db_client         : SupabaseClient
+        retrieval_timeout : attente maximale des souvenirs avant l'appel au modèle
+                            (défaut: ONLINEX_RETRIEVAL_TIMEOUT, 1.0 s)
+        """
+        self.ai_client = ai_client
+        self.db_client = db_client
+        if retrieval_timeout is None:
+            retrieval_timeout = float(os.getenv('ONLINEX_RETRIEVAL_TIMEOUT', '1.0'))
+        self.retrieval_timeout = retrieval_timeout
+        self.retrieval_stats = UsageCounters(["used", "timed_out", "failed"], ["last_ms", "max_ms"])
+        self._io = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="onlinex-io")
+
+    def _retrieve(self, user_message: str):
+        """Récupère les souvenirs en mesurant la durée réelle (y compris au-delà du délai)"""
+        start = time.perf_counter()
+        try:
+            return self.ai_client.get_memory_context(user_message)
+        finally:
+            elapsed = round((time.perf_counter() - start) * 1000)
+            self.retrieval_stats.set("last_ms", elapsed)
+            self.retrieval_stats.set("max_ms", max(elapsed, self.retrieval_stats["max_ms"] or 0))
+
+    def timeout_rate(self) -> float:
+        """Part des tours dont les souvenirs sont arrivés trop tard"""
+        stats = self.retrieval_stats.snapshot()
+        total = stats["used"] + stats["timed_out"] + stats["failed"]
+        return stats["timed_out"] / total if total else 0.0
+
+    def _await_context(self, future) -> Optional[dict]:
+        if future is None:
+            return None
+        try:
+            context = future.result(timeout=self.retrieval_timeout)
+            self.retrieval_stats.increment("used")
+            return context
+        except FutureTimeout:
+            # Les souvenirs arriveront trop tard: le tour continue sans eux
+            self.retrieval_stats.increment("timed_out")
+            logger.info("⏱️ Souvenirs ignorés (délai dépassé)", timeout=self.retrieval_timeout,
+                        timeout_rate=round(self.timeout_rate(), 2), last_ms=self.retrieval_stats["last_ms"])
+        except Exception as e:
+            self.retrieval_stats.increment("failed")
+            logger.warning("⚠️ Récupération des souvenirs échouée", error=e)
+        return None
+
+    def _answer(self,
+                user_message: str,
+                is_image: bool,
+                context_future,
+                session_id: Optional[str],
+                usage: Dict,
+                on_stream: Optional[Callable[[Iterator[str]], None]] = None) -> str:
+        if is_image:
+            image_url = self.ai_client.generate_image(user_message)
+            if image_url:
+                return f"🎨 Image générée avec succès!\n📎 Lien: {image_url}"
+            return "❌ Désolé, je n'ai pas pu générer l'image. Réessayez avec une autre description."
+
+        if on_stream is not None:
+            parts = []
+
+            def deltas() -> Iterator[str]:
+                for delta in self.ai_client.stream_chat_completion(
+                    user_message,
+                    memory_context=self._await_context(context_future),
+                    retrieve_memory=False,
+                    session_id=session_id,
+                    usage=usage
+                ):
+                    parts.append(delta)
+                    yield delta
+
+            stream = deltas()
+            on_stream(stream)
+            # Fragments non consommés par on_stream: la réponse doit rester complète
+            for _ in stream:
+                pass
+            return "".join(parts)
+
+        return self.ai_client.chat_completion(
+            user_message,
+            memory_context=self._await_context(context_future),
+            retrieve_memory=False,
+            session_id=session_id,
+            usage=usage
+        )
+
+    def _persist_answer(self, user_future, answer: str, session_id: Optional[str], usage: Dict):
+        try:
+            user_future.result()
+        except Exception as e:
+            logger.error("❌ Sauvegarde du message utilisateur échouée", error=e)
+        # Consommation du tour jointe au message (envoyée par lots avec lui)
+        self.db_client.save_message(answer, 'assistant', metadata={"usage": usage} if usage else None, session_id=session_id)
+
+    def run(self,
+            user_message: str,
+            session_id: Optional[str],
+            on_response: Callable[[str], None],
+            is_image: bool = False,
+            on_stream: Optional[Callable[[Iterator[str]], None]] = None):
+        """
+        Exécute un tour complet (bloquant: à appeler depuis un worker)
+        on_response reçoit la réponse complète dès qu'elle est disponible
+        on_stream   : reçoit le flux des fragments (stream_chat_completion) et le
+                      consomme au fil de l'eau (ex: lecture vocale et affichage progressif)
+        Retourne le Future de la sauvegarde de la réponse
+        """
+        start = time.perf_counter()
+
+        user_future = self._io.submit(self.db_client.save_message, user_message, 'user', session_id=session_id)
+        context_future = None
+        if not is_image and self.ai_client.memory is not None:
+            context_future = self._io.submit(self._retrieve, user_message)
+
+        usage: Dict = {}
+        try:
+            answer = self._answer(user_message, is_image, context_future, session_id, usage, on_stream)
+        except Exception as e:
+            answer = f"⚠️ Erreur: {str(e)}"
+
+        on_response(answer)
+        logger.debug("💬 Réponse affichée", ms=round((time.perf_counter() - start) * 1000))
+
+        return self._io.submit(self._persist_answer, user_future, answer, session_id, usage)
+
+    def shutdown(self, wait: bool = False):
+        self._io.shutdown(wait=wait)
+
+
+if __name__ == "__main__":
+    def latency_test(model_delay: float = 0.30, persist_delay: float = 0.15, retrieval_delay: float = 0.10):
+        """
+        Compare la latence d'un tour séquentiel et d'un tour en pipeline
+        avec des faux clients (délais simulés)
+        """
+        saved = []
+
+        class FakeDB:
+            def save_message(self, content, role, metadata=None, session_id=None):
+                time.sleep(persist_delay)
+                saved.append(role)
+                return True
+
+        class FakeAI:
+            memory = object()
+
+            def get_memory_context(self, user_message):
+                time.sleep(retrieval_delay)
+                return {"role": "system", "content": "souvenirs"}
+
+            def chat_completion(self, user_message, memory_context=None, retrieve_memory=True, session_id=None, usage=None):
+                if memory_context is None and retrieve_memory:
+                    memory_context = self.get_memory_context(user_message)
+                assert memory_context is not None
+                time.sleep(model_delay)
+                return f"réponse:{user_message}"
+
+        db, ai = FakeDB(), FakeAI()
+
+        start = time.perf_counter()
+        db.save_message("question", "user")
+        answer = ai.chat_completion("question")
+        sequential_ui = time.perf_counter() - start
+        db.save_message(answer, "assistant")
+
+        pipeline = TurnPipeline(ai, db)
+        shown = {}
+        start = time.perf_counter()
+        persisted = pipeline.run("question", "session_test", lambda text: shown.setdefault("at", time.perf_counter()))
+        pipelined_ui = shown["at"] - start
+        persisted.result()
+        pipeline.shutdown(wait=True)
+
+        assert saved[-2:] == ["user", "assistant"], saved
+        assert pipeline.retrieval_stats["used"] == 1 and pipeline.timeout_rate() == 0.0
+        print(f"⏱️ Séquentiel: réponse affichée après {sequential_ui * 1000:.0f} ms")
+        print(f"⏱️ Pipeline: réponse affichée après {pipelined_ui * 1000:.0f} ms "
+              f"(modèle {model_delay * 1000:.0f} ms + souvenirs {retrieval_delay * 1000:.0f} ms)")
+        assert pipelined_ui < sequential_ui - persist_delay * 0.8
+
+        # Souvenirs plus lents que le délai: tour sans souvenirs, compté comme dépassement
+        slow = TurnPipeline(ai, db, retrieval_timeout=retrieval_delay / 4)
+        ai.chat_completion = lambda user_message, memory_context=None, **kwargs: f"réponse:{user_message}"
+        slow.run("question", "session_test", lambda text: None).result()
+        slow.shutdown(wait=True)
+        assert slow.timeout_rate() == 1.0 and slow.retrieval_stats["last_ms"] >= retrieval_delay * 1000 * 0.9
+        print(f"⏱️ Souvenirs trop lents: {slow.timeout_rate():.0%} des tours sans souvenirs "
+              f"(récupération {slow.retrieval_stats['last_ms']} ms, délai {slow.retrieval_timeout * 1000:.0f} ms)")
+
+    latency_test()
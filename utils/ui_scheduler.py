@@ -0,0 +1,202 @@
+import time
+import threading
+from collections import deque
+from typing import Callable, Deque, Iterable, Optional, Tuple
+
+from kivy.animation import Animation
+from kivy.clock import Clock
+
+# Estimation mémoire d'une bulle: texture du texte (RGBA) et arbre de widgets
+BUBBLE_BYTES_PER_CHAR = 640
+BUBBLE_OVERHEAD_BYTES = 8 * 1024
+
+
+def bubble_bytes(message: str) -> int:
+    """Taille mémoire approximative d'une bulle affichée"""
+    return len(message) * BUBBLE_BYTES_PER_CHAR + BUBBLE_OVERHEAD_BYTES
+
+
+class UIUpdateScheduler:
+    """
+    Planificateur des mises à jour de l'interface du chat.
+
+    Les insertions de messages et les demandes de défilement sont mises en
+    file d'attente puis appliquées par lots, une fois par frame, dans la
+    limite d'un budget de temps. Les chargements en masse (historique)
+    sont insérés sans animation. Sous pression mémoire, les bulles les plus
+    anciennes sont retirées (MemoryBudget).
+    """
+
+    def __init__(self,
+                 container,
+                 widget_factory: Callable,
+                 on_scroll: Callable[[], None],
+                 frame_budget: float = 0.006,
+                 animation_duration: float = 0.5,
+                 on_scroll_to: Optional[Callable] = None,
+                 budget=None,
+                 keep_widgets: int = 30):
+        """
+        container      : layout qui reçoit les widgets (chat_layout)
+        widget_factory : fabrique un widget à partir (message, is_user, timestamp)
+        on_scroll      : callback de défilement vers le bas
+        frame_budget   : temps maximum (secondes) consacré aux insertions par frame
+        on_scroll_to   : callback de défilement vers un widget précis (saut vers un message)
+        budget         : MemoryBudget auquel les bulles affichées sont rattachées (optionnel)
+        keep_widgets   : nombre de bulles récentes jamais retirées
+        """
+        self.container = container
+        self.widget_factory = widget_factory
+        self.on_scroll = on_scroll
+        self.frame_budget = frame_budget
+        self.animation_duration = animation_duration
+        self.on_scroll_to = on_scroll_to
+
+        # File des insertions: (message, is_user, timestamp, animate)
+        self._pending: Deque[Tuple[str, bool, str, bool, Optional[Callable]]] = deque()
+        self._scroll_requested = False
+        self._scroll_index: Optional[int] = None
+
+        # Taille estimée de chaque bulle affichée, de la plus ancienne à la plus récente
+        self.budget = budget
+        self.keep_widgets = keep_widgets
+        self._sizes: Deque[int] = deque()
+        self._bytes = 0
+        self._to_remove = 0
+        # Bulles retirées en tête de conversation (décalage des index de message)
+        self.evicted_count = 0
+        self._size_lock = threading.Lock()
+        if budget is not None:
+            budget.register("bubbles", self, priority=10)
+
+        # Un seul callback Clock par frame, quel que soit le nombre de demandes
+        self._trigger = Clock.create_trigger(self._flush, 0)
+
+    def queue_message(self,
+                      message: str,
+                      is_user: bool,
+                      timestamp: str = "",
+                      animate: bool = True,
+                      on_created: Optional[Callable] = None):
+        """
+        Met en file un message à afficher
+        on_created : reçoit la bulle une fois créée (ex: réponse remplie au fil du flux)
+        """
+        self._pending.append((message, is_user, timestamp, animate, on_created))
+        self._scroll_requested = True
+        self._trigger()
+
+    def queue_messages(self, messages: Iterable[Tuple[str, bool, str]]):
+        """Met en file un lot de messages (chargement d'historique, sans animation)"""
+        for message, is_user, timestamp in messages:
+            self._pending.append((message, is_user, timestamp, False, None))
+        self._scroll_requested = True
+        self._trigger()
+
+    def request_scroll(self):
+        """Demande un défilement vers le bas (fusionné avec les autres demandes)"""
+        self._scroll_requested = True
+        self._trigger()
+
+    def request_scroll_to_index(self, index: int):
+        """Demande un défilement vers le N-ième message une fois les insertions appliquées"""
+        self._scroll_index = index
+        self._trigger()
+
+    def clear(self):
+        """Abandonne les insertions en attente et vide le conteneur"""
+        self._pending.clear()
+        self._scroll_requested = False
+        self._scroll_index = None
+        self._trigger.cancel()
+        self.container.clear_widgets()
+        with self._size_lock:
+            self._sizes.clear()
+            self._bytes = 0
+            self._to_remove = 0
+            self.evicted_count = 0
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def evict(self, nbytes: int) -> int:
+        """
+        Marque les bulles les plus anciennes pour retrait (appliqué à la
+        prochaine frame, sur le thread UI) et retourne les octets libérés
+        """
+        freed = 0
+        with self._size_lock:
+            while freed < nbytes and len(self._sizes) > self.keep_widgets:
+                freed += self._sizes.popleft()
+                self._to_remove += 1
+            self._bytes -= freed
+        if freed:
+            self._trigger()
+        return freed
+
+    def _remove_evicted(self):
+        with self._size_lock:
+            count, self._to_remove = self._to_remove, 0
+        children = self.container.children
+        for _ in range(min(count, len(children))):
+            # Les enfants Kivy sont stockés du plus récent au plus ancien
+            self.container.remove_widget(children[-1])
+        self.evicted_count += count
+
+    def _flush(self, dt: Optional[float] = None):
+        """Applique les insertions en attente dans la limite du budget de la frame"""
+        deadline = time.perf_counter() + self.frame_budget
+        pending = self._pending
+
+        if self._to_remove:
+            self._remove_evicted()
+
+        added = 0
+        while pending:
+            message, is_user, timestamp, animate, on_created = pending.popleft()
+            widget = self.widget_factory(message, is_user, timestamp)
+            self.container.add_widget(widget)
+            if on_created is not None:
+                on_created(widget)
+            size = bubble_bytes(message)
+            with self._size_lock:
+                self._sizes.append(size)
+                self._bytes += size
+            added += 1
+
+            if animate:
+                widget.opacity = 0
+                Animation(opacity=1, duration=self.animation_duration).start(widget)
+
+            if time.perf_counter() >= deadline:
+                break
+
+        if added and self.budget is not None:
+            self.budget.check()
+            if self._to_remove:
+                self._remove_evicted()
+
+        if pending:
+            # Budget épuisé: la suite est reportée à la frame suivante
+            self._trigger()
+            return
+
+        if self._scroll_index is not None and self.on_scroll_to is not None:
+            children = self.container.children
+            index, self._scroll_index = self._scroll_index, None
+            index -= self.evicted_count
+            self._scroll_requested = False
+            if 0 <= index < len(children):
+                # Les enfants Kivy sont stockés du plus récent au plus ancien
+                widget = children[len(children) - 1 - index]
+                Clock.schedule_once(lambda dt: self.on_scroll_to(widget), 0)
+                return
+
+        if self._scroll_requested:
+            self._scroll_requested = False
+            # Le défilement attend la mise en page de la frame suivante
+            Clock.schedule_once(lambda dt: self.on_scroll(), 0)
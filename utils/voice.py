@@ -0,0 +1,487 @@
+import io
+import os
+import re
+import time
+import wave
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from typing import Callable, Iterable, List, Optional, Union
+
+import numpy as np
+
+from utils.log import get_logger
+
+logger = get_logger("voice")
+
+SAMPLE_RATE = 16000        # suffisant pour la transcription, 32 Ko/s en PCM 16 bits mono
+SAMPLE_WIDTH = 2
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Encapsule du PCM 16 bits mono dans un conteneur WAV"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def wav_duration(data: bytes) -> float:
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def quietest_cut(pcm: bytes, sample_rate: int = SAMPLE_RATE, search_seconds: float = 0.6, window_ms: int = 20) -> int:
+    """
+    Position de coupe (en octets) dans la zone la plus silencieuse des
+    search_seconds finales: évite de couper un mot entre deux blocs
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    window = sample_rate * window_ms // 1000
+    search = min(len(samples), int(sample_rate * search_seconds)) // window * window
+    if search < 2 * window:
+        return len(pcm)
+    tail = samples[len(samples) - search:].astype(np.float32).reshape(-1, window)
+    quietest = int(np.argmin((tail ** 2).mean(axis=1)))
+    return (len(samples) - search + quietest * window + window // 2) * SAMPLE_WIDTH
+
+
+# ---- Capture micro ------------------------------------------------------------
+
+class Microphone:
+    """
+    Capture micro par blocs: on_chunk reçoit du PCM 16 bits mono environ
+    toutes les chunk_seconds (coupé dans un silence), pendant l'enregistrement
+    """
+
+    def __init__(self, on_chunk: Callable[[bytes], None], chunk_seconds: float = 4.0, sample_rate: int = SAMPLE_RATE):
+        self.on_chunk = on_chunk
+        self.chunk_seconds = chunk_seconds
+        self.sample_rate = sample_rate
+        self._pending = bytearray()
+        self._recording = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def recording(self) -> bool:
+        return self._recording.is_set()
+
+    def _feed(self, pcm: bytes):
+        self._pending.extend(pcm)
+        if len(self._pending) >= self.chunk_seconds * self.sample_rate * SAMPLE_WIDTH:
+            cut = quietest_cut(bytes(self._pending), self.sample_rate)
+            chunk, self._pending = bytes(self._pending[:cut]), self._pending[cut:]
+            self.on_chunk(chunk)
+
+    def start(self):
+        if self.recording:
+            return
+        self._pending = bytearray()
+        self._recording.set()
+        self._thread = threading.Thread(target=self._record, name="onlinex-mic")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> bytes:
+        """Arrête l'enregistrement et retourne le dernier bloc (non encore envoyé)"""
+        self._recording.clear()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        tail, self._pending = bytes(self._pending), bytearray()
+        return tail
+
+    def _record(self):
+        raise NotImplementedError
+
+
+class AndroidMicrophone(Microphone):
+    """Capture via android.media.AudioRecord (pyjnius)"""
+
+    def _record(self):
+        from jnius import autoclass
+        AudioRecord = autoclass('android.media.AudioRecord')
+        AudioFormat = autoclass('android.media.AudioFormat')
+        AudioSource = autoclass('android.media.MediaRecorder$AudioSource')
+
+        channel, encoding = AudioFormat.CHANNEL_IN_MONO, AudioFormat.ENCODING_PCM_16BIT
+        size = max(AudioRecord.getMinBufferSize(self.sample_rate, channel, encoding), self.sample_rate // 5 * SAMPLE_WIDTH)
+        recorder = AudioRecord(AudioSource.VOICE_RECOGNITION, self.sample_rate, channel, encoding, size)
+        buffer = bytearray(size)
+        recorder.startRecording()
+        try:
+            while self.recording:
+                read = recorder.read(buffer, 0, size)
+                if read > 0:
+                    self._feed(bytes(buffer[:read]))
+        finally:
+            recorder.stop()
+            recorder.release()
+
+
+class SoundDeviceMicrophone(Microphone):
+    """Capture sur ordinateur via sounddevice (optionnel)"""
+
+    def _record(self):
+        import sounddevice
+        block = self.sample_rate // 5
+        with sounddevice.RawInputStream(samplerate=self.sample_rate, channels=1, dtype="int16", blocksize=block) as stream:
+            while self.recording:
+                data, _ = stream.read(block)
+                self._feed(bytes(data))
+
+
+def open_microphone(on_chunk: Callable[[bytes], None], chunk_seconds: float = 4.0) -> Microphone:
+    """Micro de la plateforme (Android: permission RECORD_AUDIO demandée ici)"""
+    from kivy.utils import platform
+    if platform == "android":
+        from android.permissions import request_permissions, Permission
+        request_permissions([Permission.RECORD_AUDIO])
+        return AndroidMicrophone(on_chunk, chunk_seconds)
+    try:
+        import sounddevice  # noqa: F401
+    except ImportError:
+        raise ImportError("❌ sounddevice requis pour le micro sur ordinateur: pip install sounddevice")
+    return SoundDeviceMicrophone(on_chunk, chunk_seconds)
+
+
+# ---- Transcription par blocs ------------------------------------------------------
+
+class ChunkedTranscriber:
+    """
+    Envoie chaque bloc à la transcription dès qu'il est enregistré: à la fin
+    de l'enregistrement, seul le dernier bloc reste à attendre
+    """
+
+    def __init__(self, transcribe: Callable[[bytes], str], max_workers: int = 3, sample_rate: int = SAMPLE_RATE):
+        """transcribe : WAV -> texte (ex: OpenAIClient.transcribe_audio)"""
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="onlinex-stt")
+        self._futures: List = []
+        self._lock = threading.Lock()
+
+    def feed(self, pcm: bytes):
+        if len(pcm) < self.sample_rate * SAMPLE_WIDTH // 10:
+            return  # moins de 100 ms: rien à transcrire
+        future = self._executor.submit(self.transcribe, pcm_to_wav(pcm, self.sample_rate))
+        with self._lock:
+            self._futures.append(future)
+
+    def finish(self, tail: bytes = b"") -> str:
+        """Envoie le dernier bloc et retourne la transcription complète, dans l'ordre"""
+        self.feed(tail)
+        with self._lock:
+            futures, self._futures = self._futures, []
+        parts = []
+        for future in futures:
+            try:
+                parts.append((future.result() or "").strip())
+            except Exception as e:
+                logger.warning("⚠️ Bloc audio non transcrit", error=e)
+        return " ".join(part for part in parts if part)
+
+    def cancel(self):
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# ---- Synthèse vocale --------------------------------------------------------------
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…:;])\s+|\n+")
+
+
+class SentenceSplitter:
+    """Découpe un texte reçu par fragments en phrases complètes"""
+
+    def __init__(self, min_chars: int = 12):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self._buffer += delta
+        parts = _SENTENCE_END.split(self._buffer)
+        self._buffer = parts.pop()
+        sentences, current = [], ""
+        for part in parts:
+            current = f"{current} {part}".strip() if current else part.strip()
+            # Les phrases trop courtes ("Oui.") sont regroupées avec la suivante
+            if len(current) >= self.min_chars:
+                sentences.append(current)
+                current = ""
+        if current:
+            self._buffer = f"{current} {self._buffer}"
+        return sentences
+
+    def flush(self) -> List[str]:
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class SpeechCache:
+    """
+    Fichiers audio synthétisés, sur disque: une même phrase (voix, modèle)
+    n'est synthétisée qu'une fois. Au-delà de max_bytes, les fichiers les
+    moins récemment utilisés sont supprimés
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, text: str, voice: str, extension: str) -> str:
+        digest = hashlib.sha1(f"{voice}|{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.{extension}")
+
+    def get(self, path: str) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    def put(self, path: str, data: bytes) -> str:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._prune()
+        return path
+
+    def _prune(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class SpeechPipeline:
+    """
+    Lit une réponse à voix haute pendant qu'elle arrive: chaque phrase
+    complète part en synthèse aussitôt (en parallèle), et la lecture commence
+    dès que la première est prête, les suivantes s'enchaînant dans l'ordre
+    """
+
+    def __init__(self,
+                 synthesize: Callable[[str], Optional[bytes]],
+                 cache: SpeechCache,
+                 play: Callable[[str], None],
+                 voice: str = "nova",
+                 extension: str = "mp3",
+                 max_workers: int = 2):
+        """
+        synthesize : texte -> audio (ex: OpenAIClient.synthesize_speech)
+        play       : lit un fichier audio, bloquant jusqu'à la fin de la lecture
+        """
+        self.synthesize = synthesize
+        self.cache = cache
+        self.play = play
+        self.voice = voice
+        self.extension = extension
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="onlinex-tts")
+        self._queue: Queue = Queue()
+        self._generation = 0
+        self._player = threading.Thread(target=self._play_loop, name="onlinex-tts-player")
+        self._player.daemon = True
+        self._player.start()
+
+    def _audio_for(self, sentence: str) -> Optional[str]:
+        path = self.cache.path_for(sentence, self.voice, self.extension)
+        cached = self.cache.get(path)
+        if cached:
+            return cached
+        data = self.synthesize(sentence)
+        if not data:
+            return None
+        return self.cache.put(path, data)
+
+    def speak(self, text: Union[str, Iterable[str]]):
+        """
+        Lit un texte complet ou un flux de fragments (ex: stream_chat_completion)
+        Non bloquant pour un texte; pour un flux, consomme le flux dans l'appelant
+        """
+        generation = self._generation
+        splitter = SentenceSplitter()
+        deltas = [text] if isinstance(text, str) else text
+        for delta in deltas:
+            for sentence in splitter.feed(delta):
+                self._queue.put((generation, self._executor.submit(self._audio_for, sentence)))
+        for sentence in splitter.flush():
+            self._queue.put((generation, self._executor.submit(self._audio_for, sentence)))
+
+    def _play_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            generation, future = item
+            if generation != self._generation:
+                future.cancel()
+                continue
+            try:
+                path = future.result()
+            except Exception as e:
+                logger.warning("⚠️ Synthèse vocale en échec", error=e)
+                continue
+            if path and generation == self._generation:
+                self.play(path)
+
+    def stop(self):
+        """Interrompt la lecture en cours et abandonne les phrases en attente"""
+        self._generation += 1
+        stop_player = getattr(self.play, "stop", None)
+        if stop_player is not None:
+            stop_player()
+
+    def shutdown(self):
+        self.stop()
+        self._queue.put(None)
+        self._executor.shutdown(wait=False)
+
+
+class KivySoundPlayer:
+    """Lecture d'un fichier audio avec SoundLoader, bloquante jusqu'à sa fin"""
+
+    def __init__(self):
+        self._sound = None
+        self._done = threading.Event()
+
+    def __call__(self, path: str):
+        from kivy.clock import Clock
+        from kivy.core.audio import SoundLoader
+
+        self._done.clear()
+
+        def start(dt):
+            sound = SoundLoader.load(path)
+            if sound is None:
+                self._done.set()
+                return
+            self._sound = sound
+            sound.bind(on_stop=lambda *args: self._done.set())
+            sound.play()
+
+        # SoundLoader est utilisé depuis le thread principal
+        Clock.schedule_once(start, 0)
+        self._done.wait()
+        if self._sound is not None:
+            self._sound.unload()
+            self._sound = None
+
+    def stop(self):
+        sound = self._sound
+        if sound is not None:
+            sound.stop()
+        self._done.set()
+
+
+if __name__ == "__main__":
+    def voice_test(chunks: int = 5, chunk_seconds: float = 1.0):
+        """
+        Tour vocal complet contre les serveurs locaux de remplacement:
+        transcription par blocs vs fichier entier, puis synthèse phrase par
+        phrase vs réponse entière, et cache disque
+        """
+        import tempfile
+        from utils.audio_stub import AudioStubServer
+
+        server = AudioStubServer().start()
+        os.environ["OPENAI_API_BASES"] = server.base_url
+        from utils.openai_handler import OpenAIClient
+        client = OpenAIClient(api_key="sk-test")
+
+        rng = np.random.default_rng(0)
+        recorded = [
+            (rng.normal(0, 800, int(SAMPLE_RATE * chunk_seconds * (1 + i / 10)))).astype(np.int16).tobytes()
+            for i in range(chunks)
+        ]
+
+        # Transcription du fichier entier après l'enregistrement
+        start = time.perf_counter()
+        whole = client.transcribe_audio(pcm_to_wav(b"".join(recorded)))
+        whole_wait = time.perf_counter() - start
+
+        # Blocs envoyés pendant l'enregistrement (simulé: chunk_seconds/4 par bloc)
+        transcriber = ChunkedTranscriber(client.transcribe_audio)
+        for pcm in recorded[:-1]:
+            transcriber.feed(pcm)
+            time.sleep(chunk_seconds / 4)
+        start = time.perf_counter()
+        text = transcriber.finish(recorded[-1])
+        chunked_wait = time.perf_counter() - start
+        transcriber.shutdown()
+
+        expected = " ".join(f"[{chunk_seconds * (1 + i / 10):.1f}s]" for i in range(chunks))
+        assert text == expected, (text, expected)
+        print(f"🎤 Transcription: '{whole}' en {whole_wait * 1000:.0f} ms après la fin (fichier entier), "
+              f"{chunked_wait * 1000:.0f} ms (par blocs)")
+        assert chunked_wait < whole_wait / 2
+
+        # Synthèse au fil du texte reçu
+        answer = ("Bonjour, voici la réponse. Elle arrive par petits fragments! "
+                  "Chaque phrase est synthétisée dès qu'elle est complète. La lecture commence tout de suite.")
+        played = []
+
+        def fake_play(path):
+            played.append((time.perf_counter(), path))
+            with open(path, "rb") as f:
+                time.sleep(wav_duration(f.read()) / 10)
+
+        def stream():
+            for word in answer.split(" "):
+                time.sleep(0.01)
+                yield word + " "
+
+        cache = SpeechCache(tempfile.mkdtemp())
+        synthesize = lambda sentence: client.synthesize_speech(sentence, response_format="wav")
+        pipeline = SpeechPipeline(synthesize, cache, fake_play, extension="wav")
+        start = time.perf_counter()
+        pipeline.speak(stream())
+        while len(played) < 4:
+            time.sleep(0.01)
+        first_audio = played[0][0] - start
+
+        start = time.perf_counter()
+        synthesize(answer)
+        whole_audio = time.perf_counter() - start + 0.01 * len(answer.split(" "))
+        print(f"🔊 Première phrase lue après {first_audio * 1000:.0f} ms "
+              f"(réponse entière puis synthèse: {whole_audio * 1000:.0f} ms)")
+        assert first_audio < whole_audio
+
+        requests_before = server.requests["speech"]
+        played.clear()
+        pipeline.speak(answer)
+        while len(played) < 4:
+            time.sleep(0.01)
+        assert server.requests["speech"] == requests_before
+        print(f"💾 Relecture depuis le cache disque: {len(played)} phrases, aucune requête")
+
+        pipeline.shutdown()
+        server.stop()
+        print("✅ Tour vocal validé")
+
+    voice_test()